@@ -45,6 +45,38 @@ app_settings = {
     "jwt": {
         "secret": "foobar",
         "algorithm": "HS256"
+    },
+    "request_frame_lookup": False,
+    "json_encoder": "plone.server.renderers.FastJSONEncoder",
+    "conflict_retry": {
+        "attempts": 3,
+        "backoff": 0.01
+    },
+    "serialization_cache": {
+        "enabled": False,
+        "max_size": 1000
+    },
+    "security_cache": {
+        "enabled": True,
+        "max_size": 10000
+    },
+    "auth_cache": {
+        "enabled": False,
+        "max_size": 1000,
+        "ttl": 60
+    },
+    "auth_executor": {
+        "max_workers": 4
+    },
+    "password_hashing": {
+        "algorithm": "pbkdf2_sha512",
+        "iterations": 100000
+    },
+    "rsa_key_file": None,
+    "keep_alive": {
+        "enabled": True,
+        "timeout": 75,
+        "max_requests": 1000
     }
 }
 
@@ -52,3 +84,7 @@ SCHEMA_CACHE = {}
 PERMISSIONS_CACHE = {}
 FACTORY_CACHE = {}
 BEHAVIOR_CACHE = {}
+# (portal_type, dynamic behaviors) -> catalog extraction plan
+CATALOG_PLAN_CACHE = {}
+# (portal_type, dynamic behaviors) -> serializer plan
+SERIALIZER_PLAN_CACHE = {}
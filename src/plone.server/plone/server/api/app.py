@@ -1,9 +1,15 @@
 # -*- coding: utf-8 -*-
 from plone.server import app_settings
 from plone.server import configure
+from plone.server.auth.cache import get_auth_cache
+from plone.server.auth.cache import get_decision_cache
+from plone.server.catalog.pipeline import IIndexingPipeline
 from plone.server.interfaces import IApplication
+from plone.server.interfaces import IDatabase
 from plone.server.interfaces import IResourceSerializeToJson
+from plone.server.json.cache import get_serialization_cache
 from zope.component import getMultiAdapter
+from zope.component import queryUtility
 
 
 @configure.service(context=IApplication, method='GET', permission='plone.AccessContent')
@@ -18,3 +24,31 @@ async def get(context, request):
                    name='@apidefinition')
 async def get_api_definition(context, request):
     return app_settings['api_definition']
+
+
+@configure.service(context=IApplication, method='GET', permission='plone.GetStatistics',
+                   name='@statistics')
+async def get_statistics(context, request):
+    from plone.server.traversal import conflict_stats
+    result = {
+        'databases': {},
+        'conflicts': conflict_stats
+    }
+    pipeline = queryUtility(IIndexingPipeline)
+    if pipeline is not None:
+        result['indexing'] = pipeline.stats()
+    cache = get_serialization_cache()
+    if cache is not None:
+        result['serialization_cache'] = cache.stats()
+    cache = get_decision_cache()
+    if cache is not None:
+        result['security_cache'] = cache.stats()
+    cache = get_auth_cache()
+    if cache is not None:
+        result['auth_cache'] = cache.stats()
+    for key, db in context:
+        if IDatabase.providedBy(db):
+            result['databases'][key] = {
+                'pool': db.pool.stats()
+            }
+    return result
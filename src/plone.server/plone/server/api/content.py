@@ -1,11 +1,17 @@
 # -*- coding: utf-8 -*-
+from aiohttp.web import StreamResponse
 from aiohttp.web_exceptions import HTTPMethodNotAllowed
 from aiohttp.web_exceptions import HTTPNotFound
 from aiohttp.web_exceptions import HTTPUnauthorized
 from dateutil.tz import tzlocal
+from email.utils import formatdate
+from email.utils import parsedate_to_datetime
+from persistent import Persistent
+from persistent.TimeStamp import TimeStamp
 from plone.server import app_settings
 from plone.server import configure
 from plone.server import _
+from plone.server.api.service import DownloadService
 from plone.server.api.service import Service
 from plone.server.browser import ErrorResponse
 from plone.server.browser import Response
@@ -20,11 +26,18 @@ from plone.server.events import ObjectPermissionsViewEvent
 from plone.server.exceptions import ConflictIdOnContainer
 from plone.server.exceptions import PreconditionFailed
 from plone.server.interfaces import IAbsoluteURL
+from plone.server.interfaces import IContainer
 from plone.server.interfaces import IResource
 from plone.server.json.exceptions import DeserializationError
 from plone.server.interfaces import IResourceDeserializeFromJson
 from plone.server.interfaces import IResourceSerializeToJson
+from plone.server.interfaces import IResourceSerializeToJsonSummary
+from plone.server.json.cache import get_serialization_cache
+from plone.server.json.serialize_content import get_serializer_plan
+from plone.server.renderers import get_json_encoder
+from plone.server.utils import apply_cors
 from plone.server.utils import get_authenticated_user_id
+from plone.server.utils import get_content_path
 from plone.server.utils import iter_parents
 from plone.server.auth import settings_for_object
 from zope.component import getMultiAdapter
@@ -40,9 +53,188 @@ from plone.server.interfaces import IRolePermissionMap
 
 from zope.security.interfaces import IInteraction
 
+import base64
+import binascii
+import hashlib
+
 
 _zone = tzlocal()
 
+ITEMS_PAGE_SIZE = 50
+ITEMS_MAX_PAGE_SIZE = 1000
+
+
+def get_serials(context, annotations=True):
+    """ZODB serials of context and of the persistent objects in its state,
+    like its annotations and the behavior data stored in them.
+
+    The annotations are left out, and not loaded, when `annotations` is
+    false.
+    """
+    obs = [context]
+    context._p_activate()
+    for name, value in context.__dict__.items():
+        if name == '__annotations__' and not annotations:
+            continue
+        if isinstance(value, Persistent):
+            obs.append(value)
+    data = context.__dict__.get('__annotations__') if annotations else None
+    if data is not None:
+        for value in data.values():
+            if isinstance(value, Persistent):
+                obs.append(value)
+    serials = []
+    for ob in obs:
+        # Ghosts do not know their serial until they are loaded
+        ob._p_activate()
+        serials.append(ob._p_serial)
+    return serials
+
+
+def serializes_behaviors(serializer):
+    """Whether serializer renders any behavior with the `fields` and
+    `include` of its request, behaviors keep their data in annotations."""
+    fieldsets = get_fieldsets(serializer.request)
+    if not fieldsets:
+        return True
+    for schema_plan in get_serializer_plan(serializer.context):
+        if not schema_plan.behavior:
+            continue
+        names = serializer.get_schema_names(
+            schema_plan, fieldsets.get('fields'), fieldsets.get('include'))
+        if names is None or names:
+            return True
+    return False
+
+
+def get_fieldsets(request):
+    """Keyword arguments of the serializer from the comma separated
+    `fields` and `include` query parameters."""
+    params = {}
+    for name in ('fields', 'include'):
+        if name in request.GET:
+            params[name] = frozenset(
+                value.strip() for value in request.GET[name].split(',')
+                if value.strip())
+    return params
+
+
+def get_permission_checks(serializer):
+    """Read permissions of the fields of the serialized object and whether
+    the principals of the request have them.
+
+    Containers also list the items the principals can access, unless the
+    `fields` of the request leave them out.
+    """
+    permissions = sorted(set(
+        permission
+        for schema_plan in get_serializer_plan(serializer.context)
+        for name, field, permission in schema_plan.fields
+        if permission is not None))
+    checks = tuple(
+        (permission, serializer.check_permission(permission))
+        for permission in permissions)
+    fields = get_fieldsets(serializer.request).get('fields')
+    if hasattr(serializer, 'get_allowed_members') and (
+            fields is None or 'items' in fields):
+        members = serializer.get_allowed_members(len(serializer.context))
+        checks += (('items', tuple(member.__name__ for member in members)),)
+    return checks
+
+
+def get_cache_headers(context, request, serials=None, checks=None):
+    """ETag and Last-Modified headers of the representation of context.
+
+    The ETag changes with the serials of context, with the read
+    permissions the principals of the request have on its fields and,
+    like the serialization cache key, with the url of the object.
+    """
+    if serials is None:
+        serials = get_serials(context)
+    if checks is None:
+        checks = get_permission_checks(getMultiAdapter(
+            (context, request), IResourceSerializeToJson))
+    principals = sorted(
+        participation.principal.id
+        for participation in IInteraction(request).participations
+        if getattr(participation, 'principal', None) is not None)
+    fieldsets = sorted(
+        (name, sorted(names))
+        for name, names in get_fieldsets(request).items())
+    fingerprint = repr((
+        principals, checks, fieldsets,
+        request.headers.get('Accept-Language'),
+        get_content_path(context),
+        request.headers.get('X-VirtualHost-Monster'),
+        request.scheme,
+        request.host))
+
+    digest = hashlib.sha1(b''.join(serials))
+    digest.update(fingerprint.encode('utf-8'))
+    modified = max(TimeStamp(serial).timeTime() for serial in serials)
+    return {
+        'ETag': '"{}"'.format(digest.hexdigest()),
+        'Last-Modified': formatdate(modified, usegmt=True)
+    }
+
+
+def get_serialization_key(context, request, serials, checks):
+    """Key of the representation of context in the serialization cache.
+
+    Principals with the same read permissions on the fields share the
+    entry. The url of the object is part of the key as renaming a parent
+    does not change the serials of its children.
+    """
+    return (
+        request._db_id,
+        context._p_oid,
+        tuple(serials),
+        checks,
+        tuple(sorted(get_fieldsets(request).items())),
+        request.headers.get('Accept-Language'),
+        get_content_path(context),
+        request.headers.get('X-VirtualHost-Monster'),
+        request.scheme,
+        request.host)
+
+
+def etag_matches(header, etag):
+    if header.strip() == '*':
+        return True
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def is_not_modified(request, headers):
+    """Whether the conditional headers of request match headers."""
+    if 'If-None-Match' in request.headers:
+        return etag_matches(request.headers['If-None-Match'], headers['ETag'])
+    if 'If-Modified-Since' in request.headers:
+        try:
+            since = parsedate_to_datetime(request.headers['If-Modified-Since'])
+        except (TypeError, ValueError):
+            return False
+        modified = parsedate_to_datetime(headers['Last-Modified'])
+        return modified <= since
+    return False
+
+
+def check_if_match(context, request):
+    """Return a 412 error when If-Match does not match context."""
+    if 'If-Match' not in request.headers:
+        return None
+    etag = get_cache_headers(context, request)['ETag']
+    if not etag_matches(request.headers['If-Match'], etag):
+        return ErrorResponse(
+            'PreconditionFailed',
+            'The resource has been modified',
+            status=412)
+
 
 @configure.service(context=IResource, method='GET', permission='plone.ViewContent')
 class DefaultGET(Service):
@@ -50,9 +242,113 @@ class DefaultGET(Service):
         serializer = getMultiAdapter(
             (self.context, self.request),
             IResourceSerializeToJson)
-        result = serializer()
+        serials = get_serials(self.context, serializes_behaviors(serializer))
+        checks = get_permission_checks(serializer)
+        headers = get_cache_headers(
+            self.context, self.request, serials, checks)
+        if is_not_modified(self.request, headers):
+            await notify(ObjectFinallyVisitedEvent(self.context))
+            return Response(response=None, headers=headers, status=304)
+
+        fieldsets = get_fieldsets(self.request)
+        cache = get_serialization_cache()
+        if cache is None:
+            result = serializer(**fieldsets)
+        else:
+            key = get_serialization_key(
+                self.context, self.request, serials, checks)
+            result = cache.get(key)
+            if result is None:
+                result = serializer(**fieldsets)
+                cache.set(key, result)
+            # Frames are applied by the renderer and add keys to the result
+            result = dict(result)
         await notify(ObjectFinallyVisitedEvent(self.context))
-        return result
+        return Response(response=result, headers=headers)
+
+
+@configure.service(context=IContainer, method='GET', permission='plone.AccessContent',
+                   name='@items')
+class ItemsGET(DownloadService):
+    """Stream a page of the items of a folder.
+
+    `size` items are listed after the `cursor` of the previous page, the
+    response has the cursor of the next page in `next`. Items are listed
+    with their summary unless `fields` or `include` are given.
+    """
+
+    def encode_cursor(self, key):
+        return base64.urlsafe_b64encode(key.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, cursor):
+        return base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+
+    async def __call__(self):
+        try:
+            size = min(int(self.request.GET.get('size', ITEMS_PAGE_SIZE)),
+                       ITEMS_MAX_PAGE_SIZE)
+            if size < 1:
+                raise ValueError(size)
+        except ValueError:
+            return ErrorResponse(
+                'InvalidParameter', 'size must be a positive integer',
+                status=400)
+        after = None
+        if 'cursor' in self.request.GET:
+            try:
+                after = self.decode_cursor(self.request.GET['cursor'])
+            except (binascii.Error, UnicodeError):
+                return ErrorResponse(
+                    'InvalidParameter', 'Invalid cursor', status=400)
+
+        fieldsets = get_fieldsets(self.request)
+        encoder = get_json_encoder()
+        security = IInteraction(self.request)
+        headers = apply_cors(self.request)
+        headers['Content-Type'] = 'application/json'
+        resp = StreamResponse(headers=headers)
+        await resp.prepare(self.request)
+        resp.write(b'{"items": [')
+
+        keys = iter(self.context.keys(after))
+        count = 0
+        last = None
+        while count < size:
+            # Check the permission on as many members as still needed at once
+            batch = []
+            for key in keys:
+                if key == after or key.startswith('_'):
+                    continue
+                last = key
+                batch.append(self.context[key])
+                if len(batch) == size - count:
+                    break
+            if not batch:
+                break
+            for member in security.filter_allowed(
+                    'plone.AccessContent', batch):
+                if fieldsets:
+                    value = getMultiAdapter(
+                        (member, self.request),
+                        IResourceSerializeToJson)(**fieldsets)
+                else:
+                    value = getMultiAdapter(
+                        (member, self.request),
+                        IResourceSerializeToJsonSummary)()
+                if count:
+                    resp.write(b', ')
+                resp.write(encoder.encode(value))
+                count += 1
+            await resp.drain()
+
+        next_cursor = None
+        visible = (key for key in keys if not key.startswith('_'))
+        if count == size and next(visible, None) is not None:
+            next_cursor = self.encode_cursor(last)
+        resp.write(b'], "length": ' + encoder.encode(len(self.context)) +
+                   b', "next": ' + encoder.encode(next_cursor) + b'}')
+        await resp.drain()
+        return resp
 
 
 @configure.service(context=IResource, method='POST', permission='plone.AddContent')
@@ -153,6 +449,9 @@ class DefaultPUT(Service):
 @configure.service(context=IResource, method='PATCH', permission='plone.ModifyContent')
 class DefaultPATCH(Service):
     async def __call__(self):
+        failed = check_if_match(self.context, self.request)
+        if failed is not None:
+            return failed
         data = await self.get_data()
         behaviors = data.get('@behaviors', None)
         for behavior in behaviors or ():
@@ -292,7 +591,6 @@ async def sharing_post(context, request):
                 changed = True
                 func(permission, role)
 
-    context._p_changed = 1
     if changed:
         await notify(ObjectPermissionsModifiedEvent(context, data))
 
@@ -311,6 +609,9 @@ async def can_i_do(context, request):
 class DefaultDELETE(Service):
 
     async def __call__(self):
+        failed = check_if_match(self.context, self.request)
+        if failed is not None:
+            return failed
         content_id = self.context.id
         del self.context.__parent__[content_id]
         await notify(ObjectFinallyDeletedEvent(self.context))
@@ -43,13 +43,17 @@ async def search_post(context, request):
                    name='@catalog-reindex')
 class CatalogReindex(Service):
 
-    def __init__(self, context, request, security=False):
+    def __init__(self, context, request, security=False, changes=None):
         super(CatalogReindex, self).__init__(context, request)
         self._security_reindex = security
+        self._security_changes = changes
 
     async def __call__(self):
         search = queryUtility(ICatalogUtility)
-        await search.reindex_all_content(self.context, self._security_reindex)
+        if self._security_reindex:
+            await search.reindex_security(self.context, self._security_changes)
+        else:
+            await search.reindex_all_content(self.context)
         return {}
 
 
@@ -57,15 +61,17 @@ class CatalogReindex(Service):
                    name='@async-catalog-reindex')
 class AsyncCatalogReindex(Service):
 
-    def __init__(self, context, request, security=False):
+    def __init__(self, context, request, security=False, changes=None):
         super(AsyncCatalogReindex, self).__init__(context, request)
         self._security_reindex = security
+        self._security_changes = changes
 
     async def __call__(self):
         util = queryUtility(IQueueUtility)
         if util:
             await util.add(CatalogReindex(
-                self.context, self.request, self._security_reindex))
+                self.context, self.request, self._security_reindex,
+                self._security_changes))
         return {}
 
 
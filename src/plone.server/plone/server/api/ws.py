@@ -5,10 +5,13 @@ from datetime import timedelta
 from plone.server import app_settings
 from plone.server import jose
 from plone.server.api.service import Service
+from plone.server.auth import run_in_auth_executor
+from plone.server.auth.keys import get_rsa_keys
 from plone.server.browser import Response
 from plone.server import configure
 from plone.server import logger
 from plone.server.interfaces import ISite
+from plone.server.interfaces import SHARED_CONNECTION
 from plone.server.interfaces import ITraversableView
 from zope.component import getUtility
 from zope.component import queryMultiAdapter
@@ -34,7 +37,7 @@ class WebsocketGetToken(Service):
             'exp': int(exp.timestamp()),
             'token': real_token
         }
-        jwe = jose.encrypt(claims, app_settings['rsa']['priv'])
+        jwe = jose.encrypt(claims, get_rsa_keys()['priv'])
         token = jose.serialize_compact(jwe)
         return token.decode('utf-8')
 
@@ -45,10 +48,11 @@ class WebsocketGetToken(Service):
         if header_auth is not None:
             schema, _, encoded_token = header_auth.partition(' ')
             if schema.lower() == 'basic' or schema.lower() == 'bearer':
-                token = encoded_token.encode('ascii')
+                token = encoded_token
 
         # Create ws token
-        new_token = self.generate_websocket_token(token)
+        new_token = await run_in_auth_executor(
+            self.generate_websocket_token, token)
         return {
             "token": new_token
         }
@@ -59,8 +63,16 @@ class WebsocketGetToken(Service):
 class WebsocketsView(Service):
 
     async def __call__(self):
+        # avoid circular import
+        from plone.server.traversal import release_connection
+
         ws = web.WebSocketResponse()
         await ws.prepare(self.request)
+        site_oid = self.request.site._p_oid
+        if SHARED_CONNECTION is False:
+            # Messages are read from a snapshot of their own, the one of the
+            # handshake is not kept for the life of the socket
+            release_connection(self.request)
 
         async for msg in ws:
             if msg.tp == aiohttp.WSMsgType.text:
@@ -68,72 +80,13 @@ class WebsocketsView(Service):
                 if message['op'] == 'close':
                     await ws.close()
                 elif message['op'] == 'GET':
-                    method = app_settings['http_methods']['GET']
-                    path = tuple(p for p in message['value'].split('/') if p)
-
-                    # avoid circular import
-                    from plone.server.traversal import do_traverse
-
-                    obj, tail = await do_traverse(
-                        self.request, self.request.site, path)
-
-                    traverse_to = None
-
-                    if tail and len(tail) == 1:
-                        view_name = tail[0]
-                    elif tail is None or len(tail) == 0:
-                        view_name = ''
-                    else:
-                        view_name = tail[0]
-                        traverse_to = tail[1:]
-
-                    permission = getUtility(
-                        IPermission, name='plone.AccessContent')
-
-                    allowed = IInteraction(self.request).check_permission(
-                        permission.id, obj)
-                    if not allowed:
-                        response = {
-                            'error': 'Not allowed'
-                        }
-                        ws.send_str(ujson.dumps(response))
-
+                    if SHARED_CONNECTION is False:
+                        await self.open_connection(site_oid)
                     try:
-                        view = queryMultiAdapter(
-                            (obj, self.request), method, name=view_name)
-                    except AttributeError:
-                        view = None
-
-                    if traverse_to is not None:
-                        if view is None or not ITraversableView.providedBy(view):
-                            response = {
-                                'error': 'Not found'
-                            }
-                            ws.send_str(ujson.dumps(response))
-                        else:
-                            try:
-                                view = view.publishTraverse(traverse_to)
-                            except Exception as e:
-                                logger.error(
-                                    "Exception on view execution",
-                                    exc_info=e)
-                                response = {
-                                    'error': 'Not found'
-                                }
-                                ws.send_str(ujson.dumps(response))
-
-                    view_result = await view()
-                    if isinstance(view_result, Response):
-                        view_result = view_result.response
-
-                    # Return the value
-                    ws.send_str(ujson.dumps(view_result))
-
-                    # Wait for possible value
-                    futures_to_wait = self.request._futures.values()
-                    if futures_to_wait:
-                        await asyncio.gather(futures_to_wait)
-                        self.request._futures = {}
+                        await self.get(ws, message)
+                    finally:
+                        if SHARED_CONNECTION is False:
+                            release_connection(self.request)
                 else:
                     await ws.close()
             elif msg.tp == aiohttp.WSMsgType.error:
@@ -143,3 +96,78 @@ class WebsocketsView(Service):
         logger.debug('websocket connection closed')
 
         return {}
+
+    async def open_connection(self, site_oid):
+        """Open a read only connection for a message."""
+        db = self.request.application[self.request._db_id]
+        self.request.conn = await db.async_open(read_only=True)
+        self.request.site = self.request.conn.get(site_oid)
+        self.request.site_settings = self.request.site['_registry']
+
+    async def get(self, ws, message):
+        method = app_settings['http_methods']['GET']
+        path = tuple(p for p in message['value'].split('/') if p)
+
+        # avoid circular import
+        from plone.server.traversal import do_traverse
+
+        obj, tail = await do_traverse(
+            self.request, self.request.site, path)
+
+        traverse_to = None
+
+        if tail and len(tail) == 1:
+            view_name = tail[0]
+        elif tail is None or len(tail) == 0:
+            view_name = ''
+        else:
+            view_name = tail[0]
+            traverse_to = tail[1:]
+
+        permission = getUtility(
+            IPermission, name='plone.AccessContent')
+
+        allowed = IInteraction(self.request).check_permission(
+            permission.id, obj)
+        if not allowed:
+            response = {
+                'error': 'Not allowed'
+            }
+            ws.send_str(ujson.dumps(response))
+
+        try:
+            view = queryMultiAdapter(
+                (obj, self.request), method, name=view_name)
+        except AttributeError:
+            view = None
+
+        if traverse_to is not None:
+            if view is None or not ITraversableView.providedBy(view):
+                response = {
+                    'error': 'Not found'
+                }
+                ws.send_str(ujson.dumps(response))
+            else:
+                try:
+                    view = view.publishTraverse(traverse_to)
+                except Exception as e:
+                    logger.error(
+                        "Exception on view execution",
+                        exc_info=e)
+                    response = {
+                        'error': 'Not found'
+                    }
+                    ws.send_str(ujson.dumps(response))
+
+        view_result = await view()
+        if isinstance(view_result, Response):
+            view_result = view_result.response
+
+        # Return the value
+        ws.send_str(ujson.dumps(view_result))
+
+        # Wait for possible value
+        futures_to_wait = self.request._futures.values()
+        if futures_to_wait:
+            await asyncio.gather(futures_to_wait)
+            self.request._futures = {}
@@ -13,6 +13,7 @@ from zope.interface import Interface
 from zope.security.interfaces import Unauthorized
 from plone.server.interfaces import SHARED_CONNECTION
 from plone.server.transactions import abort
+from plone.server.transactions import bind_request
 from plone.server.transactions import commit
 
 import asyncio
@@ -44,19 +45,30 @@ class QueueUtility(object):
         self.app = app
         while True:
             got_obj = False
+            db = None
             try:
                 priority, view = await self._queue.get()
                 got_obj = True
-                if view.request.conn.transaction_manager is None:
-                    # Connection was closed
+                bind_request(view.request)
+                conn = getattr(view.request, 'conn', None)
+                tm = getattr(conn, 'transaction_manager', None)
+                if tm is None or getattr(tm, 'read_only', False):
+                    # Connection was released, closed or can not write
                     # Open DB
-                    db = view.request.application[view.request._db_id]
                     if SHARED_CONNECTION:
-                        view.request.conn = db.conn
+                        view.request.conn = view.request.application[
+                            view.request._db_id].conn
                     else:
-                        # Create a new conection
-                        view.request.conn = db.open()
+                        # Get a conection from the pool
+                        db = view.request.application[view.request._db_id]
+                        view.request.conn = await db.async_open()
+                    # Objects changed by the view join the new connection
+                    view.request._txn_dm = None
+                    view.request._txn_readCurrent = {}
                     view.context = view.request.conn.get(view.context._p_oid)
+                    site = getattr(view.request, 'site', None)
+                    if site is not None:
+                        view.request.site = view.request.conn.get(site._p_oid)
 
                 txn = view.request.conn.transaction_manager.begin(view.request)
                 try:
@@ -81,9 +93,13 @@ class QueueUtility(object):
                 self._exceptions = True
                 logger.error('Worker call failed', exc_info=e)
             finally:
-                if SHARED_CONNECTION is False and hasattr(view.request, 'conn'):
-                    view.request.conn.close()
+                if db is not None:
+                    # Only give back the connections we got from the pool,
+                    # the request owning the original one releases it
+                    db.release(view.request.conn)
+                    view.request.conn = None
                 if got_obj:
+                    bind_request(None)
                     self._queue.task_done()
 
     @property
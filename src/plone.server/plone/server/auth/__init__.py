@@ -1,10 +1,14 @@
 from plone.server import app_settings
+from plone.server import configure
+from plone.server.auth.cache import get_auth_cache
+from plone.server.auth.cache import invalidate_user
 from plone.server.auth.users import ROOT_USER_ID
 from plone.server.utils import resolve_or_get
 from zope.security.proxy import removeSecurityProxy
 from zope.security.interfaces import IInteraction
 from plone.server.interfaces import IRolePermissionMap
 from plone.server.interfaces import IPrincipalPermissionMap
+from plone.server.interfaces import INewUserAdded
 from plone.server.interfaces import IPrincipalRoleMap
 from plone.server.auth.security_code import principal_permission_manager
 from plone.server.auth.security_code import role_permission_manager
@@ -12,13 +16,43 @@ from plone.server.auth.security_code import principal_role_manager
 from . import groups
 from . import role
 from plone.server.transactions import get_current_request
+from concurrent.futures import ThreadPoolExecutor
+
+import asyncio
+
+
+_executor = None
+
+
+def get_auth_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=app_settings['auth_executor']['max_workers'])
+    return _executor
+
+
+async def run_in_auth_executor(func, *args):
+    """Run a CPU bound authentication function off the event loop."""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(get_auth_executor(), func, *args)
 
 
 async def authenticate_request(request):
+    cache = get_auth_cache()
     for policy in app_settings['auth_extractors']:
         policy = resolve_or_get(policy)
         token = await policy(request).extract_token()
         if token:
+            if cache is not None:
+                # Keyed before the validators add their claims to the token
+                key = cache.get_key(policy.name, token)
+                identity = cache.get(key)
+                if identity is not None:
+                    # Users are found again as they keep their request
+                    user = await find_user(request, identity)
+                    if user is not None:
+                        return user
             for validator in app_settings['auth_token_validators']:
                 validator = resolve_or_get(validator)
                 if (validator.for_validators is not None and
@@ -26,9 +60,25 @@ async def authenticate_request(request):
                     continue
                 user = await validator(request).validate(token)
                 if user is not None:
+                    if cache is not None:
+                        cache.set(
+                            key, get_identity(token, user), token.get('exp'))
                     return user
 
 
+def get_identity(token, user):
+    """Claims of a validated token, without the credential, to find user."""
+    identity = {
+        name: value for name, value in token.items() if name != 'token'}
+    identity['id'] = user.id
+    return identity
+
+
+@configure.subscriber(for_=INewUserAdded)
+def user_added(event):
+    invalidate_user(getattr(event.user, 'id', event.user))
+
+
 async def find_user(request, token):
     if token.get('id') == ROOT_USER_ID:
         return request.application.root_user
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+from plone.server import app_settings
+
+import collections
+import hashlib
+import threading
+import time
+
+
+class DecisionCache(object):
+    """Process wide LRU cache of permission decisions.
+
+    Keys contain the oids of the checked object, of its parents and of
+    their security maps. Entries are dropped when one of those oids is
+    invalidated, and decisions computed from a view of the database older
+    than the invalidation of one of their oids are not kept.
+    """
+
+    def __init__(self, max_size=10000, history_size=1000):
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+        # oid -> keys of the entries depending on the object
+        self._objects = {}
+        # generation and oids of the last invalidations
+        self.generation = 0
+        self._history = collections.deque(maxlen=history_size)
+        # invalidations come from the thread committing the transaction
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                decision = self._entries[key]
+            except KeyError:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return decision
+
+    def set(self, key, decision, generation):
+        """Keep decision unless an oid of key was invalidated after the
+        cache was at generation."""
+        db_id, chain = key[0]
+        with self._lock:
+            if self._invalidated_since(generation, chain):
+                return
+            if key not in self._entries:
+                for oid in chain:
+                    self._objects.setdefault(oid, set()).add(key)
+            self._entries[key] = decision
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                old_key, old_decision = self._entries.popitem(last=False)
+                self._forget(old_key)
+                self._evictions += 1
+
+    def _invalidated_since(self, generation, oids):
+        if self.generation == generation:
+            return False
+        if not self._history or self._history[0][0] > generation + 1:
+            # Older than the invalidations still known
+            return True
+        for invalidated_generation, invalidated in reversed(self._history):
+            if invalidated_generation <= generation:
+                break
+            if not invalidated.isdisjoint(oids):
+                return True
+        return False
+
+    def _forget(self, key):
+        db_id, chain = key[0]
+        for oid in chain:
+            keys = self._objects.get(oid)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._objects[oid]
+
+    def invalidate(self, oids):
+        with self._lock:
+            self.generation += 1
+            self._history.append((self.generation, frozenset(oids)))
+            for oid in oids:
+                for key in self._objects.pop(oid, ()):
+                    if key in self._entries:
+                        del self._entries[key]
+                        self._forget(key)
+                        self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._objects.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self._hits,
+            'misses': self._misses,
+            'evictions': self._evictions,
+            'invalidations': self._invalidations
+        }
+
+
+_decision_cache = None
+
+
+def get_decision_cache():
+    """The shared decision cache or None when it is disabled."""
+    global _decision_cache
+    settings = app_settings['security_cache']
+    if not settings.get('enabled'):
+        return None
+    if _decision_cache is None:
+        _decision_cache = DecisionCache(settings.get('max_size', 10000))
+    return _decision_cache
+
+
+def get_decision_generation():
+    """Generation of the shared decision cache, None when it is disabled."""
+    decision_cache = get_decision_cache()
+    if decision_cache is not None:
+        return decision_cache.generation
+
+
+def invalidate_decisions(oids):
+    """Drop the shared decisions depending on the given oids."""
+    if _decision_cache is not None:
+        _decision_cache.invalidate(oids)
+
+
+class AuthCache(object):
+    """LRU cache of the identities validated for a credential, for `ttl`
+    seconds.
+
+    Identities are the claims of the token with the id of the user, the user
+    is found from them for every request. Credentials are only kept as
+    digests. The entries of a user are dropped with `invalidate_user`.
+    """
+
+    def __init__(self, max_size=1000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        # digest -> (expiration, identity)
+        self._entries = collections.OrderedDict()
+        # user id -> digests of the entries of the user
+        self._users = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._expirations = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get_key(self, policy, token):
+        return hashlib.sha256(repr(
+            (policy, sorted(token.items()))).encode('utf-8')).digest()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                expiration, identity = self._entries[key]
+            except KeyError:
+                self._misses += 1
+                return None
+            if expiration <= time.time():
+                self._remove(key)
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return identity
+
+    def set(self, key, identity, expiration=None):
+        """Cache identity for at most ttl seconds or until expiration."""
+        timeout = time.time() + self.ttl
+        if expiration is not None:
+            timeout = min(timeout, expiration)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = timeout, identity
+            self._users.setdefault(identity['id'], set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def _remove(self, key):
+        expiration, identity = self._entries.pop(key)
+        keys = self._users.get(identity['id'])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._users[identity['id']]
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in self._users.pop(user_id, ()):
+                del self._entries[key]
+                self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._users.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self._hits,
+            'misses': self._misses,
+            'expirations': self._expirations,
+            'evictions': self._evictions,
+            'invalidations': self._invalidations
+        }
+
+
+_auth_cache = None
+
+
+def get_auth_cache():
+    """The authentication cache or None when it is disabled."""
+    global _auth_cache
+    settings = app_settings['auth_cache']
+    if not settings.get('enabled'):
+        return None
+    if _auth_cache is None:
+        _auth_cache = AuthCache(
+            settings.get('max_size', 1000), settings.get('ttl', 60))
+    return _auth_cache
+
+
+def invalidate_user(user_id):
+    """Forget the cached authentications of a user, to be called when its
+    password or roles change."""
+    if _auth_cache is not None:
+        _auth_cache.invalidate_user(user_id)
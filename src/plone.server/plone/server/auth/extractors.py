@@ -1,9 +1,15 @@
-from plone.server import app_settings
 from plone.server import jose
+from plone.server.auth import run_in_auth_executor
+from plone.server.auth.keys import get_rsa_keys
 
 import base64
 
 
+def decrypt_token(token):
+    return jose.decrypt(
+        jose.deserialize_compact(token), get_rsa_keys()['priv'])
+
+
 class BasePolicy(object):
     name = '<FILL IN>'
 
@@ -40,9 +46,7 @@ class WSTokenAuthPolicy(BasePolicy):
         request = self.request
         if 'ws_token' in request.GET:
             jwt_token = request.GET['ws_token'].encode('utf-8')
-            request.GET['ws_token'].encode('utf-8')
-            jwt = jose.decrypt(
-                jose.deserialize_compact(jwt_token), app_settings['rsa']['priv'])
+            jwt = await run_in_auth_executor(decrypt_token, jwt_token)
             return {
                 'type': 'wstoken',
                 'token': jwt.claims['token']
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from Crypto.PublicKey import RSA
+from plone.server import app_settings
+from plone.server import logger
+
+import os
+import threading
+import uuid
+
+
+KEY_SIZE = 2048
+
+_lock = threading.Lock()
+
+
+def get_rsa_keys():
+    """The `pub` and `priv` JWKs used to encrypt websocket tokens.
+
+    Unless configured in the `rsa` setting, the key is loaded from
+    `rsa_key_file` the first time it is needed and generated, then stored
+    there, when the file does not exist yet. Without `rsa_key_file` every
+    process generates its own key.
+    """
+    keys = app_settings.get('rsa')
+    if keys:
+        return keys
+    with _lock:
+        keys = app_settings.get('rsa')
+        if not keys:
+            key = load_rsa_key(app_settings.get('rsa_key_file'))
+            keys = app_settings['rsa'] = {
+                'pub': {'k': key.publickey().exportKey('PEM')},
+                'priv': {'k': key.exportKey('PEM')}
+            }
+        return keys
+
+
+def load_rsa_key(path=None):
+    if path is None:
+        return RSA.generate(KEY_SIZE)
+    try:
+        with open(path, 'rb') as key_file:
+            return RSA.importKey(key_file.read())
+    except FileNotFoundError:
+        pass
+
+    key = RSA.generate(KEY_SIZE)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # write the key apart and link it in place so workers starting at the
+    # same time all end up using the first key stored
+    tmp_path = '{}.{}'.format(path, uuid.uuid4().hex)
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    try:
+        with os.fdopen(fd, 'wb') as key_file:
+            key_file.write(key.exportKey('PEM'))
+        os.link(tmp_path, path)
+    except FileExistsError:
+        with open(path, 'rb') as key_file:
+            return RSA.importKey(key_file.read())
+    finally:
+        os.unlink(tmp_path)
+    logger.info('Stored a new RSA key in {}'.format(path))
+    return key
@@ -16,6 +16,7 @@
 
 import zope.interface
 
+from persistent import Persistent
 from zope.security.checker import CheckerPublic
 from zope.security.management import system_user
 from zope.security.interfaces import ISecurityPolicy
@@ -33,6 +34,7 @@ from plone.server.interfaces import IGroups
 from zope.component import getUtility
 from plone.server.transactions import get_current_request
 from plone.server import configure
+from plone.server.auth.cache import get_decision_cache
 from plone.server.interfaces.views import IView
 
 
@@ -60,6 +62,36 @@ class CacheEntry:
     pass
 
 
+def get_security_chain(request, obj):
+    """Database id and oids of obj, its persistent parents and their
+    security maps, with the generation of the decision cache when the
+    connection took its view of the database.
+
+    The security maps are not loaded. Returns None when the decisions on obj
+    can not be shared, like when an object of the chain has uncommitted
+    changes.
+    """
+    db_id = getattr(request, '_db_id', None)
+    generation = getattr(
+        getattr(obj, '_p_jar', None), 'decision_generation', None)
+    if db_id is None or generation is None:
+        return None
+    chain = []
+    while obj is not None:
+        if isinstance(obj, Persistent):
+            if obj._p_oid is None or obj._p_changed:
+                return None
+            chain.append(obj._p_oid)
+            # Security maps are stored apart from the content
+            for map in (getattr(obj, '__acl__', None) or {}).values():
+                if isinstance(map, Persistent):
+                    if map._p_oid is None or map._p_changed:
+                        return None
+                    chain.append(map._p_oid)
+        obj = removeSecurityProxy(getattr(obj, '__parent__', None))
+    return (db_id, tuple(chain)), generation
+
+
 @configure.adapter(
     for_=IRequest,
     provides=IInteraction)
@@ -132,9 +164,9 @@ class Interaction(object):
             # Check the permission, if its a view dont check permission on view
             if IView.providedBy(obj):
                 obj = obj.__parent__
-            if self.cached_decision(
+            if self.shared_decision(
                     obj,
-                    principal.id,
+                    principal,
                     self._groups_for(principal),
                     permission):
                 return True
@@ -143,6 +175,73 @@ class Interaction(object):
 
         return False
 
+    def filter_allowed(self, permission, objects):
+        """Return the objects the principals have the permission on.
+
+        The settings objects inherit from their parent are computed once per
+        parent, then only the local settings of each object are looked at.
+        """
+        # Always allow public attributes
+        if permission is CheckerPublic:
+            return list(objects)
+
+        principals = []
+        seen = {}
+        for participation in self.participations:
+            principal = getattr(participation, 'principal', None)
+            if principal is None or principal.id in seen:
+                continue
+            # System user always has access
+            if principal is system_user:
+                return list(objects)
+            seen[principal.id] = 1
+            principals.append(principal)
+
+        allowed = []
+        inherited = {}
+        for ob in objects:
+            obj = removeSecurityProxy(ob)
+            if IView.providedBy(obj):
+                obj = obj.__parent__
+            parent = removeSecurityProxy(getattr(obj, '__parent__', None))
+            for principal in principals:
+                self.principal = principal
+                groups = self._groups_for(principal)
+                key = (id(parent), principal.id)
+                try:
+                    settings = inherited[key]
+                except KeyError:
+                    settings = inherited[key] = (
+                        self.cached_principal_permission(
+                            parent, principal.id, groups, permission, 'p'),
+                        self.cached_roles(parent, permission, 'p'),
+                        self.cached_principal_roles(
+                            parent, principal.id, groups, 'p'))
+                if self.local_decision(
+                        obj, principal.id, groups, permission, *settings):
+                    allowed.append(ob)
+                    break
+        return allowed
+
+    def local_decision(self, obj, principal, groups, permission,
+                       prinper, roles, prin_roles):
+        # Same as cached_decision with the inherited settings of obj given
+        decision = self.local_principal_permission(
+            obj, principal, groups, permission, 'o')
+        if decision is None:
+            decision = prinper
+        if decision is not None:
+            return decision
+
+        roles = self.local_roles(obj, permission, 'o', roles)
+        if roles:
+            prin_roles = self.local_principal_roles(
+                obj, principal, groups, 'o', prin_roles)
+            for role, setting in prin_roles.items():
+                if setting and (role in roles):
+                    return True
+        return False
+
     def cache(self, parent):
         cache = self._cache.get(id(parent))
         if cache:
@@ -152,6 +251,48 @@ class Interaction(object):
             self._cache[id(parent)] = cache, parent
         return cache
 
+    def shared_decision(self, parent, principal, groups, permission):
+        # Return the decision from the cache shared by the requests when the
+        # security settings of parent and its parents are committed
+        decision_cache = get_decision_cache()
+        if decision_cache is not None:
+            cache = self.cache(parent)
+            try:
+                chain = cache.chain
+            except AttributeError:
+                chain = cache.chain = get_security_chain(self.request, parent)
+        else:
+            chain = None
+        if chain is None:
+            return self.cached_decision(
+                parent, principal.id, groups, permission)
+
+        chain, generation = chain
+        key = (chain, self.principal_key(principal, groups), permission)
+        decision = decision_cache.get(key)
+        if decision is None:
+            decision = bool(self.cached_decision(
+                parent, principal.id, groups, permission))
+            decision_cache.set(key, decision, generation)
+        return decision
+
+    def principal_key(self, principal, groups):
+        # The principal with its groups and their global roles and
+        # permissions
+        key = [(
+            principal.id,
+            frozenset(getattr(principal, 'roles', {}).items()),
+            frozenset(getattr(principal, 'permissions', {}).items()))]
+        if groups:
+            utility = getUtility(IGroups)
+            for group in groups:
+                group = utility.get_principal(group)
+                key.append((
+                    group.id,
+                    frozenset(group.roles.items()),
+                    frozenset(group.permissions.items())))
+        return tuple(key)
+
     def cached_decision(self, parent, principal, groups, permission):
         # Return the decision for a principal and permission
         cache = self.cache(parent)
@@ -236,22 +377,12 @@ class Interaction(object):
             cache_prin_per[permission] = prinper
             return prinper
 
-        # Get the local map of the permissions
         # As we want to quit as soon as possible we check first locally
-        prinper_map = IPrincipalPermissionMap(parent, None)
-        if prinper_map is not None:
-            prinper = level_setting_as_boolean(
-                level, prinper_map.get_setting(permission, principal, None))
-            if prinper is None:
-                for group in groups:
-                    prinper = level_setting_as_boolean(
-                        level,
-                        prinper_map.get_setting(permission, group, None))
-                    if prinper is not None:
-                        continue
-            if prinper is not None:
-                cache_prin_per[permission] = prinper
-                return prinper
+        prinper = self.local_principal_permission(
+            parent, principal, groups, permission, level)
+        if prinper is not None:
+            cache_prin_per[permission] = prinper
+            return prinper
 
         # Find the permission recursivelly set to a user
         parent = removeSecurityProxy(getattr(parent, '__parent__', None))
@@ -260,6 +391,23 @@ class Interaction(object):
         cache_prin_per[permission] = prinper
         return prinper
 
+    def local_principal_permission(
+            self, parent, principal, groups, permission, level):
+        # Get the local map of the permissions
+        prinper_map = IPrincipalPermissionMap(parent, None)
+        if prinper_map is None:
+            return None
+        prinper = level_setting_as_boolean(
+            level, prinper_map.get_setting(permission, principal, None))
+        if prinper is None:
+            for group in groups:
+                prinper = level_setting_as_boolean(
+                    level,
+                    prinper_map.get_setting(permission, group, None))
+                if prinper is not None:
+                    continue
+        return prinper
+
     def global_principal_roles(self, principal, groups):
         roles = dict(
             [(role, SettingAsBoolean[setting])
@@ -300,6 +448,12 @@ class Interaction(object):
             groups,
             'p')
 
+        roles = self.local_principal_roles(
+            parent, principal, groups, level, roles)
+        cache_principal_roles[principal] = roles
+        return roles
+
+    def local_principal_roles(self, parent, principal, groups, level, roles):
         # We check the local map of roles
         prinrole = IPrincipalRoleMap(parent, None)
 
@@ -312,8 +466,6 @@ class Interaction(object):
                 for role, setting in prinrole.get_roles_for_principal(
                         group):
                     roles[role] = level_setting_as_boolean(level, setting)
-
-        cache_principal_roles[principal] = roles
         return roles
 
     def _groups_for(self, principal):
@@ -345,6 +497,13 @@ class Interaction(object):
         roles = self.cached_roles(
             removeSecurityProxy(getattr(parent, '__parent__', None)),
             permission, 'p')
+        roles = self.local_roles(parent, permission, level, roles)
+
+        if level != 'o':
+            cache_roles[permission] = roles
+        return roles
+
+    def local_roles(self, parent, permission, level, roles):
         roleper = IRolePermissionMap(parent, None)
         if roleper:
             roles = roles.copy()
@@ -355,9 +514,6 @@ class Interaction(object):
                     roles[role] = 1
                 elif setting is Deny and role in roles:
                     del roles[role]
-
-        if level != 'o':
-            cache_roles[permission] = roles
         return roles
 
     def cached_principals(self, parent, roles, permission, level):
@@ -1,6 +1,8 @@
+from persistent import Persistent
 from zope.security.interfaces import IInteraction
 from plone.server.transactions import get_current_request
 from plone.server.transactions import RequestNotFound
+from plone.server.auth.cache import invalidate_decisions
 
 
 class SecurityMap(object):
@@ -104,6 +106,33 @@ class SecurityMap(object):
         return res
 
 
+class PersistentSecurityMap(Persistent, SecurityMap):
+    """Security map stored apart from the content it belongs to.
+
+    Changing the settings only writes the map and the maps are only loaded
+    when the security of the content is looked at.
+    """
+
+
+def persist_acl(context):
+    """Move the security maps stored in the pickle of context by older
+    versions to their own persistent objects."""
+    acl = context.__acl__
+    if not acl:
+        return False
+    changed = False
+    for key, map in list(acl.items()):
+        if not isinstance(map, PersistentSecurityMap):
+            new_map = PersistentSecurityMap()
+            new_map._byrow = map._byrow
+            new_map._bycol = map._bycol
+            acl[key] = new_map
+            changed = True
+    if changed:
+        context._p_changed = 1
+    return changed
+
+
 class PloneSecurityMap(SecurityMap):
 
     def __init__(self, context):
@@ -119,15 +148,20 @@ class PloneSecurityMap(SecurityMap):
 
     def _changed(self):
         map = self.map
+        invalidate_decisions([
+            oid for oid in (self.context._p_oid, getattr(map, '_p_oid', None))
+            if oid is not None])
+        if isinstance(map, PersistentSecurityMap):
+            map._p_changed = 1
+            return
         if self.context.__acl__ is None:
             self.context.__acl__ = dict({})
-        if map is None:
-            map = SecurityMap()
-            map._byrow = self._byrow
-            map._bycol = self._bycol
-            self.context.__acl__[self.key] = map
-        else:
-            self.context._p_changed = 1
+        # New map or one stored in the content pickle by older versions
+        map = self.map = PersistentSecurityMap()
+        map._byrow = self._byrow
+        map._bycol = self._bycol
+        self.context.__acl__[self.key] = map
+        self.context._p_changed = 1
 
     def add_cell(self, rowentry, colentry, value):
         if SecurityMap.add_cell(self, rowentry, colentry, value):
@@ -1,7 +1,11 @@
 from plone.server import app_settings
 from plone.server.auth import find_user
+from plone.server.auth import run_in_auth_executor
+from plone.server.interfaces import WRITING_VERBS
+from plone.server.transactions import add_to_transaction
 from plone.server.utils import strings_differ
 
+import binascii
 import hashlib
 import jwt
 import uuid
@@ -14,7 +18,16 @@ class BaseValidator(object):
         self.request = request
 
 
-def hash_password(password, salt=None, algorithm='sha512'):
+def hash_password(password, salt=None, algorithm=None, iterations=None):
+    """Hash password as `algorithm:iterations:salt:hash` with PBKDF2.
+
+    hashlib algorithms like the `sha512` of older versions give the
+    `algorithm:salt:hash` of a single salted pass.
+    """
+    settings = app_settings['password_hashing']
+    if algorithm is None:
+        algorithm = settings.get('algorithm', 'pbkdf2_sha512')
+
     if salt is None:
         salt = uuid.uuid4().hex
 
@@ -24,11 +37,53 @@ def hash_password(password, salt=None, algorithm='sha512'):
     if isinstance(password, str):
         password = password.encode('utf-8')
 
-    hash_func = getattr(hashlib, algorithm)
+    if algorithm.startswith('pbkdf2_'):
+        if iterations is None:
+            iterations = settings.get('iterations', 100000)
+        hashed_password = hashlib.pbkdf2_hmac(
+            algorithm[len('pbkdf2_'):], password, salt, iterations)
+        return '{}:{}:{}:{}'.format(
+            algorithm, iterations, salt.decode('utf-8'),
+            binascii.hexlify(hashed_password).decode('ascii'))
+
+    hash_func = getattr(hashlib, algorithm, None)
+    if hash_func is None:
+        raise ValueError('Unknown password hashing algorithm ' + algorithm)
     hashed_password = hash_func(password + salt).hexdigest()
     return '{}:{}:{}'.format(algorithm, salt.decode('utf-8'), hashed_password)
 
 
+def check_password(password, hashed_password):
+    split = hashed_password.split(':')
+    if len(split) == 4:
+        algorithm, iterations, salt = split[:3]
+        try:
+            iterations = int(iterations)
+        except ValueError:
+            return False
+    elif len(split) == 3:
+        algorithm, salt = split[:2]
+        iterations = None
+    else:
+        return False
+    try:
+        return not strings_differ(
+            hash_password(password, salt, algorithm, iterations),
+            hashed_password)
+    except ValueError:
+        # Unknown algorithm
+        return False
+
+
+def needs_rehash(hashed_password):
+    """Whether hashed_password was not hashed with the current settings."""
+    settings = app_settings['password_hashing']
+    split = hashed_password.split(':')
+    return len(split) != 4 or split[:2] != [
+        settings.get('algorithm', 'pbkdf2_sha512'),
+        str(settings.get('iterations', 100000))]
+
+
 class SaltedHashPasswordValidator(object):
     for_validators = ('basic', )
 
@@ -42,13 +97,30 @@ class SaltedHashPasswordValidator(object):
                 ':' not in user_pw or
                 'token' not in token):
             return
-        split = user.password.split(':')
-        if len(split) != 3:
-            return False
-        algorithm = split[0]
-        salt = split[1]
-        if not strings_differ(hash_password(token['token'], salt, algorithm), user_pw):
-            return user
+        if not await run_in_auth_executor(
+                check_password, token['token'], user_pw):
+            return
+        if needs_rehash(user_pw):
+            await self.rehash(user, token['token'])
+        return user
+
+    async def rehash(self, user, password):
+        """Store password hashed with the current settings on user.
+
+        Users stored in a database are changed in the transaction of write
+        requests, other requests leave them to a later login.
+        """
+        jar = getattr(user, '_p_jar', None)
+        if jar is not None and (
+                self.request.method not in WRITING_VERBS or
+                getattr(jar.transaction_manager, 'read_only', False)):
+            return
+        password = await run_in_auth_executor(hash_password, password)
+        if jar is None:
+            user.password = password
+        else:
+            add_to_transaction(
+                self.request, setattr, user, 'password', password)
 
 
 class JWTValidator(object):
@@ -71,6 +143,8 @@ class JWTValidator(object):
                 app_settings['jwt']['secret'],
                 algorithms=[app_settings['jwt']['algorithm']])
             token['id'] = validated_jwt['id']
+            if 'exp' in validated_jwt:
+                token['exp'] = validated_jwt['exp']
             user = await find_user(self.request, token)
             if user is not None and user.id == token['id']:
                 return user
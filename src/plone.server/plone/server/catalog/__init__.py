@@ -20,29 +20,29 @@ index.apply(IResource, 'modification_date', type='date')
 index.apply(IResource, 'creation_date', type='date')
 
 
-@index.with_accessor(IResource, 'access_roles', type='keyword')
+@index.with_accessor(IResource, 'access_roles', type='keyword', fields=())
 def get_access_roles(ob):
     roles = get_roles_with_access_content(ob)
     return roles
 
 
-@index.with_accessor(IResource, 'access_users', type='keyword')
+@index.with_accessor(IResource, 'access_users', type='keyword', fields=())
 def get_access_users(ob):
     # Users that has specific access to the object
     users = get_principals_with_access_content(ob)
     return users
 
-@index.with_accessor(IResource, 'path', type='path')
+@index.with_accessor(IResource, 'path', type='path', fields=())
 def get_path(ob):
     return get_content_path(ob)
 
 
-@index.with_accessor(IResource, 'depth', type='int')
+@index.with_accessor(IResource, 'depth', type='int', fields=())
 def get_depth(ob):
     return get_content_depth(ob)
 
 
-@index.with_accessor(IResource, 'parent_uuid', type='keyword')
+@index.with_accessor(IResource, 'parent_uuid', type='keyword', fields=())
 def get_parent_uuid(ob):
     if hasattr(ob, '__parent__')\
             and ob.__parent__ is not None:
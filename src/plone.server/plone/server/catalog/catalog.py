@@ -1,17 +1,17 @@
 # -*- coding: utf-8 -*-
 from plone.server import configure
 from plone.server.catalog import NoIndexField
-from plone.server.content import iter_schemata_for_type
-from plone.server.directives import index
-from plone.server.directives import merged_tagged_value_dict
-from plone.server.directives import merged_tagged_value_list
-from plone.server.directives import metadata
+from plone.server.catalog.utils import get_catalog_plan
+from plone.server.catalog.utils import iter_security_data
 from plone.server.interfaces import ICatalogDataAdapter
 from plone.server.interfaces import ICatalogUtility
 from plone.server.interfaces import IResource
-from plone.server.json.serialize_value import json_compatible
+from plone.server.interfaces import ISite
 from zope.component import queryAdapter
+from plone.server.transactions import get_current_request
+from plone.server.utils import get_site
 from zope.interface import implementer
+from zope.security.interfaces import IInteraction
 from plone.server.auth import principal_permission_manager
 from plone.server.auth import role_permission_manager
 from plone.server.auth import get_principals_with_access_content
@@ -26,56 +26,98 @@ global_roles_for_permission = role_permission_manager.get_roles_for_permission
 @implementer(ICatalogUtility)
 class DefaultSearchUtility(object):
 
-    async def search(self, query):
+    # Whether index() merges partial data into the stored documents
+    partial_updates = False
+    # Documents sent per index() call by security reindexes
+    security_batch_size = 100
+
+    async def search(self, site, query):
+        pass
+
+    async def query(self, site, query):
         pass
 
-    async def get_by_uuid(self, uuid):
+    async def get_by_uuid(self, site, uuid):
         pass
 
-    async def get_object_by_uuid(self, uuid):
+    async def get_object_by_uuid(self, site, uuid):
         pass
 
-    async def get_by_type(self, doc_type, query={}):
+    async def get_by_type(self, site, doc_type, query={}):
         pass
 
     async def get_by_path(self, site, path, depth=-1, query={}, doc_type=None):
         pass
 
-    async def get_folder_contents(self, obj):
+    async def get_folder_contents(self, site, obj):
         pass
 
-    async def index(self, datas):
+    async def index(self, site, datas):
         """
         {uid: <dict>}
         """
         pass
 
-    async def remove(self, uids):
+    async def remove(self, site, uids):
         """
         list of UIDs to remove from index
         """
         pass
 
-    async def reindex_all_content(self):
+    async def reindex_all_content(self, obj, security=False):
         """ For all Dexterity Content add a queue task that reindex the object
         """
         pass
 
-    async def initialize_catalog(self):
+    async def reindex_security(self, obj, changes=None):
+        """ Reindex the access of obj and the content below it
+
+        changes are the roles and principals that changed, see
+        `get_security_changes`.
+        """
+        if changes is not None and not changes:
+            return
+        if not self.partial_updates:
+            await self.reindex_all_content(obj, security=True)
+            return
+        request = get_current_request()
+        # The connection of request.site may be back in the pool when the
+        # reindex was queued
+        site = get_site(obj)
+        if site is None:
+            return
+        # Access computed before the change can not be reused
+        IInteraction(request).invalidate_cache()
+        datas = {}
+        for ob, data in iter_security_data(obj, changes):
+            if ISite.providedBy(ob):
+                continue
+            datas[ob.uuid] = dict(
+                data, uuid=ob.uuid, portal_type=ob.portal_type)
+            if len(datas) >= self.security_batch_size:
+                await self.index(site, datas)
+                datas = {}
+        await self.index(site, datas)
+
+    async def initialize_catalog(self, site):
         """ Creates an index
         """
         pass
 
-    async def remove_catalog(self):
+    async def remove_catalog(self, site):
         """ Deletes an index
         """
         pass
 
-    def get_data(self, content):
+    def get_data(self, content, indexes=None):
+        """Catalog data of content, only for the names in indexes if given."""
         data = {}
         adapter = queryAdapter(content, ICatalogDataAdapter)
         if adapter:
-            data.update(adapter())
+            if indexes is None:
+                data.update(adapter())
+            else:
+                data.update(adapter(indexes))
         return data
 
 
@@ -103,35 +145,25 @@ class DefaultCatalogDataAdapter(object):
     def __init__(self, content):
         self.content = content
 
-    def get_data(self, ob, iface, field_name):
-        try:
-            field = iface[field_name]
-            real_field = field.bind(ob)
-            try:
-                value = real_field.get(ob)
-                return json_compatible(value)
-            except AttributeError:
-                pass
-        except KeyError:
-            pass
-
-        return json_compatible(getattr(ob, field_name, None))
-
-    def __call__(self):
-        # For each type
+    def __call__(self, indexes=None):
         values = {}
-
-        for schema in iter_schemata_for_type(self.content.portal_type):
-            behavior = schema(self.content)
-            for index_name, index_data in merged_tagged_value_dict(schema, index.key).items():
-                try:
-                    if 'accessor' in index_data:
-                        values[index_name] = index_data['accessor'](behavior)
-                    else:
-                        values[index_name] = self.get_data(behavior, schema, index_name)
-                except NoIndexField:
-                    pass
-            for metadata_name in merged_tagged_value_list(schema, metadata.key):
-                values[metadata_name] = self.get_data(behavior, schema, metadata_name)
+        behaviors = {}
+        if indexes is not None:
+            indexes = set(indexes)
+
+        for schema, name, getter, converter, triggers in get_catalog_plan(self.content):
+            if indexes is not None and triggers is not None and \
+                    triggers.isdisjoint(indexes):
+                continue
+            behavior = behaviors.get(schema)
+            if behavior is None:
+                behavior = behaviors[schema] = schema(self.content)
+            try:
+                value = getter(behavior)
+            except NoIndexField:
+                continue
+            if converter is not None:
+                value = converter(value)
+            values[name] = value
 
         return values
@@ -0,0 +1,538 @@
+# -*- coding: utf-8 -*-
+"""Catalog stored in the site database, indexed with BTrees.
+
+Configure it as the catalog utility of the application::
+
+    "utilities": [{
+        "provides": "plone.server.interfaces.ICatalogUtility",
+        "factory": "plone.server.catalog.embedded.EmbeddedSearchUtility",
+        "settings": {}
+    }]
+
+Queries are dicts of index name to value. Keyword and field indexes match
+any of a list of values and field indexes match ranges with
+`{"min": .., "max": ..}`. Text indexes match all the words of a string and
+path indexes match `"/path"` or `{"query": "/path", "depth": 1}`. The
+`_sort_on`, `_sort_order` (`"reverse"`), `_from` and `_size` keys control
+the result list.
+"""
+from BTrees.IIBTree import IITreeSet
+from BTrees.IIBTree import intersection
+from BTrees.IIBTree import multiunion
+from BTrees.IOBTree import IOBTree
+from BTrees.Length import Length
+from BTrees.OIBTree import OIBTree
+from BTrees.OOBTree import OOBTree
+from persistent import Persistent
+from plone.server.browser import get_physical_path
+from plone.server.catalog.catalog import DefaultSearchUtility
+from plone.server.catalog.utils import get_index_fields
+from plone.server.interfaces import IResource
+from plone.server.transactions import get_current_request
+from plone.server.utils import get_site
+from zope.security.interfaces import IInteraction
+
+import random
+import re
+
+
+CATALOG_ID = '_catalog'
+
+_words = re.compile(r'\w+', re.UNICODE)
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [v for v in value if v is not None]
+    return [value]
+
+
+class KeywordIndex(Persistent):
+    """Exact values, a document can have many of them."""
+
+    def __init__(self):
+        self._fwd = OOBTree()
+        self._rev = IOBTree()
+        self.length = Length()
+
+    def _key(self, value):
+        # Keys of different types can not be compared in the BTrees
+        return value if isinstance(value, str) else str(value)
+
+    def _values(self, value):
+        # Only hashable, comparable values can be indexed
+        return tuple(sorted(set(
+            self._key(v) for v in _as_list(value)
+            if isinstance(v, (str, int, float, bool)))))
+
+    def index_doc(self, docid, value):
+        values = self._values(value)
+        old = self._rev.get(docid)
+        if old == values:
+            return
+        if old is not None:
+            self.unindex_doc(docid)
+        if not values:
+            return
+        for v in values:
+            docids = self._fwd.get(v)
+            if docids is None:
+                docids = self._fwd[v] = IITreeSet()
+            docids.insert(docid)
+        self._rev[docid] = values
+        self.length.change(1)
+
+    def unindex_doc(self, docid):
+        values = self._rev.get(docid)
+        if values is None:
+            return
+        for v in values:
+            docids = self._fwd.get(v)
+            if docids is None:
+                continue
+            docids.remove(docid)
+            if not docids:
+                del self._fwd[v]
+        del self._rev[docid]
+        self.length.change(-1)
+
+    def value(self, docid):
+        values = self._rev.get(docid)
+        if values:
+            return values[0]
+
+    def apply(self, query):
+        if isinstance(query, dict):
+            values = [self._key(v) for v in _as_list(query.get('query'))]
+            if query.get('operator') == 'and':
+                return intersection_all(
+                    [self._fwd.get(v, IITreeSet()) for v in values])
+        else:
+            values = [self._key(v) for v in _as_list(query)]
+        return multiunion([self._fwd[v] for v in values if v in self._fwd])
+
+
+class FieldIndex(KeywordIndex):
+    """Sortable values (dates, numbers) that can be queried by range."""
+
+    def _key(self, value):
+        # Ranges compare the values themselves
+        return value
+
+    def apply(self, query):
+        if isinstance(query, dict) and ('min' in query or 'max' in query):
+            try:
+                sets = list(self._fwd.values(
+                    query.get('min'), query.get('max')))
+            except TypeError:
+                # Range of another type than the indexed values
+                return IITreeSet()
+            return multiunion(sets)
+        return super(FieldIndex, self).apply(query)
+
+
+class TextIndex(KeywordIndex):
+    """Words of a text, queries match documents with all the words."""
+
+    def _values(self, value):
+        words = set()
+        for v in _as_list(value):
+            if isinstance(v, str):
+                words.update(_words.findall(v.lower()))
+        return tuple(sorted(words))
+
+    def apply(self, query):
+        if isinstance(query, dict):
+            query = query.get('query')
+        words = self._values(query)
+        if not words:
+            return IITreeSet()
+        return intersection_all(
+            [self._fwd.get(word, IITreeSet()) for word in words])
+
+
+class PathIndex(KeywordIndex):
+    """Content paths, queries match a path and the content below it."""
+
+    def _values(self, value):
+        if not isinstance(value, str):
+            return ()
+        parts = [p for p in value.split('/') if p]
+        # Every parent path of the document plus its depth
+        return tuple(
+            '/' + '/'.join(parts[:idx]) for idx in range(len(parts) + 1))
+
+    def value(self, docid):
+        values = self._rev.get(docid)
+        if values:
+            return values[-1]
+
+    def apply(self, query):
+        depth = -1
+        if isinstance(query, dict):
+            depth = query.get('depth', -1)
+            query = query.get('query')
+        if not isinstance(query, str):
+            return IITreeSet()
+        path = '/' + '/'.join(p for p in query.split('/') if p)
+        docids = self._fwd.get(path)
+        if docids is None:
+            return IITreeSet()
+        if depth < 0:
+            return docids
+        level = len([p for p in path.split('/') if p])
+        result = IITreeSet()
+        for docid in docids:
+            if len(self._rev[docid]) - 1 - level <= depth:
+                result.insert(docid)
+        return result
+
+
+INDEX_TYPES = {
+    'keyword': KeywordIndex,
+    'textkeyword': KeywordIndex,
+    'boolean': KeywordIndex,
+    'int': FieldIndex,
+    'long': FieldIndex,
+    'float': FieldIndex,
+    'date': FieldIndex,
+    'text': TextIndex,
+    'searchabletext': TextIndex,
+    'path': PathIndex
+}
+
+
+def intersection_all(sets):
+    if not sets:
+        return IITreeSet()
+    sets = sorted(sets, key=len)
+    result = sets[0]
+    for docids in sets[1:]:
+        if not result:
+            break
+        result = intersection(result, docids)
+    return result
+
+
+class Catalog(Persistent):
+    """Indexes and metadata of the content of a site."""
+
+    __name__ = CATALOG_ID
+    portal_type = 'Catalog'
+
+    def __init__(self):
+        self.indexes = OOBTree()
+        self.uids = OIBTree()
+        self.documents = IOBTree()
+        self.length = Length()
+        super(Catalog, self).__init__()
+
+    def __len__(self):
+        return self.length()
+
+    def _new_docid(self):
+        # Random ids keep concurrent writers in different buckets
+        while True:
+            docid = random.randint(-2 ** 31, 2 ** 31 - 1)
+            if docid not in self.documents:
+                return docid
+
+    def get_index(self, name, type_=None):
+        index = self.indexes.get(name)
+        if index is None and type_ in INDEX_TYPES:
+            index = self.indexes[name] = INDEX_TYPES[type_]()
+        return index
+
+    def index_doc(self, uid, data, index_types):
+        """Index data of uid, index_types maps index names to their type."""
+        docid = self.uids.get(uid)
+        if docid is None:
+            docid = self._new_docid()
+            self.uids[uid] = docid
+            self.length.change(1)
+            document = {}
+        else:
+            document = dict(self.documents[docid])
+        document.update(data)
+        self.documents[docid] = document
+        for name, value in data.items():
+            index = self.get_index(name, index_types.get(name))
+            if index is not None:
+                index.index_doc(docid, value)
+        return docid
+
+    def unindex_doc(self, uid):
+        docid = self.uids.get(uid)
+        if docid is None:
+            return
+        for index in self.indexes.values():
+            index.unindex_doc(docid)
+        del self.documents[docid]
+        del self.uids[uid]
+        self.length.change(-1)
+
+    def get_document(self, uid):
+        docid = self.uids.get(uid)
+        if docid is not None:
+            return self.documents[docid]
+
+    def apply(self, query):
+        """Return the docids matching all the indexes of the query."""
+        sets = []
+        for name, value in query.items():
+            if name.startswith('_'):
+                continue
+            index = self.indexes.get(name)
+            if index is None:
+                return IITreeSet()
+            sets.append(index.apply(value))
+        if not sets:
+            return IITreeSet(self.documents.keys())
+        return intersection_all(sets)
+
+    def sort(self, docids, sort_on, reverse=False):
+        index = self.indexes.get(sort_on)
+        if index is None:
+            return list(docids)
+        found = []
+        missing = []
+        for docid in docids:
+            value = index.value(docid)
+            if value is None:
+                missing.append(docid)
+            else:
+                found.append((value, docid))
+        try:
+            found.sort(reverse=reverse)
+        except TypeError:
+            found.sort(key=lambda item: str(item[0]), reverse=reverse)
+        return [docid for value, docid in found] + missing
+
+    def __repr__(self):
+        path = '/'.join([name or 'n/a' for name in get_physical_path(self)])
+        return "< Catalog at {path} by {mem} >".format(
+            path=path,
+            mem=id(self))
+
+
+class EmbeddedSearchUtility(DefaultSearchUtility):
+    """Catalog utility storing its BTrees indexes in the site.
+
+    Indexing runs before the transaction commits so the catalog always
+    matches the content it was committed with.
+    """
+
+    transactional = True
+    partial_updates = True
+
+    def __init__(self, settings={}):
+        self.settings = settings
+
+    async def initialize(self, app=None):
+        pass
+
+    async def finalize(self, app=None):
+        pass
+
+    def get_catalog(self, site, create=False):
+        try:
+            return site[CATALOG_ID]
+        except KeyError:
+            if not create:
+                return None
+        site[CATALOG_ID] = catalog = Catalog()
+        return catalog
+
+    async def initialize_catalog(self, site):
+        self.get_catalog(site, create=True)
+
+    async def remove_catalog(self, site):
+        if CATALOG_ID in site:
+            del site[CATALOG_ID]
+
+    def index_types(self, portal_type):
+        return {name: data.get('type', 'text')
+                for name, data in get_index_fields(portal_type).items()}
+
+    async def index(self, site, datas):
+        """
+        {uid: <dict>}
+        """
+        if not datas:
+            return
+        catalog = self.get_catalog(site, create=True)
+        types = {}
+        for uid, data in datas.items():
+            portal_type = data.get('portal_type')
+            if portal_type not in types:
+                types[portal_type] = self.index_types(portal_type)
+            catalog.index_doc(uid, data, types[portal_type])
+
+    async def remove(self, site, uids):
+        """
+        list of UIDs (or (uid, portal_type, path) tuples) to remove
+        """
+        if not uids:
+            return
+        catalog = self.get_catalog(site)
+        if catalog is None:
+            return
+        for uid in uids:
+            if isinstance(uid, (list, tuple)):
+                uid = uid[0]
+            catalog.unindex_doc(uid)
+
+    def _security_query(self, request=None):
+        if request is None:
+            request = get_current_request()
+        interaction = IInteraction(request)
+        users = []
+        roles = []
+        for participation in interaction.participations:
+            principal = participation.principal
+            if principal is None:
+                continue
+            groups = getattr(principal, 'groups', ())
+            users.append(principal.id)
+            users.extend(groups)
+            # The global roles of the user are only given for the principal
+            # of the interaction, like when checking permissions
+            interaction.principal = principal
+            roles.extend([
+                role for role, setting in interaction.global_principal_roles(
+                    principal.id, groups).items()
+                if setting])
+        return users, roles
+
+    def _allowed(self, catalog):
+        users, roles = self._security_query()
+        sets = []
+        if 'access_roles' in catalog.indexes:
+            sets.append(catalog.indexes['access_roles'].apply(roles))
+        if 'access_users' in catalog.indexes:
+            sets.append(catalog.indexes['access_users'].apply(users))
+        return multiunion(sets)
+
+    def _result(self, catalog, docids, query):
+        query = query or {}
+        docids = intersection(docids, self._allowed(catalog))
+        if query.get('_sort_on'):
+            docids = catalog.sort(
+                docids, query['_sort_on'],
+                reverse=query.get('_sort_order') == 'reverse')
+        else:
+            docids = list(docids)
+        start = query.get('_from', 0)
+        size = query.get('_size', 10)
+        members = [dict(catalog.documents[docid])
+                   for docid in docids[start:start + size]]
+        return {
+            'items_count': len(docids),
+            'member': members
+        }
+
+    def _empty(self):
+        return {
+            'items_count': 0,
+            'member': []
+        }
+
+    async def query(self, site, query):
+        """
+        Raw query, dict of index names to values
+        """
+        catalog = self.get_catalog(site)
+        if catalog is None:
+            return self._empty()
+        return self._result(catalog, catalog.apply(query), query)
+
+    def _text_docids(self, catalog, text):
+        words = TextIndex()._values(text)
+        text_indexes = [index for index in catalog.indexes.values()
+                        if isinstance(index, TextIndex)]
+        sets = []
+        for word in words:
+            sets.append(multiunion([
+                index._fwd[word] for index in text_indexes
+                if word in index._fwd]))
+        return intersection_all(sets)
+
+    async def search(self, site, query):
+        """
+        String search query, documents with all the words in any text index
+        """
+        catalog = self.get_catalog(site)
+        if catalog is None:
+            return self._empty()
+        return self._result(catalog, self._text_docids(catalog, query), {})
+
+    async def get_by_uuid(self, site, uid):
+        catalog = self.get_catalog(site)
+        if catalog is None:
+            return None
+        return catalog.get_document(uid)
+
+    async def get_object_by_uuid(self, site, uid):
+        data = await self.get_by_uuid(site, uid)
+        if data is None:
+            return None
+        ob = site
+        for name in data.get('path', '').split('/'):
+            if name:
+                ob = ob[name]
+        return ob
+
+    async def get_by_type(self, site, doc_type, query={}):
+        query = dict(query or {})
+        query['portal_type'] = doc_type
+        return await self.query(site, query)
+
+    async def get_by_path(
+            self, site, path, depth=-1, query={}, doc_type=None, size=10):
+        catalog = self.get_catalog(site)
+        if catalog is None:
+            return self._empty()
+        if isinstance(query, str):
+            text = query
+            query = {}
+        else:
+            text = None
+            query = dict(query or {})
+        query['path'] = {'query': path, 'depth': depth}
+        if doc_type is not None:
+            query['portal_type'] = doc_type
+        query.setdefault('_size', size)
+        docids = catalog.apply(query)
+        if text:
+            docids = intersection(docids, self._text_docids(catalog, text))
+        return self._result(catalog, docids, query)
+
+    async def get_folder_contents(self, site, obj):
+        return await self.query(site, {'parent_uuid': obj.uuid})
+
+    async def reindex_all_content(self, obj, security=False):
+        """Index again obj and all the content below it."""
+        if security:
+            await self.reindex_security(obj)
+            return
+        # The request of queued reindexes may have given its connection,
+        # and the site loaded through it, back to the pool
+        site = get_site(obj)
+        if site is None:
+            return
+        datas = {}
+        for ob in _iter_content(obj):
+            uid = getattr(ob, 'uuid', None)
+            if uid is not None and ob is not site:
+                datas[uid] = self.get_data(ob)
+        await self.index(site, datas)
+
+
+def _iter_content(obj):
+    yield obj
+    if hasattr(obj, 'values'):
+        for child in obj.values():
+            if IResource.providedBy(child):
+                yield from _iter_content(child)
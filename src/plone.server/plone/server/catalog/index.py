@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 from plone.server import configure
+from plone.server.catalog.pipeline import IIndexingPipeline
+from plone.server.catalog.utils import get_security_changes
 from plone.server.interfaces import ICatalogUtility
 from plone.server.interfaces import IObjectFinallyCreatedEvent
 from plone.server.interfaces import IObjectFinallyDeletedEvent
@@ -33,8 +35,15 @@ class CommitHook(object):
         # Commits are run in sync thread so there is no asyncloop
         search = queryUtility(ICatalogUtility)
         if search:
-            await search.remove(self.site, self.remove)
-            await search.index(self.site, self.index)
+            pipeline = None
+            if not getattr(search, 'transactional', False):
+                pipeline = queryUtility(IIndexingPipeline)
+            if pipeline is not None:
+                # Index in the background, without delaying the request
+                await pipeline.add(self.request, self.remove, self.index)
+            else:
+                await search.remove(self.site, self.remove)
+                await search.index(self.site, self.index)
 
         self.index = {}
         self.remove = []
@@ -57,21 +66,30 @@ def get_hook():
     except RequestNotFound:
         trns = transaction.get()
     hook = None
-    for _hook in trns._after_commit:
+    for _hook in trns._before_commit + trns._after_commit:
         if isinstance(_hook[0], CommitHook):
             hook = _hook[0]
             break
     if hook is None:
         hook = CommitHook(site, request)
-        trns.addAfterCommitHook(hook)
+        if getattr(search, 'transactional', False):
+            # Catalogs stored in the database have to be written before
+            # the transaction commits
+            trns.addBeforeCommitHook(hook, (True,))
+        else:
+            trns.addAfterCommitHook(hook)
     return hook
 
 
 @configure.subscriber(for_=(IResource, IObjectPermissionsModifiedEvent))
 async def security_changed(obj, event):
     # We need to reindex the objects below
+    changes = get_security_changes(getattr(event, 'payload', None))
+    if changes is not None and not changes:
+        return  # access content is not affected
     request = get_current_request()
-    request._futures.update({obj.id: AsyncCatalogReindex(obj, request, security=True)()})
+    request._futures.update({obj.id: AsyncCatalogReindex(
+        obj, request, security=True, changes=changes)()})
 
 
 @configure.subscriber(for_=(IResource, IObjectFinallyDeletedEvent))
@@ -93,6 +111,29 @@ def remove_object(obj, event):
         del hook.index[uid]
 
 
+# Always sent, partial updates still need to find their document and type
+ALWAYS_INDEXED = ('uuid', 'portal_type', 'modification_date')
+
+
+def get_changed_indexes(obj, event):
+    """Names of the fields changed by the payload of a modified event.
+
+    Returns None when everything has to be reindexed.
+    """
+    if not IObjectFinallyModifiedEvent.providedBy(event):
+        return None
+    payload = getattr(event, 'payload', None)
+    if not payload or '@behaviors' in payload:
+        return None
+    changed = set(ALWAYS_INDEXED)
+    for name, value in payload.items():
+        if isinstance(value, dict):
+            # Behavior data is nested under the behavior identifier
+            changed.update(value.keys())
+        changed.add(name)
+    return changed
+
+
 @configure.subscriber(for_=(IResource, IObjectFinallyCreatedEvent))
 @configure.subscriber(for_=(IResource, IObjectFinallyModifiedEvent))
 def add_object(obj, event):
@@ -108,7 +149,16 @@ def add_object(obj, event):
         return
     search = queryUtility(ICatalogUtility)
     if search:
-        hook.index[uid] = search.get_data(obj)
+        indexes = None
+        if getattr(search, 'partial_updates', False):
+            indexes = get_changed_indexes(obj, event)
+        if indexes is None:
+            hook.index[uid] = search.get_data(obj)
+        else:
+            data = search.get_data(obj, indexes)
+            if uid in hook.index:
+                data = dict(hook.index[uid], **data)
+            hook.index[uid] = data
 
 
 @configure.subscriber(for_=(ISite, IObjectAddedEvent))
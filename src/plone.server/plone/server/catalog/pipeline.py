@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+from plone.server import logger
+from plone.server.async import IAsyncUtility
+from plone.server.interfaces import IApplication
+from plone.server.interfaces import ICatalogUtility
+from zope.component import getUtility
+from zope.component import queryUtility
+
+import asyncio
+import collections
+
+
+class IIndexingPipeline(IAsyncUtility):
+    pass
+
+
+class IndexingPipeline(object):
+    """Send the catalog changes of committed transactions in the background.
+
+    Commit hooks hand their changes over to the pipeline instead of waiting
+    for the catalog utility. Changes to the same uid that arrive within
+    `window` seconds are merged and sent in batches of `batch_size`. Adding
+    changes waits while more than `max_pending` uids are waiting.
+    """
+
+    def __init__(self, settings={}, loop=None):
+        self.window = settings.get('window', 0.05)
+        self.batch_size = settings.get('batch_size', 100)
+        self.max_pending = settings.get('max_pending', 1000)
+        # (db id, site id) -> {uid: ('index', data) or ('remove', info)}
+        self._pending = collections.OrderedDict()
+        self._size = 0
+        self._wakeup = asyncio.Event(loop=loop)
+        self._drained = asyncio.Event(loop=loop)
+        self._drained.set()
+        self._flushing = asyncio.Lock(loop=loop)
+        self._queued = 0
+        self._coalesced = 0
+        self._batches = 0
+        self._errors = 0
+        self._waits = 0
+
+    async def initialize(self, app=None):
+        self.app = app
+        while True:
+            await self._wakeup.wait()
+            # Give further changes to the same uids the chance to coalesce
+            await asyncio.sleep(self.window)
+            try:
+                await self.flush()
+            except Exception as e:  # noqa
+                logger.error('Indexing pipeline flush failed', exc_info=e)
+
+    async def finalize(self, app=None):
+        await self.flush()
+
+    async def add(self, request, remove, index):
+        """Queue the catalog changes of a commit hook."""
+        while self._size >= self.max_pending:
+            self._waits += 1
+            self._drained.clear()
+            await self._drained.wait()
+
+        key = (request._db_id, request._site_id)
+        pending = self._pending.setdefault(key, collections.OrderedDict())
+        for info in remove:
+            self._queue(pending, info[0], ('remove', info))
+        for uid, data in index.items():
+            current = pending.get(uid)
+            if current is not None and current[0] == 'index':
+                data = dict(current[1], **data)
+            self._queue(pending, uid, ('index', data))
+        self._wakeup.set()
+
+    def _queue(self, pending, uid, operation):
+        self._queued += 1
+        if uid in pending:
+            self._coalesced += 1
+            # Keep the order of the last change
+            del pending[uid]
+        else:
+            self._size += 1
+        pending[uid] = operation
+
+    def _next_batch(self):
+        key, pending = next(iter(self._pending.items()))
+        batch = []
+        while pending and len(batch) < self.batch_size:
+            batch.append(pending.popitem(last=False))
+        if not pending:
+            del self._pending[key]
+        self._size -= len(batch)
+        return key, batch
+
+    async def flush(self):
+        """Send all the pending changes to the catalog utility."""
+        async with self._flushing:
+            self._wakeup.clear()
+            while self._pending:
+                key, batch = self._next_batch()
+                try:
+                    await self._send(key, batch)
+                except Exception as e:  # noqa
+                    self._errors += 1
+                    logger.error('Indexing batch failed', exc_info=e)
+                if self._size < self.max_pending:
+                    self._drained.set()
+            self._drained.set()
+
+    async def _send(self, key, batch):
+        search = queryUtility(ICatalogUtility)
+        if search is None:
+            return
+        db_id, site_id = key
+        db = getUtility(IApplication, name='root')[db_id]
+        conn = await db.async_open(read_only=True)
+        try:
+            site = conn.root()[site_id]
+            remove = [info for uid, (op, info) in batch if op == 'remove']
+            index = {uid: data for uid, (op, data) in batch if op == 'index'}
+            if remove:
+                await search.remove(site, remove)
+            if index:
+                await search.index(site, index)
+            self._batches += 1
+        finally:
+            db.release(conn)
+
+    def stats(self):
+        return {
+            'pending': self._size,
+            'queued': self._queued,
+            'coalesced': self._coalesced,
+            'batches': self._batches,
+            'errors': self._errors,
+            'waits': self._waits
+        }
@@ -1,8 +1,23 @@
+from plone.server import BEHAVIOR_CACHE
+from plone.server import CATALOG_PLAN_CACHE
+from plone.server.auth import get_principals_with_access_content
+from plone.server.auth import get_roles_with_access_content
 from plone.server.content import iter_schemata_for_type
 from plone.server.directives import index
 from plone.server.directives import merged_tagged_value_dict
 from plone.server.directives import merged_tagged_value_list
 from plone.server.directives import metadata
+from plone.server.interfaces import Allow
+from plone.server.interfaces import Deny
+from plone.server.interfaces import IContainer
+from plone.server.interfaces import IPrincipalPermissionMap
+from plone.server.interfaces import IPrincipalRoleMap
+from plone.server.interfaces import IResource
+from plone.server.interfaces import IRolePermissionMap
+from plone.server.json.serialize_value import json_compatible
+
+
+ACCESS_CONTENT = 'plone.AccessContent'
 
 
 def get_index_fields(type_name):
@@ -19,3 +34,149 @@ def get_metadata_fields(type_name):
         # create mapping for content type
         fields.extend(merged_tagged_value_list(schema, metadata.key))
     return fields
+
+
+def _field_getter(schema, name):
+    field = schema.get(name)
+    if field is None:
+        return lambda ob: getattr(ob, name, None)
+
+    def getter(ob):
+        try:
+            return field.get(ob)
+        except AttributeError:
+            return getattr(ob, name, None)
+    return getter
+
+
+def build_catalog_plan(schemata):
+    """Flat list of the values to extract to catalog content of schemata.
+
+    Each entry is (schema, name, getter, converter, triggers), triggers are
+    the changed names that require the entry to be recomputed on a partial
+    reindex, None if it always has to.
+    """
+    plan = []
+    for schema in schemata:
+        # Plain field indexes already give the value of their metadata
+        names = set()
+        for name, data in merged_tagged_value_dict(schema, index.key).items():
+            if 'accessor' in data:
+                fields = data.get('fields')
+                triggers = None
+                if fields is not None:
+                    triggers = frozenset(fields) | {name}
+                plan.append((schema, name, data['accessor'], None, triggers))
+            else:
+                names.add(name)
+                plan.append((schema, name, _field_getter(schema, name),
+                             json_compatible, frozenset([name])))
+        for name in merged_tagged_value_list(schema, metadata.key):
+            if name not in names:
+                plan.append((schema, name, _field_getter(schema, name),
+                             json_compatible, frozenset([name])))
+    return plan
+
+
+def get_catalog_plan(content):
+    """Cached catalog extraction plan for the type and behaviors of content.
+
+    Objects get a new plan once a dynamic behavior is added to them.
+    """
+    key = (content.portal_type, content.__behaviors__)
+    try:
+        return CATALOG_PLAN_CACHE[key]
+    except KeyError:
+        pass
+    schemata = list(iter_schemata_for_type(content.portal_type))
+    for name in sorted(content.__behaviors__ or ()):
+        schemata.append(BEHAVIOR_CACHE[name])
+    plan = CATALOG_PLAN_CACHE[key] = build_catalog_plan(schemata)
+    return plan
+
+
+def get_security_changes(payload):
+    """Roles and principals whose access a @sharing payload may change.
+
+    Returns a set of ('role', id) and ('principal', id), or None when the
+    payload is unknown and any access may have changed.
+    """
+    if not payload:
+        return None
+    changes = set()
+    for role, permissions in payload.get('roleperm', {}).items():
+        if ACCESS_CONTENT in permissions:
+            changes.add(('role', role))
+    for principal, permissions in payload.get('prinperm', {}).items():
+        if ACCESS_CONTENT in permissions:
+            changes.add(('principal', principal))
+    for principal in payload.get('prinrole', {}).keys():
+        changes.add(('principal', principal))
+    return changes
+
+
+def has_local_security(ob):
+    """Whether ob has any local role or permission setting."""
+    return bool(
+        IRolePermissionMap(ob).get_roles_and_permissions() or
+        IPrincipalPermissionMap(ob).get_principals_and_permissions() or
+        IPrincipalRoleMap(ob).get_principals_and_roles())
+
+
+def overrides_security_changes(ob, changes):
+    """Whether the local settings of ob decide all the changes on their own.
+
+    The access of ob and the content below it is then not affected.
+    """
+    if not changes:
+        return False
+    roleperm = IRolePermissionMap(ob)
+    prinperm = IPrincipalPermissionMap(ob)
+    prinrole = IPrincipalRoleMap(ob)
+    for kind, id_ in changes:
+        if kind == 'role':
+            setting = roleperm.get_setting(ACCESS_CONTENT, id_)
+        else:
+            if prinrole.get_roles_for_principal(id_):
+                # Role assignments are combined with the inherited ones
+                return False
+            setting = prinperm.get_setting(ACCESS_CONTENT, id_)
+        if setting is not Allow and setting is not Deny:
+            return False
+    return True
+
+
+def get_security_data(ob):
+    return {
+        'access_roles': get_roles_with_access_content(ob),
+        'access_users': get_principals_with_access_content(ob)
+    }
+
+
+def iter_security_data(obj, changes=None):
+    """Walk obj and the content below it yielding (content, security data).
+
+    Children without local settings share the access computed for the
+    first of them. Subtrees whose local settings override the changes are
+    not visited.
+    """
+    yield obj, get_security_data(obj)
+    containers = [obj]
+    while containers:
+        parent = containers.pop()
+        if not IContainer.providedBy(parent):
+            continue
+        inherited = None
+        for child in parent.values():
+            if not IResource.providedBy(child):
+                continue
+            if has_local_security(child):
+                if overrides_security_changes(child, changes):
+                    continue
+                data = get_security_data(child)
+            else:
+                if inherited is None:
+                    inherited = get_security_data(child)
+                data = inherited
+            yield child, data
+            containers.append(child)
@@ -3,6 +3,7 @@ from plone.server import logger
 from plone.server.factory import make_app
 from plone.server.testing import FakeRequest
 from plone.server.testing import TestParticipation
+from plone.server.transactions import bind_request
 
 import argparse
 import json
@@ -35,18 +36,11 @@ class Command(object):
         self.request.security.add(TestParticipation(self.request))
         self.request.security.invalidate_cache()
         self.request._cache_groups = {}
+        bind_request(self.request)
 
         parser = self.get_parser()
-        arguments = parser.parse_args()
-
-        if os.path.exists(arguments.configuration):
-            with open(arguments.configuration, 'r') as config:
-                settings = json.load(config)
-        else:
-            logger.warn('Could not find the configuration file {}. Using default settings.'.format(
-                arguments.configuration
-            ))
-            settings = MISSING_SETTINGS.copy()
+        arguments = self.arguments = parser.parse_args()
+        settings = self.get_settings(arguments)
 
         app = self.make_app(settings)
 
@@ -64,6 +58,15 @@ class Command(object):
 
         self.run(arguments, settings, app)
 
+    def get_settings(self, arguments):
+        if os.path.exists(arguments.configuration):
+            with open(arguments.configuration, 'r') as config:
+                return json.load(config)
+        logger.warn('Could not find the configuration file {}. Using default settings.'.format(
+            arguments.configuration
+        ))
+        return MISSING_SETTINGS.copy()
+
     def make_app(self, settings):
         return make_app(settings=settings)
 
@@ -1,9 +1,70 @@
 from aiohttp import web
+from plone.server import logger
 from plone.server.commands import Command
+from plone.server.factory import make_app
+from plone.server.prefork import Arbiter
+
+import functools
+import sys
+
+
+# storages which can not be opened by several processes
+SINGLE_PROCESS_STORAGES = ('ZODB', )
 
 
 class ServerCommand(Command):
     description = 'Plone server runner'
 
+    def get_parser(self):
+        parser = super(ServerCommand, self).get_parser()
+        parser.add_argument('--workers', type=int, default=0,
+                            help='Number of forked worker processes')
+        parser.add_argument('--max-requests', type=int, default=0,
+                            help='Restart workers after serving this many '
+                                 'requests')
+        parser.add_argument('--max-memory', type=int, default=0,
+                            help='Restart workers using more than this many '
+                                 'megabytes')
+        parser.add_argument('--worker-timeout', type=int, default=30,
+                            help='Kill workers unresponsive for this many '
+                                 'seconds')
+        parser.add_argument('--graceful-timeout', type=int, default=30,
+                            help='Seconds stopping workers have to finish '
+                                 'their requests')
+        return parser
+
+    def make_app(self, settings):
+        if self.arguments.workers:
+            # every worker makes its own app once forked
+            return None
+        return super(ServerCommand, self).make_app(settings)
+
     def run(self, arguments, settings, app):
-        web.run_app(app, port=settings['address'])
+        if not arguments.workers:
+            web.run_app(app, port=settings['address'])
+            return
+
+        for database in settings['databases']:
+            for key, dbconfig in database.items():
+                if dbconfig['storage'] in SINGLE_PROCESS_STORAGES:
+                    logger.error(
+                        'Database {} uses the {} storage, which can not be '
+                        'shared by workers'.format(key, dbconfig['storage']))
+                    sys.exit(1)
+
+        arbiter = Arbiter(
+            functools.partial(make_app, settings=settings),
+            settings['address'],
+            workers=arguments.workers,
+            max_requests=arguments.max_requests,
+            max_memory=arguments.max_memory * 1024 * 1024,
+            timeout=arguments.worker_timeout,
+            graceful_timeout=arguments.graceful_timeout,
+            reload_app=self.reload_app)
+        arbiter.run()
+
+    def reload_app(self):
+        """make_app of the workers started on reload, with the configuration
+        file read again."""
+        return functools.partial(
+            make_app, settings=self.get_settings(self.arguments))
@@ -9,10 +9,12 @@ from plone.behavior.interfaces import IBehavior
 from plone.behavior.interfaces import IBehaviorAssignable
 from plone.behavior.markers import applyMarkers
 from plone.server import BEHAVIOR_CACHE
+from plone.server import CATALOG_PLAN_CACHE
 from plone.server import configure
 from plone.server import FACTORY_CACHE
 from plone.server import PERMISSIONS_CACHE
 from plone.server import SCHEMA_CACHE
+from plone.server import SERIALIZER_PLAN_CACHE
 from plone.server.auth.security_code import PrincipalPermissionManager
 from plone.server.auth.users import ANONYMOUS_USER_ID
 from plone.server.auth.users import ROOT_USER_ID
@@ -106,6 +108,9 @@ class ResourceFactory(Factory):
 
 
 def load_cached_schema():
+    # Types and behaviors may have been registered again
+    CATALOG_PLAN_CACHE.clear()
+    SERIALIZER_PLAN_CACHE.clear()
     for x in getUtilitiesFor(IResourceFactory):
         factory = x[1]
         if factory.portal_type not in SCHEMA_CACHE:
@@ -138,6 +138,8 @@ class index(MetadataDictDirective):
     Allowed options:
         - type
         - accessor
+        - fields: names the accessor is computed from, used to skip it on
+          partial reindexes
     """
     key = 'plone.server.directives.index'
 
@@ -49,4 +49,21 @@ class PreconditionFailed(Exception):
 
 class RequestNotFound(Exception):
     """Lookup for the current request for request aware transactions failed
-    """
\ No newline at end of file
+    """
+
+
+class ReadOnlyRequestError(Exception):
+    """Tried to write to the database while handling a read only request
+    """
+
+
+class ConnectionPoolTimeout(Exception):
+
+    def __init__(self, database, timeout):
+        self.database = database
+        self.timeout = timeout
+
+    def __str__(self):
+        return "No connection available on {database} after {timeout}s".format(
+            database=self.database,
+            timeout=self.timeout)
@@ -32,12 +32,6 @@ import json
 import pathlib
 
 
-try:
-    from Crypto.PublicKey import RSA
-except ImportError:
-    RSA = None
-
-
 def update_app_settings(settings):
     for key, value in settings.items():
         if isinstance(app_settings.get(key), dict):
@@ -100,10 +94,18 @@ _delayed_default_settings = {
 def make_app(config_file=None, settings=None):
     app_settings.update(_delayed_default_settings)
 
+    # Idle http connections are closed after the keep alive timeout
+    keep_alive = dict(app_settings['keep_alive'])
+    keep_alive.update(settings.get('keep_alive', {}))
+    aiohttp_settings = dict(settings.get('aiohttp_settings', {}))
+    handler_args = dict(aiohttp_settings.get('handler_args') or {})
+    handler_args.setdefault('keepalive_timeout', keep_alive['timeout'])
+    aiohttp_settings['handler_args'] = handler_args
+
     # Initialize aiohttp app
     app = web.Application(
         router=TraversalRouter(),
-        **settings.get('aiohttp_settings', {}))
+        **aiohttp_settings)
 
     # Create root Application
     root = ApplicationRoot(config_file)
@@ -193,15 +195,6 @@ def make_app(config_file=None, settings=None):
 
     root.set_root_user(app_settings['root_user'])
 
-    if RSA is not None and not app_settings.get('rsa'):
-        key = RSA.generate(2048)
-        pub_jwk = {'k': key.publickey().exportKey('PEM')}
-        priv_jwk = {'k': key.exportKey('PEM')}
-        app_settings['rsa'] = {
-            'pub': pub_jwk,
-            'priv': priv_jwk
-        }
-
     # Set router root
     app.router.set_root(root)
 
@@ -222,8 +215,12 @@ def make_app(config_file=None, settings=None):
 
 
 async def close_utilities(app):
-    for utility in getAllUtilitiesRegisteredFor(IAsyncUtility):
-        asyncio.ensure_future(utility.finalize(app=app), loop=app.loop)
+    # Let utilities finish their work (e.g. flush pending indexing) before
+    # the databases are closed
+    await asyncio.gather(*[
+        utility.finalize(app=app)
+        for utility in getAllUtilitiesRegisteredFor(IAsyncUtility)
+    ], loop=app.loop, return_exceptions=True)
     for db in app.router._root:
         if IDatabase.providedBy(db[1]):
             try:
@@ -1,7 +1,11 @@
 from plone.server.auth.validators import hash_password
+from plone.server.auth.cache import invalidate_decisions
 from plone.server.auth.users import RootUser
+from plone.server.exceptions import ConnectionPoolTimeout
 from plone.server.interfaces import IApplication
 from plone.server.interfaces import IDatabase
+from plone.server.json.cache import invalidate_serialized
+from plone.server.transactions import ReadOnlyTransactionManager
 from plone.server.transactions import RequestAwareTransactionManager
 from plone.server.utils import import_class
 from zope.component import getGlobalSiteManager
@@ -11,6 +15,9 @@ from zope.interface import implementer
 from concurrent.futures import ThreadPoolExecutor
 
 import asyncio
+import collections
+import functools
+import time
 
 
 @implementer(IApplication)
@@ -90,21 +97,170 @@ class ApplicationRoot(object):
         self._dbs[key] = value
 
 
+class ConnectionPool(object):
+    """asyncio aware pool of request connections for a database.
+
+    ZODB keeps idle connections (and their caches) around by itself, this
+    pool limits how many connections can be checked out at the same time.
+    Requests that can not get a connection wait in FIFO order and are woken
+    up as soon as another request releases its connection.
+    """
+
+    def __init__(self, database, min_size=0, max_size=None, timeout=None):
+        self.database = database
+        self.min_size = min_size
+        if max_size is None:
+            # same limit traversal used to poll for
+            max_size = self._zodb_pool_size() + 5
+        self.max_size = max(max_size, 1)
+        self.timeout = timeout
+        self._size = 0
+        self._connections = set()
+        self._waiters = collections.deque()
+        self._warmed = False
+        self._acquisitions = 0
+        self._waited = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+
+    def _zodb_pool_size(self):
+        try:
+            return self.database._db.getPoolSize()
+        except AttributeError:
+            return 7
+
+    def _warmup(self):
+        """Open min_size connections once so ZODB keeps them in its pool."""
+        self._warmed = True
+        if not self.min_size:
+            return
+        if self._zodb_pool_size() < self.min_size:
+            self.database._db.setPoolSize(self.min_size)
+        connections = [self.database.open() for idx in range(self.min_size)]
+        for conn in connections:
+            conn.close()
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def waiting(self):
+        return len([w for w in self._waiters if not w.done()])
+
+    async def acquire(self, read_only=False):
+        """Return a connection, waiting for a free slot if needed."""
+        if not self._warmed:
+            self._warmup()
+
+        if self._size < self.max_size and not self._waiters:
+            self._size += 1
+        else:
+            await self._wait()
+
+        try:
+            conn = self.database.open(read_only=read_only)
+        except:  # noqa
+            self._wakeup()
+            raise
+        self._connections.add(conn)
+        self._acquisitions += 1
+        return conn
+
+    async def _wait(self):
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
+        self._waited += 1
+        start = time.time()
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # We were handed a slot while giving up, pass it on
+                self._wakeup()
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.TimeoutError):
+                self._timeouts += 1
+                raise ConnectionPoolTimeout(self.database.id, self.timeout)
+            raise
+        finally:
+            self._wait_time += time.time() - start
+
+    def _wakeup(self):
+        # Hand the slot over to the first waiter still interested
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._size -= 1
+
+    def release(self, conn):
+        """Close the connection and give its slot to the next waiter."""
+        if conn not in self._connections:
+            # Not ours or already released
+            return
+        self._connections.remove(conn)
+        try:
+            conn.close()
+        finally:
+            self._wakeup()
+
+    def stats(self):
+        return {
+            'size': self._size,
+            'min_size': self.min_size,
+            'max_size': self.max_size,
+            'timeout': self.timeout,
+            'waiting': self.waiting,
+            'acquisitions': self._acquisitions,
+            'waited': self._waited,
+            'wait_time': self._wait_time,
+            'timeouts': self._timeouts
+        }
+
+
 @implementer(IDatabase)
 class Database(object):
-    def __init__(self, id, db):
+    def __init__(self, id, db, pool_config=None):
         self.id = id
         self._db = db
         self._conn = None
         self.tm_ = RequestAwareTransactionManager()
+        self._read_only_tm = ReadOnlyTransactionManager()
+        self.pool = ConnectionPool(self, **(pool_config or {}))
+        if hasattr(db, 'add_invalidation_callback'):
+            db.add_invalidation_callback(
+                functools.partial(invalidate_serialized, id))
+            db.add_invalidation_callback(invalidate_decisions)
 
     def get_transaction_manager(self):
         return self.tm_
 
-    def open(self):
-        tm_ = RequestAwareTransactionManager()
+    def open(self, read_only=False):
+        if read_only:
+            # Read only connections do not join transactions, they can
+            # share one transaction manager
+            tm_ = self._read_only_tm
+        else:
+            tm_ = RequestAwareTransactionManager()
         return self._db.open(transaction_manager=tm_)
 
+    async def async_open(self, read_only=False):
+        """Open a connection through the connection pool.
+
+        The connection needs to be given back with `release`. Connections
+        opened with `read_only` raise ReadOnlyRequestError on writes.
+        """
+        return await self.pool.acquire(read_only=read_only)
+
+    def release(self, conn):
+        self.pool.release(conn)
+
     def _open(self):
         self._conn = self._db.open(transaction_manager=self.tm_)
 
@@ -48,7 +48,7 @@ def ZODBDatabaseConfigurationFactory(key, dbconfig):
         db.close()
     # Set request aware database for app
     db = RequestAwareDB(dbconfig['path'], **config)
-    return Database(key, db)
+    return Database(key, db, dbconfig.get('pool'))
 
 
 @configure.utility(provides=IDatabaseConfigurationFactory, name="ZEO")
@@ -80,7 +80,7 @@ def ZEODatabaseConfigurationFactory(key, dbconfig):
     # Set request aware database for app
     cs = ZEO.ClientStorage.ClientStorage(address, **zeoconfig)
     db = RequestAwareDB(cs, **config)
-    return Database(key, db)
+    return Database(key, db, dbconfig.get('pool'))
 
 
 @configure.utility(provides=IDatabaseConfigurationFactory, name="RELSTORAGE")
@@ -110,7 +110,7 @@ def RelStorageConfigurationFactory(key, dbconfig):
         db.close()
     rs = RelStorage(adapter=adapter, options=options)
     db = RequestAwareDB(rs, **config)
-    return Database(key, db)
+    return Database(key, db, dbconfig.get('pool'))
 
 
 @configure.utility(provides=IDatabaseConfigurationFactory, name="NEWT")
@@ -136,7 +136,7 @@ def NewtConfigurationFactory(key, dbconfig):
         db.close()
     adapter = newt.db.storage(dsn, **dbconfig['options'])
     db = newt.db._db.NewtDB(RequestAwareDB(adapter, **config))
-    return Database(key, db)
+    return Database(key, db, dbconfig.get('pool'))
 
 
 @configure.utility(provides=IDatabaseConfigurationFactory, name="DEMO")
@@ -148,4 +148,4 @@ def DemoDatabaseConfigurationFactory(key, dbconfig):
     db.close()
     # Set request aware database for app
     db = RequestAwareDB(storage)
-    return Database(key, db)
+    return Database(key, db, dbconfig.get('pool'))
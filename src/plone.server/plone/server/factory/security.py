@@ -22,6 +22,7 @@ class RootSpecialPermissions(PrincipalPermissionManager):
         self.grant_permission_to_principal('plone.AccessContent', ROOT_USER_ID)
         self.grant_permission_to_principal('plone.GetDatabases', ROOT_USER_ID)
         self.grant_permission_to_principal('plone.GetAPIDefinition', ROOT_USER_ID)
+        self.grant_permission_to_principal('plone.GetStatistics', ROOT_USER_ID)
         # Access anonymous - needs to be configurable
         self.grant_permission_to_principal(
             'plone.AccessContent', ANONYMOUS_USER_ID)
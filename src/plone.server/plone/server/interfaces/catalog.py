@@ -18,9 +18,29 @@ class ICatalogUtility(Interface):
     def get_folder_contents(site, obj):
         pass
 
-    def reindex_all_content(site):
+    def index(site, datas):
+        """
+        Index a dict of uid to catalog data
+        """
+
+    def remove(site, uids):
+        """
+        Remove a list of (uid, portal_type, path) from the catalog
+        """
+
+    def get_data(content, indexes=None):
+        """
+        Catalog data of the content, restricted to the names in indexes
+        """
+
+    def reindex_all_content(obj, security=False):
         pass
 
+    def reindex_security(obj, changes=None):
+        """
+        Reindex the access of obj and the content below it
+        """
+
     def initialize_catalog(site):
         pass
 
@@ -39,7 +59,12 @@ class ICatalogUtility(Interface):
 
 
 class ICatalogDataAdapter(Interface):
-    pass
+
+    def __call__(indexes=None):
+        """
+        Index and metadata values of the content, only the ones affected by
+        the names in indexes if given
+        """
 
 
 class ISecurityInfo(Interface):
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+from plone.server import app_settings
+
+import collections
+import threading
+
+
+class SerializationCache(object):
+    """LRU cache of the serialized representations of content.
+
+    Keys start with the database id and the oid of the object so the entries
+    of an object can be dropped when ZODB invalidates it. The rest of the key
+    needs to contain everything the representation depends on, like the
+    serials of the object.
+    """
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+        # (db id, oid) -> keys of the entries of the object
+        self._objects = {}
+        # invalidations come from the thread committing the transaction
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            if key not in self._entries:
+                self._objects.setdefault(key[:2], set()).add(key)
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                old_key, old_value = self._entries.popitem(last=False)
+                self._forget(old_key)
+                self._evictions += 1
+
+    def _forget(self, key):
+        keys = self._objects.get(key[:2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._objects[key[:2]]
+
+    def invalidate(self, db_id, oids):
+        with self._lock:
+            for oid in oids:
+                for key in self._objects.pop((db_id, oid), ()):
+                    del self._entries[key]
+                    self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._objects.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self._hits,
+            'misses': self._misses,
+            'evictions': self._evictions,
+            'invalidations': self._invalidations
+        }
+
+
+_cache = None
+
+
+def get_serialization_cache():
+    """The serialization cache or None when it is not enabled."""
+    global _cache
+    settings = app_settings['serialization_cache']
+    if not settings.get('enabled'):
+        return None
+    if _cache is None:
+        _cache = SerializationCache(settings.get('max_size', 1000))
+    return _cache
+
+
+def invalidate_serialized(db_id, oids):
+    """Drop the cached representations of the invalidated oids."""
+    if _cache is not None:
+        _cache.invalidate(db_id, oids)
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from plone.server import BEHAVIOR_CACHE
 from plone.server import configure
+from plone.server import SERIALIZER_PLAN_CACHE
 from plone.server.content import get_cached_factory
 from plone.server.directives import merged_tagged_value_dict
 from plone.server.directives import read_permission
@@ -12,10 +13,11 @@ from plone.server.interfaces import IResourceSerializeToJson
 from plone.server.interfaces import IResourceSerializeToJsonSummary
 from plone.server.json.serialize_value import json_compatible
 from zope.component import ComponentLookupError
+from zope.component import getGlobalSiteManager
 from zope.component import getMultiAdapter
-from zope.component import queryMultiAdapter
 from zope.component import queryUtility
 from zope.interface import Interface
+from zope.interface import providedBy
 from zope.schema import getFields
 from zope.security.interfaces import IInteraction
 from zope.security.interfaces import IPermission
@@ -24,6 +26,62 @@ from zope.security.interfaces import IPermission
 MAX_ALLOWED = 200
 
 
+class SchemaSerializerPlan(object):
+    """Fields of a schema to serialize with their read permission.
+
+    The serializer factories are resolved once per kind of context and
+    request, and again after the adapter registry changes.
+    """
+
+    def __init__(self, schema, behavior):
+        self.schema = schema
+        self.behavior = behavior
+        read_permissions = merged_tagged_value_dict(schema, read_permission.key)
+        self.fields = [
+            (name, field, read_permissions.get(name))
+            for name, field in getFields(schema).items()]
+        self.names = frozenset(name for name, field, perm in self.fields)
+        self._factories = {}
+        self._generation = None
+
+    def get_factories(self, context, request):
+        adapters = getGlobalSiteManager().adapters
+        if adapters._generation != self._generation:
+            self._factories = {}
+            self._generation = adapters._generation
+        key = (providedBy(context), providedBy(request))
+        try:
+            return self._factories[key]
+        except KeyError:
+            pass
+        factories = self._factories[key] = [
+            adapters.lookup(
+                (providedBy(field),) + key, IResourceFieldSerializer)
+            for name, field, permission in self.fields]
+        return factories
+
+
+def get_serializer_plan(context):
+    """Cached schema plans for the type and dynamic behaviors of context.
+
+    Adding or removing a dynamic behavior gives the object another plan.
+    """
+    key = (context.portal_type, context.__behaviors__)
+    try:
+        return SERIALIZER_PLAN_CACHE[key]
+    except KeyError:
+        pass
+    factory = get_cached_factory(context.portal_type)
+    plan = [SchemaSerializerPlan(factory.schema, False)]
+    for behavior_schema in factory.behaviors or ():
+        plan.append(SchemaSerializerPlan(behavior_schema, True))
+    for dynamic_behavior in context.__behaviors__ or ():
+        plan.append(SchemaSerializerPlan(
+            BEHAVIOR_CACHE[dynamic_behavior], True))
+    SERIALIZER_PLAN_CACHE[key] = plan
+    return plan
+
+
 @configure.adapter(
     for_=(IResource, Interface),
     provides=IResourceSerializeToJson)
@@ -34,61 +92,79 @@ class SerializeToJson(object):
         self.request = request
         self.permission_cache = {}
 
-    def __call__(self):
-        parent = self.context.__parent__
-        if parent is not None:
-            # We render the summary of the parent
-            try:
-                parent_summary = getMultiAdapter(
-                    (parent, self.request), IResourceSerializeToJsonSummary)()
-            except ComponentLookupError:
-                parent_summary = {}
-        else:
-            parent_summary = {}
+    def __call__(self, fields=None, include=None):
+        """Serialize the context.
 
+        `fields` restricts the result to the named fields, metadata like
+        `parent` or `modified` included, and `include` to the behaviors with
+        the given identifiers. Behaviors left out are not adapted.
+        """
         result = {
             '@id': IAbsoluteURL(self.context, self.request)(),
             '@type': self.context.portal_type,
-            'parent': parent_summary,
-            'created': json_compatible(self.context.creation_date),
-            'modified': json_compatible(self.context.modification_date),
-            'UID': self.context.uuid,
         }
-
-        factory = get_cached_factory(self.context.portal_type)
-
-        main_schema = factory.schema
-        self.get_schema(main_schema, self.context, result, False)
-
-        for behavior_schema in factory.behaviors or ():
-            behavior = behavior_schema(self.context)
-            self.get_schema(behavior_schema, behavior, result, True)
-
-        for dynamic_behavior in self.context.__behaviors__ or ():
-            dynamic_behavior_obj = BEHAVIOR_CACHE[dynamic_behavior]
-            behavior = dynamic_behavior_obj(self.context)
-            self.get_schema(dynamic_behavior_obj, behavior, result, True)
+        if fields is None or 'parent' in fields:
+            result['parent'] = self.get_parent_summary()
+        if fields is None or 'created' in fields:
+            result['created'] = json_compatible(self.context.creation_date)
+        if fields is None or 'modified' in fields:
+            result['modified'] = json_compatible(
+                self.context.modification_date)
+        if fields is None or 'UID' in fields:
+            result['UID'] = self.context.uuid
+
+        for schema_plan in get_serializer_plan(self.context):
+            names = self.get_schema_names(schema_plan, fields, include)
+            if names is not None and not names:
+                continue
+            if schema_plan.behavior:
+                context = schema_plan.schema(self.context)
+            else:
+                context = self.context
+            self.get_schema(schema_plan, context, result, names)
 
         return result
 
-    def get_schema(self, schema, context, result, behavior):
-        read_permissions = merged_tagged_value_dict(schema, read_permission.key)
+    def get_parent_summary(self):
+        parent = self.context.__parent__
+        if parent is None:
+            return {}
+        # We render the summary of the parent
+        try:
+            return getMultiAdapter(
+                (parent, self.request), IResourceSerializeToJsonSummary)()
+        except ComponentLookupError:
+            return {}
+
+    def get_schema_names(self, schema_plan, fields, include):
+        """Names of the fields of schema_plan to serialize, None for all."""
+        if schema_plan.behavior:
+            if include is not None and \
+                    schema_plan.schema.__identifier__ in include:
+                return None
+            if fields is None:
+                return None if include is None else frozenset()
+        elif fields is None:
+            return None
+        return schema_plan.names & fields
+
+    def get_schema(self, schema_plan, context, result, names=None):
+        factories = schema_plan.get_factories(context, self.request)
         schema_serial = {}
-        for name, field in getFields(schema).items():
-
-            if not self.check_permission(read_permissions.get(name)):
+        for (name, field, permission), factory in zip(
+                schema_plan.fields, factories):
+            if names is not None and name not in names:
+                continue
+            if not self.check_permission(permission):
                 continue
-            serializer = queryMultiAdapter(
-                (field, context, self.request),
-                IResourceFieldSerializer)
-            value = serializer()
-            if not behavior:
+            value = factory(field, context, self.request)()
+            if not schema_plan.behavior:
                 result[name] = value
             else:
                 schema_serial[name] = value
 
-        if behavior:
-            result[schema.__identifier__] = schema_serial
+        if schema_plan.behavior:
+            result[schema_plan.schema.__identifier__] = schema_serial
 
     def check_permission(self, permission_name):
         if permission_name is None:
@@ -111,26 +187,42 @@ class SerializeToJson(object):
     provides=IResourceSerializeToJson)
 class SerializeFolderToJson(SerializeToJson):
 
-    def __call__(self):
-        result = super(SerializeFolderToJson, self).__call__()
+    def __init__(self, context, request):
+        super(SerializeFolderToJson, self).__init__(context, request)
+        self.allowed_members = None
 
-        security = IInteraction(self.request)
+    def __call__(self, fields=None, include=None):
+        result = super(SerializeFolderToJson, self).__call__(
+            fields=fields, include=include)
         length = len(self.context)
+        if fields is None or 'items' in fields:
+            result['items'] = self.get_items(length)
+        if fields is None or 'length' in fields:
+            result['length'] = length
+        return result
+
+    def get_items(self, length):
+        return [
+            getMultiAdapter(
+                (member, self.request), IResourceSerializeToJsonSummary)()
+            for member in self.get_allowed_members(length)
+        ]
 
+    def get_allowed_members(self, length):
+        """Members the user can access when there are at most MAX_ALLOWED.
+
+        They are looked up once, the ETag and the items use the same list.
+        """
+        if self.allowed_members is not None:
+            return self.allowed_members
         if length > MAX_ALLOWED or length == 0:
-            result['items'] = []
+            self.allowed_members = []
         else:
-            result['items'] = [
-                getMultiAdapter(
-                    (member, self.request), IResourceSerializeToJsonSummary)()
-                for ident, member in self.context.items()
-                if not ident.startswith('_') and
-                bool(security.check_permission(
-                    'plone.AccessContent', self.context))
-            ]
-        result['length'] = length
-
-        return result
+            self.allowed_members = IInteraction(self.request).filter_allowed(
+                'plone.AccessContent', [
+                    member for ident, member in self.context.items()
+                    if not ident.startswith('_')])
+        return self.allowed_members
 
 
 @configure.adapter(
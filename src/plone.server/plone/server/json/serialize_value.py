@@ -9,7 +9,9 @@ from plone.server import configure
 from plone.server.file import BasicFile
 from plone.server.interfaces import IValueToJson
 from plone.server.text import IRichTextValue
+from zope.component import getGlobalSiteManager
 from zope.i18nmessageid.message import Message
+from zope.interface import implementedBy
 from zope.interface import Interface
 from zope.schema.vocabulary import SimpleVocabulary
 
@@ -31,6 +33,11 @@ except NameError:
     long = int
 
 
+# type -> IValueToJson adapter, see json_compatible
+_converters = {}
+_converters_generation = None
+
+
 def json_compatible(value):
     """The json_compatible function converts any value to JSON compatible
     data when possible, raising a TypeError for unsupported values.
@@ -40,8 +47,32 @@ def json_compatible(value):
     lookup error unless `None` is passed in as default value.
     Because of that the `json_compatible` helper method should always be
     used for converting values that may be None.
+
+    The converters of types whose instances can not provide interfaces
+    of their own are kept by type until the adapter registry changes.
     """
-    return IValueToJson(value, None)
+    global _converters_generation
+    adapters = getGlobalSiteManager().adapters
+    if adapters._generation != _converters_generation:
+        _converters.clear()
+        _converters_generation = adapters._generation
+    try:
+        converter = _converters[type(value)]
+    except KeyError:
+        converter = _lookup_converter(adapters, type(value))
+    if converter is None:
+        return IValueToJson(value, None)
+    return converter(value)
+
+
+def _lookup_converter(adapters, type_):
+    if type_.__dictoffset__ != 0:
+        # Instances may provide interfaces, look them up every time
+        converter = None
+    else:
+        converter = adapters.lookup((implementedBy(type_),), IValueToJson)
+    _converters[type_] = converter
+    return converter
 
 
 def encoding():
@@ -92,7 +123,7 @@ def string_converter(value):
     for_=list,
     provides=IValueToJson)
 def list_converter(value):
-    return list(map(json_compatible, value))
+    return [json_compatible(item) for item in value]
 
 
 @configure.adapter(
@@ -106,34 +137,29 @@ def persistent_list_converter(value):
     for_=tuple,
     provides=IValueToJson)
 def tuple_converter(value):
-    return list(map(json_compatible, value))
+    return [json_compatible(item) for item in value]
 
 
 @configure.adapter(
     for_=frozenset,
     provides=IValueToJson)
 def frozenset_converter(value):
-    return list(map(json_compatible, value))
+    return [json_compatible(item) for item in value]
 
 
 @configure.adapter(
     for_=set,
     provides=IValueToJson)
 def set_converter(value):
-    return list(map(json_compatible, value))
+    return [json_compatible(item) for item in value]
 
 
 @configure.adapter(
     for_=dict,
     provides=IValueToJson)
 def dict_converter(value):
-    if value == {}:
-        return {}
-
-    keys, values = zip(*value.items())
-    keys = map(json_compatible, keys)
-    values = map(json_compatible, values)
-    return dict(zip(keys, values))
+    return {json_compatible(key): json_compatible(item)
+            for key, item in value.items()}
 
 
 @configure.adapter(
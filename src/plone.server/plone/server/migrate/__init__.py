@@ -25,6 +25,7 @@ class Migration(object):
 def migration(application, to_version=None):
     def _func(func):
         _migrations.append(Migration(application, func, to_version))
+        return func
     return _func
 
 
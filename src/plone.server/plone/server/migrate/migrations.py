@@ -10,3 +10,18 @@ def migrate_layers(site):
     layers = layers - frozenset(['plone.server.api.layer.IDefaultLayer'])
     layers = layers | frozenset({'plone.server.interfaces.layer.IDefaultLayer'})
     registry.for_interface(ILayers).active_layers = layers
+
+
+@migration('plone.server', to_version='1.0a17')
+def migrate_acl_maps(site):
+    from plone.server.auth.securitymap import persist_acl
+    from plone.server.interfaces import IContainer
+    from plone.server.interfaces import IResource
+
+    to_visit = [site]
+    while to_visit:
+        ob = to_visit.pop()
+        persist_acl(ob)
+        if IContainer.providedBy(ob):
+            to_visit.extend(
+                child for child in ob.values() if IResource.providedBy(child))
@@ -32,6 +32,7 @@ configure.permission('plone.ReindexContent', 'Reindex Content')
 configure.permission('plone.ManageCatalog', 'Manage catalog')
 
 configure.permission('plone.GetAPIDefinition', 'Get the API definition')
+configure.permission('plone.GetStatistics', 'Get the server statistics')
 
 
 configure.role("plone.Anonymous", "Everybody", "All users have this role implicitly", False)
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""Pre-fork server: one listening socket shared by forked worker processes.
+
+The arbiter binds the socket and supervises the workers. Every worker makes
+its own app, with its own database connections, after being forked.
+
+Signals of the arbiter:
+
+- `SIGTERM`, `SIGINT`: stop the workers gracefully and exit
+- `SIGHUP`: replace the workers one by one, waiting for every new worker to
+  be serving before stopping the one it replaces. The new workers make their
+  app with the `make_app` returned by `reload_app`, when given
+- `SIGTTIN`, `SIGTTOU`: add or remove a worker
+"""
+from plone.server import logger
+
+import asyncio
+import errno
+import os
+import resource
+import select
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+
+def get_rss():
+    """Resident set size of the current process in bytes."""
+    try:
+        with open('/proc/self/statm', 'r') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # peak size, in kilobytes on linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Heartbeat(object):
+    """File shared with a worker, which touches it while it is responsive."""
+
+    def __init__(self):
+        fd, path = tempfile.mkstemp(prefix='pserver-')
+        os.unlink(path)
+        self._fd = fd
+        self._spinner = 0
+
+    def notify(self):
+        self._spinner = 1 - self._spinner
+        os.fchmod(self._fd, self._spinner)
+
+    def last_update(self):
+        return os.fstat(self._fd).st_ctime
+
+    def close(self):
+        os.close(self._fd)
+
+
+class Worker(object):
+
+    def __init__(self, sock, make_app, heartbeat, max_requests=0,
+                 max_memory=0, timeout=30, graceful_timeout=30,
+                 backlog=128):
+        self.sock = sock
+        self.make_app = make_app
+        self.heartbeat = heartbeat
+        self.max_requests = max_requests
+        self.max_memory = max_memory
+        self.timeout = timeout
+        self.graceful_timeout = graceful_timeout
+        self.backlog = backlog
+        self.pid = None
+        self.started = None
+        self.alive = True
+
+    def run(self):
+        for signum in (signal.SIGHUP, signal.SIGCHLD, signal.SIGTTIN,
+                       signal.SIGTTOU):
+            signal.signal(signum, signal.SIG_DFL)
+        # the arbiter stops the workers
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.add_signal_handler(signal.SIGTERM, self.stop)
+
+        app = self.make_app()
+        handler = app.make_handler(loop=loop)
+        loop.run_until_complete(app.startup())
+        server = loop.run_until_complete(loop.create_server(
+            handler, sock=self.sock, backlog=self.backlog))
+        heartbeat = loop.create_task(self.notify())
+        logger.info('Worker {} serving'.format(os.getpid()))
+
+        loop.run_until_complete(self.supervise(handler))
+
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        loop.run_until_complete(app.shutdown())
+        loop.run_until_complete(handler.shutdown(self.graceful_timeout))
+        loop.run_until_complete(app.cleanup())
+        heartbeat.cancel()
+        loop.run_until_complete(asyncio.wait([heartbeat]))
+        loop.close()
+
+    async def notify(self):
+        """Touch the heartbeat while the event loop is responsive."""
+        while True:
+            self.heartbeat.notify()
+            await asyncio.sleep(max(self.timeout / 4, 0.1))
+
+    async def supervise(self, handler):
+        while self.alive:
+            if self.max_requests and handler.requests_count >= self.max_requests:
+                logger.info('Worker {} restarting after {} requests'.format(
+                    os.getpid(), handler.requests_count))
+                break
+            if self.max_memory and get_rss() >= self.max_memory:
+                logger.info('Worker {} restarting using {} bytes'.format(
+                    os.getpid(), get_rss()))
+                break
+            await asyncio.sleep(1)
+
+    def stop(self):
+        self.alive = False
+
+
+class Arbiter(object):
+
+    def __init__(self, make_app, address, workers=1, max_requests=0,
+                 max_memory=0, timeout=30, graceful_timeout=30,
+                 backlog=128, reload_app=None):
+        self.make_app = make_app
+        self.reload_app = reload_app
+        self.address = address
+        self.num_workers = workers
+        self.max_requests = max_requests
+        self.max_memory = max_memory
+        self.timeout = timeout
+        self.graceful_timeout = graceful_timeout
+        self.backlog = backlog
+        self.workers = {}
+        self.sock = None
+        self.signals = []
+        self._wakeup = None
+
+    def run(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('0.0.0.0', self.address))
+        self.sock.listen(self.backlog)
+        self.sock.setblocking(False)
+        logger.info('Listening on port {} with {} workers (pid {})'.format(
+            self.address, self.num_workers, os.getpid()))
+
+        self._wakeup = os.pipe()
+        for fd in self._wakeup:
+            os.set_blocking(fd, False)
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP,
+                       signal.SIGCHLD, signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(signum, self.signal)
+
+        try:
+            self.manage_workers()
+            while True:
+                self.sleep(1)
+                while self.signals:
+                    signum = self.signals.pop(0)
+                    if signum in (signal.SIGTERM, signal.SIGINT):
+                        return self.stop()
+                    elif signum == signal.SIGHUP:
+                        self.reload()
+                    elif signum == signal.SIGTTIN:
+                        self.num_workers += 1
+                    elif signum == signal.SIGTTOU:
+                        self.num_workers = max(self.num_workers - 1, 1)
+                self.reap_workers()
+                self.check_workers()
+                self.manage_workers()
+        finally:
+            self.sock.close()
+
+    def signal(self, signum, frame):
+        if signum != signal.SIGCHLD:
+            self.signals.append(signum)
+        try:
+            os.write(self._wakeup[1], b'.')
+        except OSError:
+            pass
+
+    def sleep(self, timeout):
+        try:
+            ready = select.select([self._wakeup[0]], [], [], timeout)
+            if ready[0]:
+                while os.read(self._wakeup[0], 1024):
+                    pass
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EINTR):
+                raise
+
+    def spawn_worker(self):
+        worker = Worker(
+            self.sock, self.make_app, Heartbeat(),
+            max_requests=self.max_requests, max_memory=self.max_memory,
+            timeout=self.timeout, graceful_timeout=self.graceful_timeout,
+            backlog=self.backlog)
+        worker.started = time.time()
+        pid = os.fork()
+        if pid != 0:
+            worker.pid = pid
+            self.workers[pid] = worker
+            return worker
+
+        # worker process
+        exit_code = 0
+        try:
+            worker.run()
+        except Exception:  # noqa
+            logger.error('Worker {} failed'.format(os.getpid()), exc_info=True)
+            exit_code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+    def manage_workers(self):
+        workers = [w for w in self.workers.values() if w.alive]
+        for idx in range(self.num_workers - len(workers)):
+            self.spawn_worker()
+        # stop the oldest workers first
+        workers.sort(key=lambda w: w.started)
+        for worker in workers[:len(workers) - self.num_workers]:
+            self.kill_worker(worker.pid, signal.SIGTERM)
+
+    def reap_workers(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            worker = self.workers.pop(pid, None)
+            if worker is not None:
+                worker.heartbeat.close()
+                if status:
+                    logger.warning('Worker {} exited with status {}'.format(
+                        pid, status))
+
+    def check_workers(self):
+        """Kill workers which did not notify their heartbeat in time."""
+        now = time.time()
+        for worker in list(self.workers.values()):
+            last_update = max(worker.heartbeat.last_update(), worker.started)
+            if now - last_update <= self.timeout:
+                continue
+            logger.error('Worker {} timed out, killing it'.format(worker.pid))
+            self.kill_worker(worker.pid, signal.SIGKILL)
+
+    def kill_worker(self, pid, signum):
+        worker = self.workers.get(pid)
+        if worker is not None:
+            worker.alive = False
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def is_serving(self, worker):
+        return worker.heartbeat.last_update() > worker.started
+
+    def reload(self):
+        """Replace the workers one by one."""
+        logger.info('Reloading workers')
+        if self.reload_app is not None:
+            try:
+                self.make_app = self.reload_app()
+            except Exception:  # noqa
+                logger.error('Could not reload the app, workers kept',
+                             exc_info=True)
+                return
+        for old in sorted(self.workers.values(), key=lambda w: w.started):
+            if not old.alive:
+                continue
+            new = self.spawn_worker()
+            deadline = time.time() + self.timeout
+            while new.pid in self.workers and not self.is_serving(new):
+                if time.time() > deadline:
+                    logger.error('Worker {} did not start'.format(new.pid))
+                    self.kill_worker(new.pid, signal.SIGKILL)
+                    return
+                self.sleep(0.1)
+                self.reap_workers()
+            if new.pid not in self.workers:
+                logger.error('Worker {} failed to start, reload aborted'.format(
+                    new.pid))
+                return
+            self.kill_worker(old.pid, signal.SIGTERM)
+
+    def stop(self):
+        logger.info('Stopping workers')
+        for pid in list(self.workers):
+            self.kill_worker(pid, signal.SIGTERM)
+        deadline = time.time() + self.graceful_timeout
+        while self.workers and time.time() < deadline:
+            self.sleep(0.1)
+            self.reap_workers()
+        for pid in list(self.workers):
+            self.kill_worker(pid, signal.SIGKILL)
+        while self.workers:
+            self.sleep(0.1)
+            self.reap_workers()
@@ -2,6 +2,7 @@
 from aiohttp.helpers import sentinel
 from aiohttp.web import Response as aioResponse
 from datetime import datetime
+from plone.server import app_settings
 from plone.server import configure
 from plone.server.browser import Response
 from plone.server.interfaces import IFrameFormatsJson
@@ -12,6 +13,7 @@ from plone.server.interfaces import IRendererFormatRaw
 from plone.server.interfaces import IRenderFormats
 from plone.server.interfaces import IRequest
 from plone.server.interfaces import IView
+from plone.server.utils import resolve_or_get
 from zope.component import queryAdapter
 from zope.interface.interface import InterfaceClass
 from plone.server.interfaces.security import PermissionSetting
@@ -19,6 +21,28 @@ from plone.server.interfaces.security import PermissionSetting
 import json
 
 
+def _load_ujson():
+    try:
+        import ujson
+    except ImportError:
+        return None
+    try:
+        # Releases without the default hook turn datetimes into timestamps
+        ujson.dumps(None, default=str)
+    except TypeError:
+        return None
+    try:
+        # Some releases silently write nothing for integers over 64 bits
+        if ujson.dumps([2 ** 64, 1]) != '[18446744073709551616,1]':
+            return None
+    except OverflowError:
+        pass
+    return ujson
+
+
+ujson = _load_ujson()
+
+
 class PServerJSONEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, complex):
@@ -44,14 +68,59 @@ class PServerJSONEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
+class JSONEncoder(object):
+    """Encode responses with the json module."""
+
+    def dumps(self, data):
+        return json.dumps(data, cls=PServerJSONEncoder)
+
+    def encode(self, data):
+        return self.dumps(data).encode('utf-8')
+
+
+class FastJSONEncoder(JSONEncoder):
+    """Encode responses with ujson when it is installed.
+
+    The PServerJSONEncoder conversions only run for the objects ujson
+    rejects.
+    """
+
+    def __init__(self):
+        self._default = PServerJSONEncoder().default
+
+    def dumps(self, data):
+        if ujson is None:
+            return super(FastJSONEncoder, self).dumps(data)
+        try:
+            return ujson.dumps(
+                data, default=self._default, escape_forward_slashes=False)
+        except OverflowError:
+            # Integers ujson can not represent
+            return super(FastJSONEncoder, self).dumps(data)
+
+
+_json_encoder = (None, None)
+
+
+def get_json_encoder():
+    """The encoder configured with the `json_encoder` setting."""
+    global _json_encoder
+    name = app_settings.get('json_encoder', 'plone.server.renderers.JSONEncoder')
+    if _json_encoder[0] != name:
+        _json_encoder = (name, resolve_or_get(name)())
+    return _json_encoder[1]
+
+
 def json_response(data=sentinel, *, text=None, body=None, status=200,
                   reason=None, headers=None, content_type='application/json',
-                  dumps=json.dumps):
+                  dumps=None):
     if data is not sentinel:
         if text or body:
             raise ValueError(
                 "only one of data, text, or body should be specified"
             )
+        elif dumps is None:
+            body = get_json_encoder().encode(data)
         else:
             text = dumps(data, cls=PServerJSONEncoder)
     return aioResponse(
@@ -100,6 +169,11 @@ def _is_pserver_response(resp):
     return hasattr(resp, '__class__') and issubclass(resp.__class__, Response)
 
 
+def _not_modified(value):
+    # 304 responses can not have a body
+    return aioResponse(status=304, headers=value.headers)
+
+
 @configure.adapter(
     for_=(IRendererFormatJson, IView, IRequest),
     provides=IRendered)
@@ -107,6 +181,8 @@ class RendererJson(Renderer):
     async def __call__(self, value):
         headers = {}
         if _is_pserver_response(value):
+            if value.status == 304:
+                return _not_modified(value)
             json_value = value.response
             headers = value.headers
             status = value.status
@@ -158,12 +234,11 @@ class RendererHtml(Renderer):
 class RendererRaw(Renderer):
 
     def guess_response(self, value):
+        if value.status == 304:
+            return _not_modified(value)
         resp = value.response
-        if isinstance(resp, dict):
-            resp = aioResponse(body=bytes(json.dumps(resp, cls=PServerJSONEncoder), 'utf-8'))
-            resp.headers['Content-Type'] = 'application/json'
-        elif isinstance(resp, list):
-            resp = aioResponse(body=bytes(json.dumps(resp, cls=PServerJSONEncoder), 'utf-8'))
+        if isinstance(resp, (dict, list)):
+            resp = aioResponse(body=get_json_encoder().encode(resp))
             resp.headers['Content-Type'] = 'application/json'
         elif isinstance(resp, str):
             resp = aioResponse(body=bytes(resp, 'utf-8'))
@@ -14,6 +14,7 @@ from plone.server.interfaces import IRequest
 from plone.server.interfaces import IResource
 from plone.server.jsonfield import JSONField
 from plone.server.auth.policy import Interaction
+from plone.server.transactions import bind_request
 from zope.component import getUtility
 from zope.configuration.xmlconfig import include
 from zope.interface import implementer
@@ -59,6 +60,9 @@ TESTING_SETTINGS = {
     "root_user": {
         "password": "admin"
     },
+    "password_hashing": {
+        "iterations": 1000
+    },
     "utilities": []
 }
 
@@ -303,6 +307,10 @@ class PloneBaseTestCase(unittest.TestCase):
 
     def setUp(self):
         self.request = FakeRequest()
+        bind_request(self.request)
+
+    def tearDown(self):
+        bind_request(None)
 
     def login(self):
         self.request.security.add(TestParticipation(self.request))
@@ -11,6 +11,7 @@ from plone.server.interfaces import IFactorySerializeToJson
 from plone.server.interfaces import IItem
 from plone.server.interfaces import IResource
 from plone.server.interfaces import IResourceFactory
+from plone.server.interfaces import IRequest
 from plone.server.interfaces import IResourceFieldSerializer
 from plone.server.interfaces import IResourceSerializeToJson
 from plone.server.interfaces import IResourceSerializeToJsonSummary
@@ -23,11 +24,16 @@ from plone.server.json import serialize_schema_field, deserialize_content, deser
 from plone.server.json.serialize_content import DefaultJSONSummarySerializer
 from plone.server.json.serialize_content import SerializeFolderToJson
 from plone.server.json.serialize_content import SerializeToJson
+from plone.server.json.serialize_content import get_serializer_plan
+from plone.server.json.serialize_value import json_compatible
 from plone.server.auth.policy import Interaction
+from plone.server.behaviors.attachment import IAttachment
+from plone.server.behaviors.dublincore import IDublinCore
 from plone.server.testing import PloneFunctionalTestCase
 from plone.server.text import RichText
 from zope import schema
 from zope.component import getAdapter
+from zope.component import getGlobalSiteManager
 from zope.component import getMultiAdapter
 from zope.component import getUtility
 from zope.security.interfaces import IInteraction
@@ -71,6 +77,59 @@ class TestSerializerContentAdapters(PloneFunctionalTestCase):
         self.assertTrue(isinstance(adapter, SerializeToJson))
         self.assertFalse(isinstance(adapter, SerializeFolderToJson))
 
+    def test_serializer_plan(self):
+        root = self.layer.new_root()
+        site = root['plone']
+        self.login()
+        obj = create_content_in_container(site, 'Item', 'foobar')
+        plan = get_serializer_plan(obj)
+        self.assertIs(get_serializer_plan(obj), plan)
+        self.assertEqual(
+            [schema_plan.schema for schema_plan in plan],
+            [IItem, IDublinCore])
+
+        # the dynamic behaviors of the object select another plan
+        obj.add_behavior(IAttachment)
+        self.assertIsNot(get_serializer_plan(obj), plan)
+        serializer = getMultiAdapter(
+            (obj, self.request), interface=IResourceSerializeToJson)
+        result = {}
+        schema_plan = get_serializer_plan(obj)[-1]
+        serializer.get_schema(schema_plan, IAttachment(obj), result)
+        self.assertEqual(result, {IAttachment.__identifier__: {'file': None}})
+        obj.remove_behavior(IAttachment.__identifier__)
+        self.assertIs(get_serializer_plan(obj), plan)
+
+    def test_serializer_plan_follows_registry_changes(self):
+        root = self.layer.new_root()
+        site = root['plone']
+        self.login()
+        obj = create_content_in_container(site, 'Item', 'foobar')
+        obj.__behaviors__ = None
+        schema_plan = get_serializer_plan(obj)[0]
+        self.assertNotIn(
+            None, schema_plan.get_factories(obj, self.request))
+
+        class ItemFieldSerializer(serialize_content_field.DefaultFieldSerializer):
+            pass
+
+        gsm = getGlobalSiteManager()
+        gsm.registerAdapter(
+            ItemFieldSerializer, (schema.interfaces.IField, IItem, IRequest),
+            IResourceFieldSerializer)
+        try:
+            self.assertEqual(
+                set(schema_plan.get_factories(obj, self.request)),
+                {ItemFieldSerializer})
+        finally:
+            gsm.unregisterAdapter(
+                ItemFieldSerializer,
+                (schema.interfaces.IField, IItem, IRequest),
+                IResourceFieldSerializer)
+        self.assertNotIn(
+            ItemFieldSerializer,
+            schema_plan.get_factories(obj, self.request))
+
     def test_DefaultJSONSummarySerializer(self):
         root = self.layer.new_root()
         site = root['plone']
@@ -139,6 +198,25 @@ class TestSerializerValueAdapters(PloneFunctionalTestCase):
         for value in values:
             getAdapter(value, interface=IValueToJson)
 
+    def test_json_compatible_picks_new_adapters(self):
+        self.assertEqual(
+            json_compatible({'foo': [1, ('bar',), date(2017, 1, 1)]}),
+            {'foo': [1, ['bar'], '2017-01-01']})
+        with self.assertRaises(TypeError):
+            json_compatible(1j)
+
+        def complex_converter(value):
+            return [value.real, value.imag]
+        registry = getGlobalSiteManager()
+        registry.registerAdapter(complex_converter, (complex,), IValueToJson)
+        try:
+            self.assertEqual(json_compatible(1j), [0.0, 1.0])
+        finally:
+            registry.unregisterAdapter(
+                complex_converter, (complex,), IValueToJson)
+        with self.assertRaises(TypeError):
+            json_compatible(1j)
+
 
 class TestSerializerSchemaAdapters(PloneFunctionalTestCase):
     def test_SerializeFactoryToJson(self):
@@ -1,5 +1,10 @@
 # -*- coding: utf-8 -*-
+from plone.server import app_settings
+from plone.server.api.content import get_serials
+from plone.server.auth.policy import Interaction
 from plone.server.behaviors.attachment import IAttachment
+from plone.server.json.cache import get_serialization_cache
+from plone.server.testing import ADMIN_TOKEN
 from plone.server.testing import PloneFunctionalTestCase
 from plone.server.tests import TEST_RESOURCES_DIR
 from zope import schema
@@ -7,6 +12,7 @@ from zope.interface import Interface
 
 import json
 import os
+import requests
 
 
 class ITestingRegistry(Interface):
@@ -32,6 +38,15 @@ class FunctionalTestServer(PloneFunctionalTestCase):
         self.assertEqual(response['databases'], ['plone'])
         self.assertEqual(response['static_directory'], [])
 
+    def test_get_statistics(self):
+        """Get the connection pool counters."""
+        resp = self.layer.requester('GET', '/@statistics')
+        self.assertEqual(resp.status_code, 200)
+        response = json.loads(resp.text)
+        pool = response['databases']['plone']['pool']
+        self.assertTrue(pool['acquisitions'] > 0)
+        self.assertEqual(pool['waiting'], 0)
+
     def test_get_database(self):
         """Get the database object."""
         resp = self.layer.requester('GET', '/plone')
@@ -254,8 +269,283 @@ class FunctionalTestServer(PloneFunctionalTestCase):
         )
         self.assertTrue(resp.status_code == 201)
 
+    def test_get_items_pages(self):
+        for idx in range(5):
+            resp = self.layer.requester(
+                'POST',
+                '/plone/plone/',
+                data=json.dumps({
+                    '@type': 'Item',
+                    'id': 'item{}'.format(idx)
+                })
+            )
+            self.assertEqual(resp.status_code, 201)
+
+        ids = []
+        params = {'size': 2}
+        for page in range(3):
+            resp = self.layer.requester(
+                'GET', '/plone/plone/@items', params=params)
+            self.assertEqual(resp.status_code, 200)
+            response = json.loads(resp.text)
+            self.assertIn('length', response)
+            ids.extend(item['@id'].split('/')[-1] for item in response['items'])
+            params['cursor'] = response['next']
+        self.assertEqual(ids, ['item{}'.format(idx) for idx in range(5)])
+        self.assertIsNone(response['next'])
+
+        resp = self.layer.requester(
+            'GET', '/plone/plone/@items', params={'size': 'all'})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_conditional_requests(self):
+        resp = self.layer.requester(
+            'POST',
+            '/plone/plone/',
+            data=json.dumps({
+                '@type': 'Item',
+                'id': 'item1'
+            })
+        )
+        self.assertEqual(resp.status_code, 201)
+
+        resp = self.layer.requester('GET', '/plone/plone/item1')
+        self.assertEqual(resp.status_code, 200)
+        etag = resp.headers['ETag']
+        self.assertIn('Last-Modified', resp.headers)
+
+        resp = self.layer.requester(
+            'GET', '/plone/plone/item1', headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.headers['ETag'], etag)
+
+        resp = self.layer.requester(
+            'PATCH',
+            '/plone/plone/item1',
+            data=json.dumps({'title': 'Title'}),
+            headers={'If-Match': '"outdated"'})
+        self.assertEqual(resp.status_code, 412)
+
+        resp = self.layer.requester(
+            'PATCH',
+            '/plone/plone/item1',
+            data=json.dumps({'title': 'Title'}),
+            headers={'If-Match': etag})
+        self.assertEqual(resp.status_code, 204)
+
+        resp = self.layer.requester(
+            'GET', '/plone/plone/item1', headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp.headers['ETag'], etag)
+
+    def test_conditional_requests_after_rename(self):
+        resp = self.layer.requester(
+            'POST',
+            '/plone/plone/',
+            data=json.dumps({
+                '@type': 'Folder',
+                'id': 'folder1'
+            })
+        )
+        self.assertEqual(resp.status_code, 201)
+        resp = self.layer.requester(
+            'POST',
+            '/plone/plone/folder1',
+            data=json.dumps({
+                '@type': 'Folder',
+                'id': 'sub'
+            })
+        )
+        self.assertEqual(resp.status_code, 201)
+        resp = self.layer.requester(
+            'POST',
+            '/plone/plone/folder1/sub',
+            data=json.dumps({
+                '@type': 'Item',
+                'id': 'item1'
+            })
+        )
+        self.assertEqual(resp.status_code, 201)
+        resp = self.layer.requester('GET', '/plone/plone/folder1/sub/item1')
+        etag = resp.headers['ETag']
+
+        # renaming the folder does not change the serials of its
+        # grandchildren
+        root = self.layer.new_root()
+        site = root['plone']
+        folder = site['folder1']
+        del site['folder1']
+        folder.__name__ = 'folder2'
+        site['folder2'] = folder
+        root._p_jar.transaction_manager.commit()
+
+        resp = self.layer.requester(
+            'GET', '/plone/plone/folder2/sub/item1',
+            headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('/plone/plone/folder2/sub/item1',
+                      json.loads(resp.text)['@id'])
+        self.assertNotEqual(resp.headers['ETag'], etag)
+
+    def test_serialization_cache(self):
+        settings = app_settings['serialization_cache']
+        settings['enabled'] = True
+        try:
+            resp = self.layer.requester(
+                'POST',
+                '/plone/plone/',
+                data=json.dumps({
+                    '@type': 'Item',
+                    'id': 'item1',
+                    'title': 'Title'
+                })
+            )
+            self.assertEqual(resp.status_code, 201)
+            for idx in range(2):
+                resp = self.layer.requester('GET', '/plone/plone/item1')
+                self.assertEqual(json.loads(resp.text)['title'], 'Title')
+            stats = get_serialization_cache().stats()
+            self.assertEqual(stats['hits'], 1)
+
+            resp = self.layer.requester(
+                'GET', '/plone/plone/item1', params={'frame': 'actions'})
+            self.assertIn('actions', json.loads(resp.text))
+            resp = self.layer.requester('GET', '/plone/plone/item1')
+            self.assertNotIn('actions', json.loads(resp.text))
+
+            resp = self.layer.requester(
+                'PATCH',
+                '/plone/plone/item1',
+                data=json.dumps({'title': 'Changed'}))
+            self.assertEqual(resp.status_code, 204)
+            resp = self.layer.requester('GET', '/plone/plone/item1')
+            self.assertEqual(json.loads(resp.text)['title'], 'Changed')
+            self.assertEqual(get_serialization_cache().stats()['hits'], 3)
+        finally:
+            settings['enabled'] = False
+
+    def test_get_sparse_fieldsets(self):
+        resp = self.layer.requester(
+            'POST',
+            '/plone/plone/',
+            data=json.dumps({
+                '@type': 'Item',
+                'id': 'item1',
+                'title': 'Title'
+            })
+        )
+        self.assertEqual(resp.status_code, 201)
+
+        resp = self.layer.requester(
+            'GET', '/plone/plone/item1', params={'fields': 'title,modified'})
+        self.assertEqual(resp.status_code, 200)
+        response = json.loads(resp.text)
+        self.assertEqual(response['title'], 'Title')
+        self.assertIn('modified', response)
+        self.assertNotIn('parent', response)
+        self.assertNotIn('UID', response)
+        etag = resp.headers['ETag']
+
+        behavior = 'plone.server.behaviors.dublincore.IDublinCore'
+        resp = self.layer.requester(
+            'GET', '/plone/plone/item1', params={'include': behavior})
+        response = json.loads(resp.text)
+        self.assertIn(behavior, response)
+        self.assertIn('parent', response)
+        self.assertNotEqual(resp.headers['ETag'], etag)
+
+        resp = self.layer.requester(
+            'GET', '/plone/plone/@items', params={'fields': 'title'})
+        response = json.loads(resp.text)
+        self.assertEqual(response['items'][0]['title'], 'Title')
+        self.assertNotIn('parent', response['items'][0])
+
+    def test_sparse_fieldsets_leave_annotations_unloaded(self):
+        behavior = 'plone.server.behaviors.dublincore.IDublinCore'
+        resp = self.layer.requester(
+            'POST',
+            '/plone/plone/',
+            data=json.dumps({
+                '@type': 'Item',
+                'id': 'item1',
+                behavior: {'description': 'Description'}
+            })
+        )
+        self.assertEqual(resp.status_code, 201)
+        resp = self.layer.requester(
+            'GET', '/plone/plone/item1', params={'fields': 'title'})
+        self.assertEqual(resp.status_code, 200)
+        etag = resp.headers['ETag']
+        resp = self.layer.requester(
+            'GET', '/plone/plone/item1',
+            params={'fields': 'title'}, headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 304)
+
+        item = self.layer.new_root()['plone']['item1']
+        # the pooled connection may have loaded them for the requests
+        item._p_jar.cacheMinimize()
+        serials = get_serials(item, annotations=False)
+        annotations = item.__dict__['__annotations__']
+        self.assertIsNone(annotations._p_changed)
+        self.assertEqual(len(get_serials(item)), len(serials) + 2)
+        self.assertFalse(annotations._p_changed)
+
+    def test_folder_items_checked_once(self):
+        resp = self.layer.requester(
+            'POST',
+            '/plone/plone/',
+            data=json.dumps({
+                '@type': 'Item',
+                'id': 'item1'
+            })
+        )
+        self.assertEqual(resp.status_code, 201)
+
+        calls = []
+        filter_allowed = Interaction.filter_allowed
+
+        def counting_filter_allowed(self, permission, objects):
+            calls.append(permission)
+            return filter_allowed(self, permission, objects)
+        Interaction.filter_allowed = counting_filter_allowed
+        self.addCleanup(setattr, Interaction, 'filter_allowed', filter_allowed)
+
+        resp = self.layer.requester('GET', '/plone/plone')
+        response = json.loads(resp.text)
+        self.assertEqual(len(response['items']), 1)
+        self.assertEqual(calls, ['plone.AccessContent'])
+
+        calls[:] = []
+        resp = self.layer.requester(
+            'GET', '/plone/plone', params={'fields': 'title'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn('items', json.loads(resp.text))
+        self.assertEqual(calls, [])
+
     def test_get_addons(self):
         resp = self.layer.requester(
             'GET', '/plone/plone/@addons'
         )
         self.assertEqual(resp.status_code, 200)
+
+    def test_keep_alive(self):
+        app_settings['keep_alive']['max_requests'] = 2
+        try:
+            session = requests.Session()
+            session.headers['AUTHORIZATION'] = 'Basic ' + ADMIN_TOKEN
+            closed = []
+            for idx in range(3):
+                resp = session.get(
+                    self.layer.requester.uri + '/plone/plone/@addons')
+                self.assertEqual(resp.status_code, 200)
+                closed.append(
+                    resp.headers.get('Connection', '').lower() == 'close')
+            # the connection is closed after serving max_requests
+            self.assertEqual(closed, [False, True, False])
+
+            app_settings['keep_alive']['enabled'] = False
+            resp = session.get(self.layer.requester.uri + '/plone/plone/@addons')
+            self.assertEqual(resp.headers['Connection'].lower(), 'close')
+        finally:
+            app_settings['keep_alive']['max_requests'] = 1000
+            app_settings['keep_alive']['enabled'] = True
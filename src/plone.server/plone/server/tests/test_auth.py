@@ -2,15 +2,50 @@
 from datetime import datetime
 from datetime import timedelta
 from plone.server import app_settings
+from plone.server.auth.cache import get_auth_cache
+from plone.server.auth.keys import get_rsa_keys
+from plone.server.auth.keys import load_rsa_key
+from plone.server.auth.users import ROOT_USER_ID
+from plone.server.auth.validators import check_password
+from plone.server.auth.validators import hash_password
+from plone.server.auth.validators import needs_rehash
+from plone.server.events import NewUserAdded
 from plone.server.testing import PloneFunctionalTestCase
+from plone.server.testing import TESTING_SETTINGS
+from persistent import Persistent
+from persistent.mapping import PersistentMapping
+from zope.event import notify
 
+import base64
+import json
 import jwt
+import os
+import tempfile
+
+
+class StoredUser(Persistent):
+
+    def __init__(self, id, password):
+        self.id = id
+        self.password = password
+        self.groups = ['Managers']
+        self.roles = {}
+        self.properties = {}
+        self.permissions = {}
+
+
+class StoredUserIdentifier(object):
+
+    def __init__(self, request):
+        self.request = request
+
+    async def get_user(self, token):
+        return self.request.conn.root().get('users', {}).get(token['id'])
 
 
 class TestAuth(PloneFunctionalTestCase):
 
     def test_jwt_auth(self):
-        from plone.server.auth.users import ROOT_USER_ID
         jwt_token = jwt.encode({
             'exp': datetime.utcnow() + timedelta(seconds=60),
             'id': ROOT_USER_ID
@@ -22,3 +57,131 @@ class TestAuth(PloneFunctionalTestCase):
             auth_type='Bearer'
         )
         assert resp.status_code == 200
+
+    def test_auth_cache(self):
+        app_settings['auth_cache']['enabled'] = True
+        try:
+            cache = get_auth_cache()
+            cache.clear()
+            stats = cache.stats()
+            for idx in range(2):
+                resp = self.layer.requester('GET', '/plone/plone/@addons')
+                assert resp.status_code == 200
+            assert cache.stats()['hits'] == stats['hits'] + 1
+            assert cache.stats()['size'] == 1
+            # the user, keeping its request, is not cached
+            key = cache.get_key('basic', {
+                'type': 'basic',
+                'id': ROOT_USER_ID,
+                'token': TESTING_SETTINGS['root_user']['password']})
+            assert cache.get(key) == {'type': 'basic', 'id': ROOT_USER_ID}
+
+            notify(NewUserAdded(ROOT_USER_ID))
+            assert cache.stats()['size'] == 0
+
+            resp = self.layer.requester(
+                'GET', '/plone/plone/@addons',
+                token=base64.b64encode(b'root:wrong').decode('ascii'))
+            assert resp.status_code == 401
+            assert cache.stats()['size'] == 0
+        finally:
+            app_settings['auth_cache']['enabled'] = False
+
+    def test_password_hashing(self):
+        hashed = hash_password('secret')
+        algorithm, iterations, salt, _ = hashed.split(':')
+        assert algorithm == 'pbkdf2_sha512'
+        assert iterations == str(app_settings['password_hashing']['iterations'])
+        assert check_password('secret', hashed)
+        assert not check_password('wrong', hashed)
+        assert not needs_rehash(hashed)
+        assert needs_rehash(hash_password('secret', iterations=1))
+
+        legacy = hash_password('secret', algorithm='sha512')
+        assert len(legacy.split(':')) == 3
+        assert check_password('secret', legacy)
+        assert not check_password('wrong', legacy)
+        assert needs_rehash(legacy)
+
+    def test_rehash_legacy_password(self):
+        root_user = self.layer.app.root_user
+        root_user.password = hash_password('admin', algorithm='sha512')
+        resp = self.layer.requester('GET', '/plone/plone/@addons')
+        assert resp.status_code == 200
+        assert not needs_rehash(root_user.password)
+        assert check_password('admin', root_user.password)
+
+        resp = self.layer.requester('GET', '/plone/plone/@addons')
+        assert resp.status_code == 200
+
+    def test_rehash_stored_password(self):
+        root = self.layer.new_root()
+        root['users'] = PersistentMapping({'user1': StoredUser(
+            'user1', hash_password('secret', algorithm='sha512'))})
+        root._p_jar.transaction_manager.commit()
+        identifiers = app_settings['auth_user_identifiers']
+        app_settings['auth_user_identifiers'] = [StoredUserIdentifier]
+        self.addCleanup(
+            app_settings.__setitem__, 'auth_user_identifiers', identifiers)
+        token = base64.b64encode(b'user1:secret').decode('ascii')
+
+        # requests that do not write leave the stored user as it is
+        resp = self.layer.requester('GET', '/plone/plone', token=token)
+        assert resp.status_code == 200
+        assert needs_rehash(
+            self.layer.new_root()['users']['user1'].password)
+
+        # the password is hashed again with the change of the request
+        resp = self.layer.requester(
+            'POST', '/plone/plone/',
+            data=json.dumps({'@type': 'Item', 'id': 'item1'}),
+            token=token)
+        assert resp.status_code == 201
+        password = self.layer.new_root()['users']['user1'].password
+        assert not needs_rehash(password)
+        assert check_password('secret', password)
+
+    def test_unknown_hashing_algorithm(self):
+        assert not check_password('secret', 'unknown:salt:hash')
+        assert not check_password('secret', 'pbkdf2_unknown:1:salt:hash')
+
+    def test_rsa_key_file(self):
+        rsa = app_settings.pop('rsa', None)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            app_settings['rsa_key_file'] = os.path.join(tmp_dir, 'key.pem')
+            try:
+                keys = get_rsa_keys()
+                assert get_rsa_keys() is keys
+                assert os.listdir(tmp_dir) == ['key.pem']
+                with open(app_settings['rsa_key_file'], 'rb') as key_file:
+                    assert key_file.read() == keys['priv']['k']
+
+                # other processes load the same key
+                del app_settings['rsa']
+                assert get_rsa_keys()['priv'] == keys['priv']
+
+                jwt_token = jwt.encode({
+                    'exp': datetime.utcnow() + timedelta(seconds=60),
+                    'id': ROOT_USER_ID
+                }, app_settings['jwt']['secret']).decode('utf-8')
+                resp = self.layer.requester(
+                    'GET', '/plone/plone/@wstoken',
+                    token=jwt_token, auth_type='Bearer')
+                assert resp.status_code == 200
+                resp = self.layer.requester(
+                    'GET', '/plone/plone/@addons',
+                    params={'ws_token': resp.json()['token']},
+                    token=None)
+                assert resp.status_code == 200
+            finally:
+                app_settings['rsa_key_file'] = None
+                app_settings.pop('rsa', None)
+                if rsa is not None:
+                    app_settings['rsa'] = rsa
+
+    def test_rsa_key_file_directory(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'keys', 'key.pem')
+            key = load_rsa_key(path)
+            assert os.listdir(os.path.join(tmp_dir, 'keys')) == ['key.pem']
+            assert load_rsa_key(path).exportKey('PEM') == key.exportKey('PEM')
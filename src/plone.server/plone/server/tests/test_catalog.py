@@ -1,8 +1,30 @@
 # -*- encoding: utf-8 -*-
+from plone.server.async import IQueueUtility
+from plone.server.async import QueueUtility
+from plone.server.interfaces import ICatalogUtility
+from plone.server.testing import PloneFunctionalTestCase
 from plone.server.testing import PloneServerBaseTestCase
+from plone.server.catalog.embedded import Catalog
+from plone.server.catalog.index import get_changed_indexes
+from plone.server.catalog.utils import get_catalog_plan
+from plone.server.catalog.utils import get_security_changes
+from plone.server.catalog.utils import iter_security_data
+from plone.server.catalog.embedded import EmbeddedSearchUtility
+from plone.server.catalog.pipeline import IndexingPipeline
 from plone.server.catalog.utils import get_index_fields
+from plone.server.behaviors.dublincore import IDublinCore
 from plone.server.content import create_content_in_container, create_content
+from plone.server.events import ObjectFinallyModifiedEvent
 from plone.server.interfaces import ICatalogDataAdapter
+from plone.server.interfaces import IPrincipalPermissionManager
+from plone.server.interfaces import IPrincipalRoleManager
+from plone.server.transactions import bind_request
+from zope.component import getGlobalSiteManager
+
+import asyncio
+import json
+import time
+import unittest
 
 
 class TestCatalog(PloneServerBaseTestCase):
@@ -33,3 +55,478 @@ class TestCatalog(PloneServerBaseTestCase):
         self.assertTrue('uuid' in fields)
         self.assertTrue('path' in fields)
         self.assertTrue('title' in fields)
+
+    def test_get_partial_index_data(self):
+        self.login()
+        db = self.layer.app['plone']
+        site = create_content(
+            'Site',
+            id='plone',
+            title='Plone')
+        site.__name__ = 'plone'
+        db['plone'] = site
+        ob = create_content_in_container(site, 'Item', 'foobar')
+        ob.title = 'Changed'
+
+        event = ObjectFinallyModifiedEvent(ob, {
+            'title': 'Changed',
+            'plone.server.behaviors.dublincore.IDublinCore': {
+                'subject': ['foo']
+            }
+        })
+        indexes = get_changed_indexes(ob, event)
+        self.assertIn('title', indexes)
+        self.assertIn('subject', indexes)
+        self.assertIn('uuid', indexes)
+        fields = ICatalogDataAdapter(ob)(indexes)
+        self.assertEqual(fields['title'], 'Changed')
+        self.assertEqual(fields['uuid'], ob.uuid)
+        self.assertNotIn('access_roles', fields)
+        self.assertNotIn('path', fields)
+        self.assertNotIn('creation_date', fields)
+
+        # behavior changes and unknown payloads reindex everything
+        self.assertIsNone(get_changed_indexes(ob, ObjectFinallyModifiedEvent(
+            ob, {'@behaviors': ['plone.server.behaviors.dublincore.IDublinCore']})))
+        self.assertIsNone(get_changed_indexes(ob, ObjectFinallyModifiedEvent(ob)))
+
+    def test_catalog_plan(self):
+        self.login()
+        db = self.layer.app['plone']
+        site = create_content(
+            'Site',
+            id='plone',
+            title='Plone')
+        site.__name__ = 'plone'
+        db['plone'] = site
+        ob = create_content_in_container(site, 'Item', 'foobar')
+
+        plan = get_catalog_plan(site)
+        self.assertIs(get_catalog_plan(site), plan)
+        self.assertIs(get_catalog_plan(ob), get_catalog_plan(
+            create_content_in_container(site, 'Item', 'other')))
+        names = [entry[1] for entry in plan]
+        self.assertIn('uuid', names)
+        self.assertNotIn('subject', names)
+
+        # objects stored without dynamic behaviors
+        ob.__behaviors__ = None
+        self.assertIn('uuid', [entry[1] for entry in get_catalog_plan(ob)])
+
+        # dynamic behaviors get their own plan
+        site.add_behavior(IDublinCore)
+        self.assertIsNot(get_catalog_plan(site), plan)
+        fields = ICatalogDataAdapter(site)()
+        self.assertIn('subject', fields)
+        self.assertEqual(fields['uuid'], site.uuid)
+
+
+class TestEmbeddedCatalog(PloneServerBaseTestCase):
+
+    def run_bound(self, coro):
+        async def bound():
+            bind_request(self.request)
+            return await coro
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(bound())
+        finally:
+            loop.close()
+
+    def test_catalog_indexes(self):
+        catalog = Catalog()
+        types = {
+            'portal_type': 'keyword',
+            'title': 'text',
+            'path': 'path',
+            'depth': 'int',
+            'creation_date': 'date'
+        }
+        catalog.index_doc('a', {
+            'portal_type': 'Folder', 'title': 'Big folder', 'path': '/a',
+            'depth': 2, 'creation_date': '2017-01-01T00:00:00'}, types)
+        catalog.index_doc('b', {
+            'portal_type': 'Item', 'title': 'Small item', 'path': '/a/b',
+            'depth': 3, 'creation_date': '2017-02-01T00:00:00'}, types)
+        catalog.index_doc('c', {
+            'portal_type': 'Item', 'title': 'Big item', 'path': '/a/b/c',
+            'depth': 4, 'creation_date': '2017-03-01T00:00:00'}, types)
+
+        def uids(query):
+            return sorted(catalog.documents[docid]['path']
+                          for docid in catalog.apply(query))
+
+        self.assertEqual(len(catalog), 3)
+        self.assertEqual(uids({'portal_type': 'Item'}), ['/a/b', '/a/b/c'])
+        self.assertEqual(uids({'portal_type': ['Item', 'Folder']}),
+                         ['/a', '/a/b', '/a/b/c'])
+        self.assertEqual(uids({'title': 'big'}), ['/a', '/a/b/c'])
+        self.assertEqual(uids({'title': 'big item'}), ['/a/b/c'])
+        self.assertEqual(uids({'path': '/a/b'}), ['/a/b', '/a/b/c'])
+        self.assertEqual(uids({'path': {'query': '/a', 'depth': 1}}),
+                         ['/a', '/a/b'])
+        self.assertEqual(uids({'depth': {'min': 3}}), ['/a/b', '/a/b/c'])
+        self.assertEqual(
+            uids({'creation_date': {'max': '2017-02-01T00:00:00'},
+                  'portal_type': 'Item'}),
+            ['/a/b'])
+        self.assertEqual(uids({'unknown': 'foo'}), [])
+        self.assertEqual(
+            [catalog.documents[docid]['path'] for docid in catalog.sort(
+                catalog.apply({}), 'creation_date', reverse=True)],
+            ['/a/b/c', '/a/b', '/a'])
+
+        # Reindexing replaces the old values
+        catalog.index_doc('c', {'title': 'Renamed'}, types)
+        self.assertEqual(uids({'title': 'big'}), ['/a'])
+        self.assertEqual(catalog.get_document('c')['portal_type'], 'Item')
+
+        catalog.unindex_doc('b')
+        self.assertEqual(len(catalog), 2)
+        self.assertEqual(uids({'portal_type': 'Item'}), ['/a/b/c'])
+        self.assertIsNone(catalog.get_document('b'))
+
+        # keywords of several types
+        catalog.index_doc('d', {
+            'portal_type': ['Item', 1, True], 'path': '/d'}, types)
+        catalog.index_doc('e', {'portal_type': 2, 'path': '/e'}, types)
+        self.assertEqual(uids({'portal_type': 1}), ['/d'])
+        self.assertEqual(uids({'portal_type': [True, 2]}), ['/d', '/e'])
+
+    def test_security_query_global_roles(self):
+        self.login()
+        users, roles = EmbeddedSearchUtility()._security_query(self.request)
+        self.assertIn('root', users)
+        # from the Managers group of the user
+        self.assertIn('plone.SiteAdmin', roles)
+
+    def test_search_utility(self):
+        self.login()
+        db = self.layer.app['plone']
+        site = create_content(
+            'Site',
+            id='plone',
+            title='Plone')
+        site.__name__ = 'plone'
+        db['plone'] = site
+        site.install()
+        folder = create_content_in_container(
+            site, 'Folder', 'folder', title='Some folder')
+        item = create_content_in_container(
+            folder, 'Item', 'item', title='Some item')
+
+        utility = EmbeddedSearchUtility()
+        self.run_bound(utility.index(site, {
+            ob.uuid: utility.get_data(ob) for ob in (folder, item)}))
+        self.assertIn('_catalog', site)
+
+        result = self.run_bound(utility.get_by_path(site, '/folder'))
+        self.assertEqual(result['items_count'], 2)
+        result = self.run_bound(utility.get_by_path(site, '/folder', depth=0))
+        self.assertEqual(result['items_count'], 1)
+        result = self.run_bound(utility.get_by_type(site, 'Item'))
+        self.assertEqual(result['member'][0]['uuid'], item.uuid)
+        result = self.run_bound(utility.search(site, 'some ITEM'))
+        self.assertEqual(result['items_count'], 1)
+        result = self.run_bound(utility.get_folder_contents(site, folder))
+        self.assertEqual(result['member'][0]['path'], '/folder/item')
+        self.assertEqual(
+            self.run_bound(utility.get_by_uuid(site, folder.uuid))['path'],
+            '/folder')
+        self.assertIs(
+            self.run_bound(utility.get_object_by_uuid(site, item.uuid)), item)
+
+        # Anonymous users do not see private content
+        self.request.security.participations = []
+        self.request.security.invalidate_cache()
+        result = self.run_bound(utility.get_by_path(site, '/'))
+        self.assertEqual(result['items_count'], 0)
+
+        self.run_bound(utility.remove(
+            site, [(item.uuid, 'Item', '/folder/item')]))
+        self.assertIsNone(self.run_bound(utility.get_by_uuid(site, item.uuid)))
+        self.run_bound(utility.remove_catalog(site))
+        self.assertNotIn('_catalog', site)
+
+    def test_security_reindex(self):
+        self.login()
+        db = self.layer.app['plone']
+        site = create_content(
+            'Site',
+            id='plone',
+            title='Plone')
+        site.__name__ = 'plone'
+        db['plone'] = site
+        site.install()
+        self.request.site = site
+        folder = create_content_in_container(
+            site, 'Folder', 'folder', title='Some folder')
+        items = [create_content_in_container(
+            folder, 'Item', 'item{}'.format(idx), title='Some item')
+            for idx in range(3)]
+        private = create_content_in_container(
+            folder, 'Folder', 'private', title='Private folder')
+        hidden = create_content_in_container(
+            private, 'Item', 'hidden', title='Hidden item')
+        IPrincipalPermissionManager(private).deny_permission_to_principal(
+            'plone.AccessContent', 'bob')
+
+        utility = EmbeddedSearchUtility()
+        self.run_bound(utility.index(site, {
+            ob.uuid: utility.get_data(ob)
+            for ob in [folder, private, hidden] + items}))
+
+        IPrincipalRoleManager(folder).assign_role_to_principal(
+            'plone.Reader', 'bob')
+        changes = get_security_changes({'prinrole': {'bob': ['plone.Reader']}})
+        self.assertEqual(changes, {('principal', 'bob')})
+        self.assertEqual(get_security_changes(
+            {'roleperm': {'plone.Reader': ['plone.ModifyContent']}}), set())
+
+        visited = dict(self.run_bound(self.walk(folder, changes)))
+        # the private folder overrides the access of bob
+        self.assertEqual(set(visited), set([folder] + items))
+        self.assertIn('bob', visited[items[0]]['access_users'])
+        # items without local settings share the inherited access
+        self.assertIs(visited[items[0]], visited[items[1]])
+
+        self.run_bound(utility.reindex_security(folder, changes))
+        catalog = utility.get_catalog(site)
+        document = catalog.get_document(items[2].uuid)
+        self.assertIn('bob', document['access_users'])
+        self.assertEqual(document['title'], 'Some item')
+        self.assertNotIn(
+            'bob', catalog.get_document(hidden.uuid)['access_users'])
+
+    async def walk(self, obj, changes):
+        return list(iter_security_data(obj, changes))
+
+
+class FunctionalTestEmbeddedCatalog(PloneFunctionalTestCase):
+
+    def setUp(self):
+        super(FunctionalTestEmbeddedCatalog, self).setUp()
+        self.utility = EmbeddedSearchUtility()
+        getGlobalSiteManager().registerUtility(self.utility, ICatalogUtility)
+
+    def tearDown(self):
+        getGlobalSiteManager().unregisterUtility(self.utility, ICatalogUtility)
+        super(FunctionalTestEmbeddedCatalog, self).tearDown()
+
+    def add_queue(self):
+        queue = QueueUtility({})
+        getGlobalSiteManager().registerUtility(queue, IQueueUtility)
+        self.addCleanup(
+            getGlobalSiteManager().unregisterUtility, queue, IQueueUtility)
+        return queue
+
+    def run_queue(self, queue):
+        """Run the queued views once their requests are done.
+
+        The connection given back by the last request is taken before, like
+        other requests do while the queue runs.
+        """
+        # futures of requests queue their views after the response
+        for idx in range(100):
+            if queue.total_queued:
+                break
+            time.sleep(0.05)
+        loop = self.layer.aioapp.loop
+        conn = self.layer.app['plone']._db.open()
+        task = asyncio.run_coroutine_threadsafe(
+            queue.initialize(app=self.layer.aioapp), loop)
+        try:
+            asyncio.run_coroutine_threadsafe(
+                queue._queue.join(), loop).result()
+        finally:
+            task.cancel()
+            conn.close()
+
+    def test_index_on_commit(self):
+        resp = self.layer.requester(
+            'POST',
+            '/plone/plone/',
+            data=json.dumps({
+                "@type": "Item",
+                "title": "Catalogued item",
+                "id": "item1"
+            })
+        )
+        self.assertEqual(resp.status_code, 201)
+        resp = self.layer.requester(
+            'GET', '/plone/plone/@search', params={'q': 'catalogued'})
+        response = json.loads(resp.text)
+        self.assertEqual(response['items_count'], 1)
+        self.assertEqual(response['member'][0]['path'], '/item1')
+
+        # patching only reindexes the title, the rest of the document stays
+        resp = self.layer.requester(
+            'PATCH',
+            '/plone/plone/item1',
+            data=json.dumps({"title": "Renamed item"})
+        )
+        self.assertEqual(resp.status_code, 204)
+        resp = self.layer.requester(
+            'GET', '/plone/plone/@search', params={'q': 'renamed'})
+        response = json.loads(resp.text)
+        self.assertEqual(response['items_count'], 1)
+        self.assertEqual(response['member'][0]['path'], '/item1')
+        self.assertEqual(response['member'][0]['title'], 'Renamed item')
+        resp = self.layer.requester(
+            'GET', '/plone/plone/@search', params={'q': 'catalogued'})
+        self.assertEqual(json.loads(resp.text)['items_count'], 0)
+
+        resp = self.layer.requester('DELETE', '/plone/plone/item1')
+        self.assertEqual(resp.status_code, 200)
+        resp = self.layer.requester(
+            'GET', '/plone/plone/@search', params={'q': 'catalogued'})
+        self.assertEqual(json.loads(resp.text)['items_count'], 0)
+
+    def test_items_skip_catalog(self):
+        # ids sorting before the catalog stored in the site
+        for id_ in ('A0', 'A1'):
+            resp = self.layer.requester(
+                'POST',
+                '/plone/plone/',
+                data=json.dumps({
+                    "@type": "Item",
+                    "id": id_
+                })
+            )
+            self.assertEqual(resp.status_code, 201)
+        resp = self.layer.requester(
+            'GET', '/plone/plone/@items', params={'size': 2})
+        response = json.loads(resp.text)
+        self.assertEqual(
+            [item['@id'].split('/')[-1] for item in response['items']],
+            ['A0', 'A1'])
+        self.assertIsNone(response['next'])
+
+    def test_reindex_through_queue(self):
+        # created while no catalog is registered
+        getGlobalSiteManager().unregisterUtility(self.utility, ICatalogUtility)
+        resp = self.layer.requester(
+            'POST',
+            '/plone/plone/',
+            data=json.dumps({
+                "@type": "Item",
+                "title": "Queued item",
+                "id": "item1"
+            })
+        )
+        self.assertEqual(resp.status_code, 201)
+        getGlobalSiteManager().registerUtility(self.utility, ICatalogUtility)
+
+        queue = self.add_queue()
+        resp = self.layer.requester(
+            'POST', '/plone/plone/@async-catalog-reindex')
+        self.assertEqual(resp.status_code, 200)
+        self.run_queue(queue)
+
+        resp = self.layer.requester(
+            'GET', '/plone/plone/@search', params={'q': 'queued'})
+        response = json.loads(resp.text)
+        self.assertEqual(response['items_count'], 1)
+        self.assertEqual(response['member'][0]['path'], '/item1')
+
+    def test_security_reindex_through_queue(self):
+        resp = self.layer.requester(
+            'POST',
+            '/plone/plone/',
+            data=json.dumps({
+                "@type": "Item",
+                "title": "Shared item",
+                "id": "item1"
+            })
+        )
+        self.assertEqual(resp.status_code, 201)
+        uid = json.loads(
+            self.layer.requester('GET', '/plone/plone/item1').text)['UID']
+
+        queue = self.add_queue()
+        resp = self.layer.requester(
+            'POST',
+            '/plone/plone/item1/@sharing',
+            data=json.dumps({
+                'type': 'Allow',
+                'prinperm': {
+                    'user1': ['plone.AccessContent']
+                }
+            })
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.run_queue(queue)
+
+        site = self.layer.new_root()['plone']
+        document = self.utility.get_catalog(site).get_document(uid)
+        self.assertIn('user1', document['access_users'])
+
+
+class RecordingPipeline(IndexingPipeline):
+
+    def __init__(self, settings, loop):
+        super(RecordingPipeline, self).__init__(settings, loop=loop)
+        self.sent = []
+
+    async def _send(self, key, batch):
+        self.sent.append((key, batch))
+
+
+class FakeSiteRequest(object):
+    _db_id = 'plone'
+    _site_id = 'plone'
+
+
+class TestIndexingPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.request = FakeSiteRequest()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_coalesce_and_batch(self):
+        async def scenario():
+            pipeline = RecordingPipeline({'batch_size': 2}, self.loop)
+            await pipeline.add(self.request, [], {
+                'a': {'title': 'A'}, 'b': {'title': 'B'}})
+            await pipeline.add(self.request, [], {'a': {'depth': 2}})
+            await pipeline.add(self.request, [('b', 'Item', '/b')], {
+                'c': {'title': 'C'}})
+            self.assertEqual(pipeline.stats()['pending'], 3)
+            await pipeline.flush()
+            return pipeline
+
+        pipeline = self.loop.run_until_complete(scenario())
+        self.assertEqual(pipeline.sent, [
+            (('plone', 'plone'), [
+                ('a', ('index', {'title': 'A', 'depth': 2})),
+                ('b', ('remove', ('b', 'Item', '/b')))]),
+            (('plone', 'plone'), [
+                ('c', ('index', {'title': 'C'}))])
+        ])
+        stats = pipeline.stats()
+        self.assertEqual(stats['pending'], 0)
+        self.assertEqual(stats['queued'], 5)
+        self.assertEqual(stats['coalesced'], 2)
+
+    def test_backpressure(self):
+        async def scenario():
+            pipeline = RecordingPipeline({'max_pending': 2}, self.loop)
+            await pipeline.add(self.request, [], {'a': {}, 'b': {}})
+            blocked = asyncio.ensure_future(
+                pipeline.add(self.request, [], {'c': {}}), loop=self.loop)
+            await asyncio.sleep(0, loop=self.loop)
+            self.assertFalse(blocked.done())
+            self.assertEqual(pipeline.stats()['waits'], 1)
+            await pipeline.flush()
+            await blocked
+            self.assertEqual(pipeline.stats()['pending'], 1)
+            # finalize flushes what is left on shutdown
+            await pipeline.finalize()
+            return pipeline
+
+        pipeline = self.loop.run_until_complete(scenario())
+        self.assertEqual(pipeline.stats()['pending'], 0)
+        self.assertEqual(len(pipeline.sent), 2)
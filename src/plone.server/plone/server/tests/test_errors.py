@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
+from plone.server import app_settings
+from plone.server import traversal
 from plone.server.testing import PloneFunctionalTestCase
+from unittest import mock
+from ZODB.POSException import ConflictError
 
 import json
+import time
 
 
 class FunctionalTestServer(PloneFunctionalTestCase):
@@ -19,3 +24,92 @@ class FunctionalTestServer(PloneFunctionalTestCase):
         resp = self.layer.requester('GET', '/plone/plone/@types/non')
         self.assertTrue(resp.status_code == 400)
         self.assertTrue(json.loads(resp.text)['error']['type'] == 'ViewError')
+
+    def _conflicting_commit(self, conflicts):
+        commit = traversal.commit
+
+        async def conflicting_commit(txn, request):
+            if len(conflicts) > 0:
+                conflicts.pop()
+                raise ConflictError()
+            await commit(txn, request)
+        return conflicting_commit
+
+    def test_conflict_is_retried(self):
+        traversal.conflict_stats.clear()
+        with mock.patch.object(traversal, 'commit',
+                               self._conflicting_commit([1, 1])):
+            resp = self.layer.requester(
+                'POST',
+                '/plone/plone/',
+                data=json.dumps({
+                    "@type": "Item",
+                    "title": "Item1",
+                    "id": "item1"
+                })
+            )
+        self.assertEqual(resp.status_code, 201)
+        root = self.layer.new_root()
+        self.assertEqual(root['plone']['item1'].title, 'Item1')
+        stats = traversal.conflict_stats[
+            'POST plone.server.api.content.DefaultPOST']
+        self.assertEqual(stats['conflicts'], 2)
+        self.assertEqual(stats['retries'], 2)
+        self.assertEqual(stats['failures'], 0)
+
+    def test_conflict_drops_futures(self):
+        ran = []
+        commit = traversal.commit
+        conflicts = [1]
+
+        async def record(attempt):
+            ran.append(attempt)
+
+        async def conflicting_commit(txn, request):
+            request._futures[len(conflicts)] = record(len(conflicts))
+            if len(conflicts) > 0:
+                conflicts.pop()
+                raise ConflictError()
+            await commit(txn, request)
+
+        with mock.patch.object(traversal, 'commit', conflicting_commit):
+            resp = self.layer.requester(
+                'POST',
+                '/plone/plone/',
+                data=json.dumps({
+                    "@type": "Item",
+                    "id": "item1"
+                })
+            )
+        self.assertEqual(resp.status_code, 201)
+        # futures run once the response is sent
+        for idx in range(100):
+            if ran:
+                break
+            time.sleep(0.01)
+        time.sleep(0.05)
+        self.assertEqual(ran, [0])
+
+    def test_conflict_retries_exhausted(self):
+        traversal.conflict_stats.clear()
+        with mock.patch.dict(app_settings['conflict_retry'], attempts=1), \
+                mock.patch.object(traversal, 'commit',
+                                  self._conflicting_commit([1, 1])):
+            resp = self.layer.requester(
+                'POST',
+                '/plone/plone/',
+                data=json.dumps({
+                    "@type": "Item",
+                    "title": "Item1",
+                    "id": "item1"
+                })
+            )
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(
+            json.loads(resp.text)['error']['type'], 'ConflictDB')
+        root = self.layer.new_root()
+        self.assertNotIn('item1', root['plone'])
+        stats = traversal.conflict_stats[
+            'POST plone.server.api.content.DefaultPOST']
+        self.assertEqual(stats['retries'], 1)
+        self.assertEqual(stats['failures'], 1)
@@ -1,7 +1,11 @@
 from plone.server import app_settings
 from plone.server import migrate
+from plone.server.auth.securitymap import PersistentSecurityMap
+from plone.server.auth.securitymap import SecurityMap
 from plone.server.content import create_content
+from plone.server.interfaces import IPrincipalRoleMap
 from plone.server.interfaces import MIGRATION_DATA_REGISTRY_KEY
+from plone.server.migrate.migrations import migrate_acl_maps
 from plone.server.testing import PloneServerBaseTestCase
 
 
@@ -92,3 +96,22 @@ class TestMigrations(PloneServerBaseTestCase):
         app_settings['applications'] = []
         self.assertEqual(len(migrate.get_migrations('foobarother')), 0)
         self.assertEqual(len(migrate.get_migrations('foobar')), 0)
+
+
+class TestACLMigration(PloneServerBaseTestCase):
+
+    def test_migrate_acl_maps(self):
+        self.login()
+        site = create_content('Site', id='plone', title='Plone')
+        item = create_content('Item', id='item')
+        site['item'] = item
+        # maps stored in the content pickle by older versions
+        map = SecurityMap()
+        map.add_cell('plone.Reader', 'user1', 'Allow')
+        item.__acl__ = {'prinrole': map}
+
+        migrate_acl_maps(site)
+        self.assertIsInstance(item.__acl__['prinrole'], PersistentSecurityMap)
+        self.assertEqual(
+            IPrincipalRoleMap(item).get_roles_for_principal('user1'),
+            [('plone.Reader', 'Allow')])
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+from plone.server.exceptions import ConnectionPoolTimeout
+from plone.server.exceptions import ReadOnlyRequestError
+from plone.server.factory.content import Database
+from plone.server.transactions import RequestAwareDB
+from zope.security.interfaces import Unauthorized
+from ZODB.tests.test_storage import MinimalMemoryStorage
+
+from persistent.mapping import PersistentMapping
+
+import asyncio
+import pytest
+import ZODB
+
+
+@pytest.yield_fixture(scope='function')
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.yield_fixture(scope='function')
+def database():
+    storage = MinimalMemoryStorage()
+    ZODB.DB(storage).close()  # init storage with root
+    yield Database('db', RequestAwareDB(storage), {
+        'max_size': 2,
+        'timeout': 1
+    })
+
+
+def test_acquire_and_release(loop, database):
+    pool = database.pool
+    conn = loop.run_until_complete(database.async_open())
+    assert pool.size == 1
+    assert conn.root() is not None
+    database.release(conn)
+    assert pool.size == 0
+    assert conn.opened is None
+    # releasing twice does not free an extra slot
+    database.release(conn)
+    assert pool.size == 0
+    assert pool.stats()['acquisitions'] == 1
+
+
+def test_waiters_are_woken_in_order(loop, database):
+    pool = database.pool
+    conns = [loop.run_until_complete(pool.acquire()) for idx in range(2)]
+    order = []
+
+    async def waiter(name):
+        conn = await pool.acquire()
+        order.append(name)
+        return conn
+
+    async def scenario():
+        first = asyncio.ensure_future(waiter('first'))
+        second = asyncio.ensure_future(waiter('second'))
+        await asyncio.sleep(0)
+        assert pool.waiting == 2
+        pool.release(conns[0])
+        conn = await first
+        assert order == ['first']
+        assert not second.done()
+        pool.release(conns[1])
+        await second
+        pool.release(conn)
+
+    loop.run_until_complete(scenario())
+    assert order == ['first', 'second']
+    stats = pool.stats()
+    assert stats['waited'] == 2
+    assert stats['waiting'] == 0
+    assert stats['size'] == 1
+
+
+def test_acquire_timeout(loop, database):
+    pool = database.pool
+    pool.timeout = 0.01
+    conns = [loop.run_until_complete(pool.acquire()) for idx in range(2)]
+    with pytest.raises(ConnectionPoolTimeout):
+        loop.run_until_complete(pool.acquire())
+    assert pool.stats()['timeouts'] == 1
+    assert pool.waiting == 0
+    for conn in conns:
+        pool.release(conn)
+    assert pool.size == 0
+
+
+def test_min_size_warms_zodb_pool(loop, database):
+    pool = database.pool
+    pool.min_size = 3
+    conn = loop.run_until_complete(pool.acquire())
+    assert len(database._db.pool.all) >= 3
+    pool.release(conn)
+
+
+def test_read_only_connection(loop, database):
+    conn = loop.run_until_complete(database.async_open(read_only=True))
+    assert conn.transaction_manager.read_only
+    root = conn.root()
+    # reading needs no request or transaction
+    assert len(root) == 0
+    # pooled connections do not keep what they read
+    conn.readCurrent(root)
+    assert conn._readCurrent == {}
+    with pytest.raises(Unauthorized):
+        root['foo'] = PersistentMapping()
+    with pytest.raises(ReadOnlyRequestError):
+        conn.transaction_manager.begin()
+    database.release(conn)
+    assert database.pool.size == 0
+
+    conn = loop.run_until_complete(database.async_open())
+    assert not conn.transaction_manager.read_only
+    database.release(conn)
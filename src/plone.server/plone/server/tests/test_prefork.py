@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+from aiohttp import web
+from plone.server.prefork import Arbiter
+from plone.server.prefork import get_rss
+from plone.server.prefork import Heartbeat
+from plone.server.prefork import Worker
+
+import functools
+import os
+import requests
+import signal
+import socket
+import tempfile
+import time
+import unittest
+
+
+def make_app(config):
+    """App answering with the content of config and the worker pid."""
+    with open(config, 'r') as config_file:
+        value = config_file.read()
+
+    async def handler(request):
+        return web.Response(text='{} {}'.format(value, os.getpid()))
+    app = web.Application()
+    app.router.add_get('/', handler)
+    return app
+
+
+class TestPrefork(unittest.TestCase):
+
+    def start_arbiter(self, **kwargs):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.config = os.path.join(tmp_dir.name, 'config')
+        self.write_config('one')
+        self.url = 'http://127.0.0.1:{}/'.format(port)
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                Arbiter(functools.partial(make_app, self.config), port,
+                        reload_app=lambda: functools.partial(
+                            make_app, self.config),
+                        **kwargs).run()
+            finally:
+                os._exit(0)
+        self.addCleanup(self.stop_arbiter, pid)
+        return pid
+
+    def stop_arbiter(self, pid):
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+
+    def write_config(self, value):
+        with open(self.config, 'w') as config_file:
+            config_file.write(value)
+
+    def get(self):
+        return requests.get(self.url, timeout=5).text.split()
+
+    def wait_for(self, condition, timeout=20):
+        deadline = time.time() + timeout
+        while True:
+            try:
+                result = self.get()
+                if condition(result):
+                    return result
+            except requests.ConnectionError:
+                pass
+            assert time.time() < deadline, 'timed out'
+            time.sleep(0.1)
+
+    def test_graceful_reload(self):
+        pid = self.start_arbiter(workers=1)
+        value, worker = self.wait_for(lambda result: True)
+        assert value == 'one'
+
+        self.write_config('two')
+        os.kill(pid, signal.SIGHUP)
+        deadline = time.time() + 20
+        while True:
+            # the old worker serves until the new one does
+            value, new_worker = self.get()
+            if new_worker != worker:
+                break
+            assert value == 'one'
+            assert time.time() < deadline, 'timed out'
+            time.sleep(0.05)
+        assert value == 'two'
+
+    def test_max_requests(self):
+        self.start_arbiter(workers=1, max_requests=2)
+        value, worker = self.wait_for(lambda result: True)
+        self.get()
+        value, new_worker = self.wait_for(lambda result: result[1] != worker)
+        assert value == 'one'
+
+    def test_heartbeat(self):
+        heartbeat = Heartbeat()
+        try:
+            started = time.time()
+            time.sleep(0.01)
+            assert heartbeat.last_update() < started
+            heartbeat.notify()
+            assert heartbeat.last_update() >= started
+        finally:
+            heartbeat.close()
+
+    def test_get_rss(self):
+        assert get_rss() > 0
+
+    def test_kill_unresponsive_worker(self):
+        arbiter = Arbiter(None, 0, timeout=0.2)
+        pid = os.fork()
+        if pid == 0:
+            time.sleep(30)
+            os._exit(0)
+        worker = Worker(None, None, Heartbeat())
+        worker.pid = pid
+        worker.started = time.time()
+        arbiter.workers[pid] = worker
+
+        arbiter.check_workers()
+        assert worker.alive
+
+        time.sleep(0.3)
+        arbiter.check_workers()
+        assert not worker.alive
+        _, status = os.waitpid(pid, 0)
+        assert os.WIFSIGNALED(status)
+        arbiter.workers.clear()
+        worker.heartbeat.close()
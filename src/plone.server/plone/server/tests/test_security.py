@@ -5,11 +5,19 @@ from plone.server.tests import TEST_RESOURCES_DIR
 from zope import schema
 from zope.interface import Interface
 from plone.server.interfaces import IRequest
+from zope.component import getUtility
 from zope.interface import alsoProvides
 from plone.server.browser import View
 from aiohttp.test_utils import make_mocked_request
 from plone.server.auth import get_roles_with_access_content
 from plone.server.auth import get_principals_with_access_content
+from plone.server.auth.cache import DecisionCache
+from plone.server.auth.cache import get_decision_cache
+from plone.server.auth.policy import get_security_chain
+from plone.server.auth.securitymap import PersistentSecurityMap
+from plone.server.interfaces import Allow
+from plone.server.interfaces import IGroups
+from plone.server.interfaces import IPrincipalRoleMap
 
 import json
 import os
@@ -25,6 +33,15 @@ class RolesView(View):
         return get_roles_with_access_content(self.context)
 
 
+class FakePrincipal(object):
+
+    def __init__(self, id, groups):
+        self.id = id
+        self.groups = groups
+        self.roles = {}
+        self.permissions = {}
+
+
 class FunctionalTestServer(PloneFunctionalTestCase):
     """Functional testing of the API REST."""
 
@@ -124,4 +141,169 @@ class FunctionalTestServer(PloneFunctionalTestCase):
         request = make_mocked_request('POST', '/')
         alsoProvides(request, IRequest)
         principals = PrincipalsView(testing_object, request)()
-        self.assertEqual(principals, ['root'])
\ No newline at end of file
+        self.assertEqual(principals, ['root'])
+
+    def test_shared_decisions_follow_sharing_changes(self):
+        resp = self.layer.requester(
+            'POST',
+            '/plone/plone/',
+            data=json.dumps({
+                '@type': 'Item',
+                'id': 'testing'
+            })
+        )
+        self.assertEqual(resp.status_code, 201)
+        cache = get_decision_cache()
+        hits = cache.stats()['hits']
+        for idx in range(2):
+            resp = self.layer.requester(
+                'GET', '/plone/plone/testing/@canido',
+                params={'permission': 'plone.ModifyContent'})
+            self.assertTrue(json.loads(resp.text))
+        self.assertGreater(cache.stats()['hits'], hits)
+
+        resp = self.layer.requester(
+            'POST',
+            '/plone/plone/testing/@sharing',
+            data=json.dumps({
+                'type': 'Deny',
+                'prinperm': {
+                    'root': ['plone.ModifyContent']
+                }
+            })
+        )
+        self.assertEqual(resp.status_code, 200)
+        resp = self.layer.requester(
+            'GET', '/plone/plone/testing/@canido',
+            params={'permission': 'plone.ModifyContent'})
+        self.assertFalse(json.loads(resp.text))
+
+    def test_listings_filter_members_by_access(self):
+        for name in ('item1', 'item2'):
+            resp = self.layer.requester(
+                'POST',
+                '/plone/plone/',
+                data=json.dumps({
+                    '@type': 'Item',
+                    'id': name
+                })
+            )
+            self.assertEqual(resp.status_code, 201)
+        resp = self.layer.requester(
+            'POST',
+            '/plone/plone/item2/@sharing',
+            data=json.dumps({
+                'type': 'Deny',
+                'prinperm': {
+                    'root': ['plone.AccessContent']
+                }
+            })
+        )
+        self.assertEqual(resp.status_code, 200)
+
+        resp = self.layer.requester('GET', '/plone/plone')
+        ids = [item['@id'].split('/')[-1]
+               for item in json.loads(resp.text)['items']]
+        self.assertEqual(ids, ['item1'])
+        resp = self.layer.requester('GET', '/plone/plone/@items')
+        ids = [item['@id'].split('/')[-1]
+               for item in json.loads(resp.text)['items']]
+        self.assertEqual(ids, ['item1'])
+
+    def test_sharing_changes_only_write_the_security_map(self):
+        resp = self.layer.requester(
+            'POST',
+            '/plone/plone/',
+            data=json.dumps({
+                '@type': 'Item',
+                'id': 'testing'
+            })
+        )
+        self.assertEqual(resp.status_code, 201)
+        serials = []
+        for user in ('user1', 'user2'):
+            resp = self.layer.requester(
+                'POST',
+                '/plone/plone/testing/@sharing',
+                data=json.dumps({
+                    'type': 'Allow',
+                    'prinrole': {
+                        user: ['plone.Reader']
+                    }
+                })
+            )
+            self.assertEqual(resp.status_code, 200)
+            item = self._get_site()['testing']
+            self.assertIsInstance(
+                item.__acl__['prinrole'], PersistentSecurityMap)
+            serials.append(item._p_serial)
+        # the second change only wrote the existing map
+        self.assertEqual(serials[0], serials[1])
+        self.assertEqual(
+            sorted(IPrincipalRoleMap(item).get_principals_for_role(
+                'plone.Reader')),
+            [('user1', Allow), ('user2', Allow)])
+
+    def test_security_chain_leaves_security_maps_unloaded(self):
+        resp = self.layer.requester(
+            'POST',
+            '/plone/plone/',
+            data=json.dumps({
+                '@type': 'Item',
+                'id': 'testing'
+            })
+        )
+        self.assertEqual(resp.status_code, 201)
+        resp = self.layer.requester(
+            'POST',
+            '/plone/plone/testing/@sharing',
+            data=json.dumps({
+                'type': 'Allow',
+                'prinrole': {
+                    'user1': ['plone.Reader']
+                }
+            })
+        )
+        self.assertEqual(resp.status_code, 200)
+
+        item = self._get_site()['testing']
+        # the pooled connection may have loaded them for the requests
+        item._p_jar.cacheMinimize()
+        self.request._db_id = 'plone'
+        (db_id, chain), generation = get_security_chain(self.request, item)
+        prinrole = item.__acl__['prinrole']
+        self.assertIsNone(prinrole._p_changed)
+        self.assertEqual(db_id, 'plone')
+        self.assertEqual(chain[:2], (item._p_oid, prinrole._p_oid))
+        self.assertEqual(generation, get_decision_cache().generation)
+
+    def test_decisions_of_older_views_are_not_kept(self):
+        cache = DecisionCache(history_size=2)
+        key = (('plone', (b'1', b'2')), ('root',), 'plone.AccessContent')
+        generation = cache.generation
+        cache.invalidate([b'3'])
+        cache.set(key, True, generation)
+        self.assertTrue(cache.get(key))
+
+        cache.clear()
+        cache.invalidate([b'2'])
+        cache.set(key, True, generation)
+        self.assertIsNone(cache.get(key))
+        cache.set(key, True, cache.generation)
+        self.assertTrue(cache.get(key))
+
+        # invalidations older than the history are unknown
+        cache.clear()
+        cache.invalidate([b'3'])
+        cache.invalidate([b'3'])
+        cache.set(key, True, generation)
+        self.assertIsNone(cache.get(key))
+
+    def test_decisions_depend_on_the_roles_of_groups(self):
+        interaction = self.request.security
+        principal = FakePrincipal('user1', ['editors'])
+        key = interaction.principal_key(principal, principal.groups)
+        group = getUtility(IGroups).get_principal('editors')
+        group.roles['plone.Editor'] = Allow
+        self.assertNotEqual(
+            interaction.principal_key(principal, principal.groups), key)
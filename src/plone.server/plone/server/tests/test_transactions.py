@@ -2,6 +2,7 @@
 from aiohttp.test_utils import make_mocked_request
 from BTrees import OOBTree
 from plone.server.browser import View
+from plone.server.transactions import bind_request
 from plone.server.transactions import CallbackTransactionDataManager
 from plone.server.transactions import RequestAwareDB
 from plone.server.transactions import RequestAwareTransactionManager
@@ -14,19 +15,30 @@ import pytest
 import ZODB
 
 
-class SetItemView(View):
-    def __call__(self, name='foo', value='bar'):
+class BoundView(View):
+    """Renders with its request bound, like the request handler does."""
+
+    def __call__(self, *args):
+        bind_request(self.request)
+        try:
+            return self.render(*args)
+        finally:
+            bind_request(None)
+
+
+class SetItemView(BoundView):
+    def render(self, name='foo', value='bar'):
         self.context[name] = value
 
 
-class RegisterView(View):
-    def __call__(self):
+class RegisterView(BoundView):
+    def render(self):
         # noinspection PyProtectedMember
         self.context._p_changed = True
 
 
-class CommitView(View):
-    def __call__(self):
+class CommitView(BoundView):
+    def render(self):
         # noinspection PyProtectedMember
         self.request._txn.commit()
 
@@ -373,3 +385,16 @@ def test_concurrent_read_current_conflict(foo, conn2):  # noqa
 
     with pytest.raises(ReadConflictError):
         CommitView(bar, request2)()
+
+
+# noinspection PyShadowingNames,PyProtectedMember
+def test_invalidation_callbacks(db, root):
+    invalidated = []
+    db.add_invalidation_callback(invalidated.append)
+
+    request = make_mocked_request('POST', '/')
+    txn = root._p_jar.transaction_manager.begin(request)
+    SetItemView(root, request)('foo', OOBTree.OOBTree())
+    txn.commit()
+
+    assert invalidated == [{root._p_oid, root['foo']._p_oid}]
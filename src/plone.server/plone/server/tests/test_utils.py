@@ -1,8 +1,20 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from plone.server import app_settings
+from plone.server import renderers
 from plone.server import utils
+from plone.server.exceptions import RequestNotFound
+from plone.server.interfaces import IResource
+from plone.server.json.cache import SerializationCache
 from plone.server.testing import FakeRequest
+from plone.server.transactions import bind_request
 from plone.server.transactions import get_current_request
+from plone.server.transactions import synccontext
 
+import asyncio
 import gc
+import json
+import pytest
 import resource
 
 
@@ -13,9 +25,26 @@ def test_module_resolve_path():
     assert utils.resolve_module_path('....api') == 'plone.server.api'
 
 
+class FakeConnection(object):
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+
+class FakeContext(object):
+
+    def __init__(self):
+        self._p_jar = FakeConnection()
+
+
 class TestGetCurrentRequest:
+    def teardown_method(self, method):
+        bind_request(None)
+        app_settings['request_frame_lookup'] = False
+
     def test_gcr_memory(self):
         self.request = FakeRequest()
+        bind_request(self.request)
 
         count = 0
         current = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0 / 1024.0
@@ -31,3 +60,113 @@ class TestGetCurrentRequest:
                 new = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0 / 1024.0
                 if new - current > 10:  # memory leak, this shouldn't happen
                     assert new == current
+
+    def test_gcr_not_bound(self):
+        self.request = FakeRequest()
+        with pytest.raises(RequestNotFound):
+            get_current_request()
+
+    def test_gcr_frame_lookup(self):
+        self.request = FakeRequest()
+        app_settings['request_frame_lookup'] = True
+        assert get_current_request() is self.request
+
+    def test_gcr_bound_to_task(self):
+        request = FakeRequest()
+        other = FakeRequest()
+        bind_request(other)
+
+        async def lookup():
+            bind_request(request)
+            await asyncio.sleep(0)
+            return get_current_request()
+
+        loop = asyncio.new_event_loop()
+        try:
+            assert loop.run_until_complete(lookup()) is request
+        finally:
+            loop.close()
+        # the thread binding is untouched by the task one
+        assert get_current_request() is other
+
+    def test_gcr_child_task(self):
+        request = FakeRequest()
+
+        async def lookup():
+            await asyncio.sleep(0)
+            return get_current_request()
+
+        async def handle():
+            bind_request(request)
+            return await asyncio.ensure_future(lookup())
+
+        loop = asyncio.new_event_loop()
+        try:
+            assert loop.run_until_complete(handle()) is request
+        finally:
+            loop.close()
+
+    def test_gcr_executor_thread(self):
+        request = FakeRequest()
+        context = FakeContext()
+
+        def lookup(name, default=None):
+            return get_current_request(), name, default
+
+        async def handle():
+            bind_request(request)
+            return await synccontext(context)(lookup, 'id', default='foo')
+
+        loop = asyncio.new_event_loop()
+        try:
+            assert loop.run_until_complete(handle()) == (request, 'id', 'foo')
+        finally:
+            loop.close()
+            context._p_jar.executor.shutdown()
+
+
+def test_json_encoders():
+    data = {
+        'url': 'http://localhost/plone',
+        'date': datetime(2017, 1, 1),
+        'set': set(['foo']),
+        'big': 2 ** 70,
+        'iface': IResource
+    }
+    expected = json.loads(renderers.JSONEncoder().encode(data).decode('utf-8'))
+    assert expected['date'] == '2017-01-01T00:00:00'
+    assert expected['set'] == ['foo']
+    body = renderers.FastJSONEncoder().encode(data)
+    assert isinstance(body, bytes)
+    assert json.loads(body.decode('utf-8')) == expected
+
+    try:
+        app_settings['json_encoder'] = 'plone.server.renderers.JSONEncoder'
+        assert isinstance(renderers.get_json_encoder(), renderers.JSONEncoder)
+        assert not isinstance(
+            renderers.get_json_encoder(), renderers.FastJSONEncoder)
+    finally:
+        app_settings['json_encoder'] = 'plone.server.renderers.FastJSONEncoder'
+    assert isinstance(renderers.get_json_encoder(), renderers.FastJSONEncoder)
+
+
+def test_serialization_cache():
+    cache = SerializationCache(max_size=2)
+    cache.set(('db', b'1', b'serial'), {'id': 1})
+    cache.set(('db', b'2', b'serial'), {'id': 2})
+    assert cache.get(('db', b'1', b'serial')) == {'id': 1}
+    # the least recently used entry goes
+    cache.set(('db', b'3', b'serial'), {'id': 3})
+    assert cache.get(('db', b'2', b'serial')) is None
+
+    cache.invalidate('db', [b'1'])
+    assert cache.get(('db', b'1', b'serial')) is None
+    assert cache.get(('db', b'3', b'serial')) == {'id': 3}
+    assert cache.stats() == {
+        'size': 1,
+        'max_size': 2,
+        'hits': 2,
+        'misses': 2,
+        'evictions': 1,
+        'invalidations': 1
+    }
@@ -32,6 +32,9 @@ class FunctionalTestServer(PloneFunctionalTestCase):
                             break  # noqa
                         else:
                             self.assertTrue(len(message['items']) == 0)
+                            # the socket does not hold a connection
+                            self.assertEqual(
+                                self.layer.app['plone'].pool.size, 0)
                             await ws.close()
                     elif msg.tp == aiohttp.WSMsgType.closed:
                         break  # noqa
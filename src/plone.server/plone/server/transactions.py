@@ -5,17 +5,22 @@ on a single ZODB connection. This should not be possible to do safely, but
 we'll see how far we get and learn more about ZODB while doing it...
 """
 from concurrent.futures import ThreadPoolExecutor
+from plone.server import app_settings
 from plone.server.interfaces import SHARED_CONNECTION
 from plone.server.utils import get_authenticated_user_id
+from plone.server.exceptions import ReadOnlyRequestError
 from plone.server.exceptions import RequestNotFound
+from plone.server import logger
 from transaction._manager import _new_transaction
 from transaction.interfaces import ISavepoint
 from transaction.interfaces import ISavepointDataManager
+from ZODB.mvccadapter import MVCCAdapter
 from zope.interface import implementer
 from zope.proxy import ProxyBase
 from zope.security.interfaces import Unauthorized
 
 import asyncio
+import functools
 import inspect
 import threading
 import time
@@ -28,15 +33,31 @@ try:
 except ImportError:
     from aiohttp.web import RequestHandler
 
+try:
+    from asyncio.events import _get_running_loop
+except ImportError:  # pragma NO COVER python < 3.5.3
+    def _get_running_loop():
+        try:
+            loop = asyncio.get_event_loop()
+        except RuntimeError:
+            return None
+        return loop if loop.is_running() else None
+
 
 ASYNCIO_LOCKS = {}
 
+# Requests bound to threads that are not running an event loop
+# (executor threads, commands, tests)
+_thread_local = threading.local()
+
 
 class RequestAwareTransactionManager(transaction.TransactionManager):
     """Transaction manager for storing the managed transaction in the
     current request
 
     """
+    read_only = False
+
     # ITransactionManager
     def begin(self, request=None):
         """Return new request specific transaction
@@ -100,6 +121,22 @@ class RequestAwareTransactionManager(transaction.TransactionManager):
         return RequestBoundTransactionManagerContextManager(self, request)
 
 
+class ReadOnlyTransactionManager(transaction.TransactionManager):
+    """Transaction manager shared by the connections of read only requests
+
+    Connections opened with it read from the MVCC snapshot taken when they
+    were opened, no transaction can be started on them.
+
+    """
+    read_only = True
+
+    def begin(self, request=None):
+        raise ReadOnlyRequestError(ReadOnlyRequestError.__doc__)
+
+    def get(self, request=None):
+        raise ReadOnlyRequestError(ReadOnlyRequestError.__doc__)
+
+
 class RequestBoundTransactionManagerContextManager(object):
     def __init__(self, tm, request):
         assert isinstance(tm, RequestAwareTransactionManager)
@@ -198,6 +235,10 @@ class RequestAwareConnection(ZODB.Connection.Connection):
     lock = threading.Lock()
 
     def _getReadCurrent(self):
+        if getattr(self.transaction_manager, 'read_only', False):
+            # Nothing is committed from a read only connection, do not keep
+            # what its requests read
+            return dict()
         try:
             request = get_current_request()
         except RequestNotFound:
@@ -209,6 +250,8 @@ class RequestAwareConnection(ZODB.Connection.Connection):
             return request._txn_readCurrent
 
     def _setReadCurrent(self, value):
+        if getattr(self.transaction_manager, 'read_only', False):
+            return
         try:
             request = get_current_request()
         except RequestNotFound:
@@ -217,7 +260,18 @@ class RequestAwareConnection(ZODB.Connection.Connection):
 
     _readCurrent = property(_getReadCurrent, _setReadCurrent)
 
+    def newTransaction(self, transaction, sync=True):
+        # Decisions computed from the new view of the database are only
+        # shared when none of their objects were invalidated since
+        from plone.server.auth.cache import get_decision_generation
+        self.decision_generation = get_decision_generation()
+        super(RequestAwareConnection, self).newTransaction(transaction, sync)
+
     def _register(self, obj=None):
+        if getattr(self.transaction_manager, 'read_only', False):
+            # Same answer non writing requests always got
+            raise Unauthorized('Adding content not permited')
+
         request = get_current_request()
         if hasattr(request, '_db_write_enabled') and not request._db_write_enabled:
             raise Unauthorized('Adding content not permited')
@@ -238,6 +292,38 @@ class RequestAwareConnection(ZODB.Connection.Connection):
 class RequestAwareDB(ZODB.DB):
     klass = RequestAwareConnection
 
+    def __init__(self, *args, **kwargs):
+        super(RequestAwareDB, self).__init__(*args, **kwargs)
+        self.invalidation_callbacks = []
+        adapter = self._mvcc_storage
+        if isinstance(adapter, MVCCAdapter):
+            # Storages without MVCC support tell the adapter about the oids
+            # changed by this and other processes, pass them on
+            invalidate = adapter.invalidate
+            invalidate_finish = adapter._invalidate_finish
+
+            def adapter_invalidate(tid, oids):
+                invalidate(tid, oids)
+                self._call_invalidation_callbacks(oids)
+
+            def adapter_invalidate_finish(oids, committing_instance):
+                invalidate_finish(oids, committing_instance)
+                self._call_invalidation_callbacks(oids)
+
+            adapter.invalidate = adapter_invalidate
+            adapter._invalidate_finish = adapter_invalidate_finish
+
+    def add_invalidation_callback(self, callback):
+        """Call callback with the oids of the objects changed by commits."""
+        self.invalidation_callbacks.append(callback)
+
+    def _call_invalidation_callbacks(self, oids):
+        for callback in self.invalidation_callbacks:
+            try:
+                callback(oids)
+            except Exception:  # noqa
+                logger.error('Invalidation callback failed', exc_info=True)
+
 
 class TransactionProxy(ProxyBase):
     __slots__ = ('_wrapped',
@@ -341,6 +427,28 @@ def tm(request):
     return request.conn.transaction_manager
 
 
+def add_to_transaction(request, func, *args):
+    """Call func with args in the transaction of request once its view
+    begins it.
+
+    Changes found before the view, like while authenticating the request,
+    are made this way so they are committed or aborted with the view.
+    """
+    try:
+        calls = request._txn_calls
+    except AttributeError:
+        calls = request._txn_calls = []
+    calls.append((func, args))
+
+
+def call_in_transaction(request):
+    """Make the calls added with add_to_transaction."""
+    calls = getattr(request, '_txn_calls', ())
+    request._txn_calls = []
+    for func, args in calls:
+        func(*args)
+
+
 async def commit(txn, request):
     if SHARED_CONNECTION is False:
         await txn.acommit()
@@ -371,11 +479,77 @@ def sync(request):
         'Request has no conn'
     assert getattr(request.conn, 'executor', None) is not None, \
         'Connection has no executor'
-    return lambda *args, **kwargs: request.app.loop.run_in_executor(
-        request.conn.executor, *args, **kwargs)
+    return lambda func, *args, **kwargs: request.app.loop.run_in_executor(
+        request.conn.executor, functools.partial(
+            _call_with_request, request, func, *args, **kwargs))
+
+
+def _call_with_request(request, func, *args, **kwargs):
+    # Runs on an executor thread, make the request available to it
+    _thread_local.request = request
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _thread_local.request = None
+
+
+def _request_task_factory(loop, coro):
+    # Tasks started while handling a request see it as current request
+    task = asyncio.Task(coro, loop=loop)
+    request = getattr(asyncio.Task.current_task(loop=loop), 'request', None)
+    if request is not None:
+        task.request = request
+    return task
+
+
+def _current_task():
+    loop = _get_running_loop()
+    if loop is None:
+        return None
+    return asyncio.Task.current_task(loop=loop)
+
+
+def bind_request(request, task=None):
+    """Make request the current request of the running asyncio task.
+
+    Outside of a running event loop the request is bound to the current
+    thread instead. Pass `None` to unbind it. Tasks started by a task with
+    a request are bound to the same request.
+
+    :param request: request to bind
+    :param task: task to bind to, defaults to the running one
+    """
+    if task is None:
+        task = _current_task()
+    if task is not None:
+        task.request = request
+        loop = _get_running_loop()
+        if (request is not None and loop is not None and
+                loop.get_task_factory() is None):
+            loop.set_task_factory(_request_task_factory)
+    else:
+        _thread_local.request = request
 
 
 def get_current_request():
+    """Return the request bound to the running task or thread.
+
+    When nothing is bound and the `request_frame_lookup` setting is enabled
+    the request is looked up heuristically from the stack.
+    """
+    task = _current_task()
+    if task is not None:
+        request = getattr(task, 'request', None)
+    else:
+        request = getattr(_thread_local, 'request', None)
+    if request is not None:
+        return request
+    if app_settings.get('request_frame_lookup', False):
+        return get_request_from_frames()
+    raise RequestNotFound(RequestNotFound.__doc__)
+
+
+def get_request_from_frames():
     """Return the current request by heuristically looking it up from stack
     """
     frame = inspect.currentframe()
@@ -398,7 +572,7 @@ try:
 except (ImportError, AttributeError):  # pragma NO COVER PyPy / PURE_PYTHON
     pass
 else:
-    from plone.server.optimizations import get_current_request  # noqa
+    from plone.server.optimizations import get_current_request as get_request_from_frames  # noqa
 
 
 def synccontext(context):
@@ -418,5 +592,10 @@ def synccontext(context):
         'Request has no conn'
     assert getattr(context._p_jar, 'executor', None) is not None, \
         'Connection has no executor'
-    return lambda *args, **kwargs: loop.run_in_executor(
-        context._p_jar.executor, *args, **kwargs)
+    try:
+        request = get_current_request()
+    except RequestNotFound:
+        request = None
+    return lambda func, *args, **kwargs: loop.run_in_executor(
+        context._p_jar.executor, functools.partial(
+            _call_with_request, request, func, *args, **kwargs))
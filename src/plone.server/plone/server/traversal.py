@@ -5,6 +5,7 @@ from aiohttp.abc import AbstractRouter
 from aiohttp.web_ws import WebSocketResponse
 from aiohttp.web_exceptions import HTTPBadRequest
 from aiohttp.web_exceptions import HTTPNotFound
+from aiohttp.web_exceptions import HTTPServiceUnavailable
 from aiohttp.web_exceptions import HTTPUnauthorized
 from plone.server import app_settings
 from plone.server import _
@@ -16,6 +17,7 @@ from plone.server.browser import Response
 from plone.server.browser import UnauthorizedResponse
 from plone.server.contentnegotiation import content_type_negotiation
 from plone.server.contentnegotiation import language_negotiation
+from plone.server.exceptions import ConnectionPoolTimeout
 from plone.server.interfaces import IApplication
 from plone.server.interfaces import IDatabase
 from plone.server.interfaces import IDefaultLayer
@@ -30,6 +32,8 @@ from plone.server.interfaces import WRITING_VERBS
 from plone.server.registry import ACTIVE_LAYERS_KEY
 from plone.server.transactions import locked
 from plone.server.transactions import abort
+from plone.server.transactions import bind_request
+from plone.server.transactions import call_in_transaction
 from plone.server.transactions import commit
 from plone.server.utils import apply_cors
 from plone.server.utils import import_class
@@ -49,11 +53,10 @@ from ZODB.POSException import ConflictError
 import aiohttp
 import asyncio
 import json
+import random
 import traceback
 import uuid
 
-MAX_RETRIES = 10
-
 
 async def do_traverse(request, parent, path):
     """Traverse for the code API."""
@@ -133,15 +136,10 @@ async def traverse(request, parent, path):
         if SHARED_CONNECTION:
             request.conn = context.conn
         else:
-            # Create a new conection
-            count = 0
-            while len(context._db.pool.all) > context._db.pool._size + 5:
-                context._db.pool._reduce_size(strictly_less=True)
-                await asyncio.sleep(1)
-                count += 1
-                if count > MAX_RETRIES:
-                    raise Exception('No more connections')
-            request.conn = context.open()
+            # Get a connection from the database pool, requests that do
+            # not write get a read only one that skips transaction setup
+            request.conn = await context.async_open(
+                read_only=request.method not in WRITING_VERBS)
         # Check the transaction
         request._db_write_enabled = False
         request._db_id = context.id
@@ -158,6 +156,59 @@ async def traverse(request, parent, path):
     return await traverse(request, context, path[1:])
 
 
+conflict_stats = {}
+
+
+def keep_alive(request):
+    """Whether the http connection of request can serve more requests."""
+    settings = app_settings['keep_alive']
+    if not settings.get('enabled', True):
+        return False
+    max_requests = settings.get('max_requests')
+    if max_requests:
+        protocol = request.protocol
+        protocol._plone_requests = getattr(protocol, '_plone_requests', 0) + 1
+        return protocol._plone_requests < max_requests
+    return True
+
+
+def release_connection(request):
+    """Give the request connection back to its database pool."""
+    conn = getattr(request, 'conn', None)
+    if conn is None:
+        return
+    try:
+        db = request.application[request._db_id]
+    except (AttributeError, KeyError):
+        conn.close()
+    else:
+        db.release(conn)
+    # The connection may already be used by another request
+    request.conn = None
+
+
+def is_replayable(request):
+    """Whether the view can read the body of request again.
+
+    aiohttp keeps the body read with `read`, `text` or `json`, bodies the
+    view streamed from `content` are gone.
+    """
+    return not request.has_body or request._read_bytes is not None
+
+
+def count_conflict(view, request, counter):
+    """Track conflicts per view to find contention hotspots."""
+    klass = view.__class__
+    key = '{} {}.{}'.format(request.method, klass.__module__, klass.__name__)
+    if key not in conflict_stats:
+        conflict_stats[key] = {
+            'conflicts': 0,
+            'retries': 0,
+            'failures': 0
+        }
+    conflict_stats[key][counter] += 1
+
+
 def _url(request):
     try:
         return request.url.human_repr()
@@ -199,7 +250,7 @@ def generate_error_response(e, request, error, status=400):
     return ErrorResponse(
         error,
         message,
-        status
+        status=status
     )
 
 
@@ -217,43 +268,29 @@ class MatchInfo(AbstractMatchInfo):
 
     async def handler(self, request):
         """Main handler function for aiohttp."""
-        if request.method in WRITING_VERBS:
-            try:
-                request._db_write_enabled = True
-                txn = request.conn.transaction_manager.begin(request)
-                # We try to avoid collisions on the same instance of
-                # plone.server
-                view_result = await self.view()
-                if isinstance(view_result, ErrorResponse) or \
-                        isinstance(view_result, UnauthorizedResponse):
-                    # If we don't throw an exception and return an specific
-                    # ErrorReponse just abort
-                    await abort(txn, request)
-                else:
-                    await commit(txn, request)
-
-            except Unauthorized as e:
-                await abort(txn, request)
-                view_result = generate_unauthorized_response(e, request)
-            except ConflictError as e:
-                view_result = generate_error_response(
-                    e, request, 'ConflictDB', 409)
-            except Exception as e:
-                await abort(txn, request)
-                view_result = generate_error_response(
-                    e, request, 'ServiceError')
-        else:
-            try:
-                view_result = await self.view()
-            except Unauthorized as e:
-                view_result = generate_unauthorized_response(e, request)
-            except Exception as e:
-                view_result = generate_error_response(e, request, 'ViewError')
-
-        # If we want to close the connection after the request
-        if SHARED_CONNECTION is False and hasattr(request, 'conn'):
-            request.conn.close()
+        try:
+            return await self.handle(request)
+        finally:
+            # The task may go on with the next request of the http connection
+            bind_request(None)
 
+    async def handle(self, request):
+        try:
+            if request.method in WRITING_VERBS:
+                view_result = await self.handle_write(request)
+            else:
+                try:
+                    view_result = await self.view()
+                except Unauthorized as e:
+                    view_result = generate_unauthorized_response(e, request)
+                except Exception as e:
+                    view_result = generate_error_response(
+                        e, request, 'ViewError')
+        finally:
+            # The database connection is only kept for the view, the http
+            # connection may stay open for the next requests
+            if SHARED_CONNECTION is False:
+                release_connection(request)
 
         # Make sure its a Response object to send to renderer
         if not isinstance(view_result, Response):
@@ -268,18 +305,109 @@ class MatchInfo(AbstractMatchInfo):
         view_result.headers = cors_headers
 
         resp = await self.rendered(view_result)
+        if not keep_alive(request):
+            resp.force_close()
         if not resp.prepared:
             await resp.prepare(request)
         await resp.write_eof()
         resp._body = None
-        resp.force_close()
 
         futures_to_wait = request._futures.values()
         if futures_to_wait:
-            await asyncio.gather(*list(futures_to_wait))
+            tasks = []
+            for future in futures_to_wait:
+                task = asyncio.ensure_future(future)
+                bind_request(request, task)
+                tasks.append(task)
+            await asyncio.gather(*tasks)
 
         return resp
 
+    async def handle_write(self, request):
+        """Run the view in a transaction, replaying the request on conflicts.
+
+        Requests whose body was streamed by the view are not replayed.
+        """
+        settings = app_settings['conflict_retry']
+        attempt = 0
+        while True:
+            try:
+                return await self.commit_view(request)
+            except ConflictError as e:
+                conflict = e
+                count_conflict(self.view, request, 'conflicts')
+                if attempt >= settings['attempts'] or \
+                        not is_replayable(request):
+                    count_conflict(self.view, request, 'failures')
+                    return generate_error_response(
+                        conflict, request, 'ConflictDB', 409)
+            attempt += 1
+            count_conflict(self.view, request, 'retries')
+            # Jittered exponential backoff so the conflicting requests do
+            # not run into each other again
+            await asyncio.sleep(
+                random.uniform(0, settings['backoff'] * 2 ** attempt))
+            if not await self.replay(request):
+                count_conflict(self.view, request, 'failures')
+                return generate_error_response(
+                    conflict, request, 'ConflictDB', 409)
+
+    async def commit_view(self, request):
+        txn = None
+        try:
+            request._db_write_enabled = True
+            txn = request.conn.transaction_manager.begin(request)
+            call_in_transaction(request)
+            # We try to avoid collisions on the same instance of
+            # plone.server
+            view_result = await self.view()
+            if isinstance(view_result, ErrorResponse) or \
+                    isinstance(view_result, UnauthorizedResponse):
+                # If we don't throw an exception and return an specific
+                # ErrorReponse just abort
+                await abort(txn, request)
+            else:
+                await commit(txn, request)
+
+        except Unauthorized as e:
+            await abort(txn, request)
+            view_result = generate_unauthorized_response(e, request)
+        except ConflictError:
+            if txn is not None:
+                await abort(txn, request)
+            raise
+        except Exception as e:  # noqa
+            await abort(txn, request)
+            view_result = generate_error_response(
+                e, request, 'ServiceError')
+        return view_result
+
+    async def replay(self, request):
+        """Traverse again on a fresh connection and take over the new view."""
+        # Forget the state of the aborted transaction
+        request._txn = None
+        request._txn_dm = None
+        request._txn_readCurrent = {}
+        # The futures of the aborted attempt would run after the commit
+        request._futures = {}
+        if SHARED_CONNECTION is False:
+            release_connection(request)
+            request.conn = None
+        request.security = None
+        try:
+            match_info = await request.app.router.real_resolve(request)
+        except Exception as e:  # noqa
+            logger.error(
+                "Exception on conflict replay",
+                exc_info=e)
+            return False
+        if match_info is None:
+            return False
+        self.resource = match_info.resource
+        self.view = match_info.view
+        self.rendered = match_info.rendered
+        return True
+
     def get_info(self):
         return {
             'request': self.request,
@@ -321,6 +449,7 @@ class TraversalRouter(AbstractRouter):
         self._root = root
 
     async def resolve(self, request):
+        bind_request(request)
         result = None
         try:
             result = await self.real_resolve(request)
@@ -328,14 +457,14 @@ class TraversalRouter(AbstractRouter):
             logger.error(
                 "Exception on resolve execution",
                 exc_info=e)
-            if hasattr(request, 'conn'):
-                request.conn.close()
+            release_connection(request)
+            bind_request(None)
             raise e
         if result is not None:
             return result
         else:
-            if hasattr(request, 'conn'):
-                request.conn.close()
+            release_connection(request)
+            bind_request(None)
             raise HTTPNotFound()
 
     async def real_resolve(self, request):
@@ -354,6 +483,14 @@ class TraversalRouter(AbstractRouter):
 
         try:
             resource, tail = await self.traverse(request)
+        except ConnectionPoolTimeout as _exc:
+            request.resource = request.tail = None
+            request.exc = _exc
+            raise HTTPServiceUnavailable(text=json.dumps({
+                'success': False,
+                'exception_message': str(_exc),
+                'exception_type': 'ConnectionPoolTimeout'
+            }))
         except Exception as _exc:
             request.resource = request.tail = None
             request.exc = _exc
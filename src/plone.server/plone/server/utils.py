@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from aiohttp.web_exceptions import HTTPUnauthorized
 from hashlib import sha256 as sha
+from plone.server.interfaces import ISite
 from zope.dottedname.resolve import resolve
 
 import fnmatch
@@ -54,6 +55,14 @@ def iter_parents(content):
         content = getattr(content, '__parent__', None)
 
 
+def get_site(content):
+    """The site containing content, from the connection of content."""
+    while content is not None:
+        if ISite.providedBy(content):
+            return content
+        content = getattr(content, '__parent__', None)
+
+
 def get_authenticated_user(request):
     if (hasattr(request, 'security') and
             hasattr(request.security, 'participations') and